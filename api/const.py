@@ -24,6 +24,22 @@ MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_PORT = 3306
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 
+# Connection pool of each Postgres / MySQL engine, shared per process.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 10)
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW") or 10)
+# Seconds before a pooled connection is replaced, within MySQL's timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE") or 1800)
+# Database lookups and aggregates run by request handlers at once, per
+# process. Requests waiting longer than DB_QUERY_QUEUE_TIMEOUT seconds for
+# a slot get a 503.
+DB_QUERY_CONCURRENCY = int(os.getenv("DB_QUERY_CONCURRENCY") or 8)
+DB_AGGREGATE_CONCURRENCY = int(os.getenv("DB_AGGREGATE_CONCURRENCY") or 4)
+DB_QUERY_QUEUE_TIMEOUT = float(os.getenv("DB_QUERY_QUEUE_TIMEOUT") or 2)
+# Statement timeouts (seconds) of request handler queries, for lookups
+# and for aggregates over many swaps.
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT") or 5)
+DB_AGGREGATE_TIMEOUT = float(os.getenv("DB_AGGREGATE_TIMEOUT") or 20)
+
 
 NODE_TYPE = os.getenv("NODE_TYPE") or "dev"
 RESET_TABLE = os.getenv("RESET_TABLE") == "True"
@@ -119,6 +135,16 @@ MM2_RPC_HOSTS = {
 }
 MM2_NETID = 8762  # The primary active NetId currently supported by KomodoPlatform
 
+# Bounds for refreshing the orderbook caches of all traded pair variants.
+ORDERBOOK_FETCH_WORKERS = int(os.getenv("ORDERBOOK_FETCH_WORKERS") or 8)
+# Seconds allowed for a single orderbook request to mm2.
+ORDERBOOK_FETCH_TIMEOUT = float(os.getenv("ORDERBOOK_FETCH_TIMEOUT") or 2)
+# Seconds allowed for a batch request to mm2, after which the orderbooks
+# in it are requested one at a time.
+ORDERBOOK_BATCH_TIMEOUT = float(os.getenv("ORDERBOOK_BATCH_TIMEOUT") or 10)
+# Number of orderbook requests sent to mm2 in each batch request.
+ORDERBOOK_FETCH_BATCH_SIZE = int(os.getenv("ORDERBOOK_FETCH_BATCH_SIZE") or 50)
+
 # Some coins may have swaps data, but are not currently in the coins repo.
 CoinConfigNotFoundCoins = ["XEP", "MORTY", "RICK", "SMTF-v2"]
 
@@ -134,3 +160,15 @@ MARKETS_PAIRS_DAYS = 30
 GENERIC_PAIRS_DAYS = 30
 
 MEMCACHE_LIMIT = 250 * 1024 * 1024  # 250 MB
+# Gzip cache files saved to disk
+CACHE_FILES_COMPRESS = os.getenv("CACHE_FILES_COMPRESS") == "True"
+# Memcache value format (json, orjson, msgpack)
+# and compression (zlib, zstd, lz4)
+MEMCACHE_SERDE_FORMAT = os.getenv("MEMCACHE_SERDE_FORMAT") or "orjson"
+MEMCACHE_SERDE_COMPRESSION = os.getenv("MEMCACHE_SERDE_COMPRESSION") or "zstd"
+# Values larger than this many bytes are compressed
+MEMCACHE_COMPRESS_MIN = int(os.getenv("MEMCACHE_COMPRESS_MIN") or 65536)
+# In-process cache of large memcache items: max items, and seconds to
+# serve an item before checking memcache for a newer version.
+MEMCACHE_L1_MAX_ITEMS = int(os.getenv("MEMCACHE_L1_MAX_ITEMS") or 32)
+MEMCACHE_L1_TTL = float(os.getenv("MEMCACHE_L1_TTL") or 1)
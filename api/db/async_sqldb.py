@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import asyncio
+import copy
+from sqlalchemy import event, text
+from starlette.concurrency import run_in_threadpool
+from const import (
+    DB_AGGREGATE_CONCURRENCY,
+    DB_QUERY_CONCURRENCY,
+    DB_QUERY_QUEUE_TIMEOUT,
+    DB_QUERY_TIMEOUT,
+)
+from db.sqldb import SqlQuery
+from util.exceptions import QueryLimitError, QueryTimeoutError
+
+# Read only `SqlQuery` methods, which `AsyncSqlQuery` can await
+READ_METHODS = [
+    "coin_trade_volumes",
+    "pair_trade_volumes",
+    "pair_stats",
+    "coin_stats",
+    "daily_coin_volumes",
+    "last_trade",
+    "first_last_traded",
+    "pair_last_trade",
+    "coin_last_traded",
+    "pubkey_last_traded",
+    "version_last_traded",
+    "gui_last_traded",
+    "platform_last_traded",
+    "ticker_last_traded",
+    "get_swaps",
+    "get_swap",
+    "get_timespan_swaps",
+    "swaps_updated_since",
+    "get_swaps_for_coin",
+    "get_swaps_for_pair",
+    "swap_uuids",
+    "get_pairs",
+    "get_distinct",
+    "get_count",
+    "swap_counts",
+]
+
+# Postgres SQLSTATE of a statement cancelled by `statement_timeout`
+QUERY_CANCELED = "57014"
+
+# Shared by all request handlers, so slow queries queue here for a
+# threadpool worker and connection, rather than holding them all and
+# starving other endpoints. Aggregates have their own slots, so cheap
+# lookups never queue behind them.
+limiters = {
+    "lookup": asyncio.Semaphore(DB_QUERY_CONCURRENCY),
+    "aggregate": asyncio.Semaphore(DB_AGGREGATE_CONCURRENCY),
+}
+
+
+def flag_timeouts(context):
+    """
+    `SqlQuery` methods log and swallow errors, so a cancelled statement
+    is flagged on its connection to be raised once the method returns.
+    """
+    if getattr(context.original_exception, "pgcode", None) == QUERY_CANCELED:
+        context.connection.info["timed_out"] = True
+
+
+class AsyncSqlQuery:
+    """
+    Awaitable `SqlQuery` read methods for request handlers. Each runs in
+    the threadpool, so its queries and the processing of their rows do
+    not block the event loop. Queries are cancelled after `timeout`
+    seconds, raising `QueryTimeoutError`, and wait for at most
+    DB_QUERY_QUEUE_TIMEOUT seconds for a slot before raising
+    `QueryLimitError`. Queries allowed more than DB_QUERY_TIMEOUT are
+    aggregates, and wait for an aggregate slot rather than a lookup one.
+    """
+
+    def __init__(self, timeout: float = DB_QUERY_TIMEOUT, gecko_source=None) -> None:
+        self.timeout = timeout
+        self.limiter = "aggregate" if timeout > DB_QUERY_TIMEOUT else "lookup"
+        self.query = SqlQuery(gecko_source=gecko_source)
+        self.engine = self.query.engine
+        if not event.contains(self.engine, "handle_error", flag_timeouts):
+            event.listen(self.engine, "handle_error", flag_timeouts)
+
+    def __getattr__(self, name):
+        if name not in READ_METHODS:
+            raise AttributeError(f"'AsyncSqlQuery' has no read method '{name}'")
+
+        async def method(*args, **kwargs):
+            return await self.run(name, *args, **kwargs)
+
+        return method
+
+    def call(self, name: str, args: tuple, kwargs: dict):
+        with self.engine.connect() as conn:
+            # Read only, so rolled back, which also ends the timeout
+            trans = conn.begin()
+            try:
+                ms = int(self.timeout * 1000)
+                conn.execute(text(f"SET LOCAL statement_timeout = {ms}"))
+                # Copied, as concurrent calls bind their own connection
+                query = copy.copy(self.query)
+                query.engine = conn
+                conn.info.pop("timed_out", None)
+                result = getattr(query, name)(*args, **kwargs)
+                if conn.info.pop("timed_out", False):
+                    msg = f"{name} exceeded its {self.timeout} second timeout"
+                    raise QueryTimeoutError(msg)
+                return result
+            finally:
+                conn.info.pop("timed_out", None)
+                trans.rollback()
+
+    async def run(self, name: str, *args, **kwargs):
+        limiter = limiters[self.limiter]
+        try:
+            await asyncio.wait_for(limiter.acquire(), DB_QUERY_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            msg = f"Too many database queries running, {name} not started"
+            raise QueryLimitError(msg)
+        try:
+            return await run_in_threadpool(self.call, name, args, kwargs)
+        finally:
+            limiter.release()
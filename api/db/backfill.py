@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from db.engines import engines
+from db.sqldb import SYNC_SOURCES, SqlSource, SqlUpdate
+from util.logger import logger, timed
+import util.defaults as default
+
+# Set in each worker process by `init_worker`, so engines (and their
+# connections) are reused for every chunk the process imports.
+worker_source = None
+worker_pgdb = None
+worker_queries = {}
+
+
+def day_start(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def chunks(start_dt: date, end_dt: date, days: int = 7) -> list:
+    """
+    Splits the days from `start_dt` to `end_dt` (inclusive) into
+    (start_time, end_time) timespans of up to `days` days each.
+    """
+    start = day_start(start_dt)
+    end = day_start(end_dt) + 86400
+    step = 86400 * days
+    return [(i, min(i + step, end)) for i in range(start, end, step)]
+
+
+def init_worker():  # pragma: no cover
+    global worker_source, worker_pgdb
+    worker_source = SqlSource()
+    worker_pgdb = SqlUpdate(db_type="pgsql")
+    # Each worker only needs one Postgres connection at a time
+    worker_pgdb.engine = engines.get(
+        "pgsql", worker_pgdb.db_url, pool_size=1, max_overflow=0
+    )
+
+
+def import_chunk(start_time: int, end_time: int) -> int:  # pragma: no cover
+    """
+    Imports swaps from both source databases which finished in the
+    timespan, and returns how many were imported. Raises if either
+    import failed, so the chunk is not checkpointed.
+    """
+    swaps = 0
+    for source in SYNC_SOURCES:
+        if source not in worker_queries:
+            worker_queries[source] = worker_source.source_query(source)
+        # Imports exclude swaps finishing at exactly `start_time`
+        counts = getattr(worker_source, f"import_{source}_swaps")(
+            worker_pgdb,
+            start_time=start_time - 1,
+            end_time=end_time,
+            source_query=worker_queries[source],
+        )
+        if "inserted" not in counts:
+            raise RuntimeError(counts.get("message"))
+        swaps += counts["inserted"] + counts["updated"]
+    return swaps
+
+
+class Progress:
+    """Throughput and ETA of a backfill, for logging"""
+
+    def __init__(self, total: int, now: float | None = None) -> None:
+        self.total = total
+        self.done = 0
+        self.swaps = 0
+        self.started = time.monotonic() if now is None else now
+
+    def update(self, swaps: int):
+        self.done += 1
+        self.swaps += swaps
+
+    def rate(self, now: float | None = None) -> float:
+        elapsed = (time.monotonic() if now is None else now) - self.started
+        return self.swaps / elapsed if elapsed > 0 else 0
+
+    def eta(self, now: float | None = None) -> float:
+        """Seconds until all chunks are done, at the rate so far"""
+        if self.done == 0:
+            return 0
+        elapsed = (time.monotonic() if now is None else now) - self.started
+        return elapsed / self.done * (self.total - self.done)
+
+    def summary(self, now: float | None = None) -> str:
+        eta = timedelta(seconds=int(self.eta(now)))
+        msg = f"{self.done}/{self.total} chunks, {self.swaps} swaps"
+        return msg + f" | {self.rate(now):.1f} swaps/sec | ETA {eta}"
+
+
+@timed
+def backfill(start_dt: date, end_dt: date, chunk_days: int = 7, workers: int = 4):
+    """
+    Imports swaps between two dates, in chunks of `chunk_days` days
+    spread over `workers` processes, which each use one Postgres
+    connection. Completed chunks are recorded in the checkpoint table
+    and skipped when the backfill is run again, so a failed or
+    interrupted backfill resumes where it left off. The summary tables
+    are rebuilt once all chunks are done.
+    """
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.init_backfill()
+    completed = set(pgdb.backfilled_chunks())
+    todo = [i for i in chunks(start_dt, end_dt, chunk_days) if i not in completed]
+    logger.info(f"Backfilling {len(todo)} chunks, {len(completed)} already done")
+    progress = Progress(len(todo))
+    failed = []
+    # Spawned, so workers do not share this process' connections
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+    with pool:
+        futures = {pool.submit(import_chunk, *i): i for i in todo}
+        for future in as_completed(futures):
+            start_time, end_time = futures[future]
+            try:
+                swaps = future.result()
+            except Exception as e:
+                msg = f"Backfill chunk {start_time} - {end_time} failed: {e}"
+                logger.warning(msg)
+                failed.append(futures[future])
+                continue
+            pgdb.complete_backfill_chunk(start_time, end_time, swaps)
+            progress.update(swaps)
+            logger.info(progress.summary())
+
+    if len(todo) > len(failed):
+        pgdb.refresh_rollups()
+        pgdb.refresh_first_last()
+    msg = f"Backfill complete: {progress.summary()}"
+    if len(failed) > 0:
+        msg += f" | {len(failed)} chunks failed, run again to retry them"
+        return default.result(msg=msg, loglevel="warning", ignore_until=0)
+    return default.result(msg=msg, loglevel="merge", ignore_until=0)
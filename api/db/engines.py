@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import threading
+from sqlalchemy.pool import QueuePool
+from sqlmodel import create_engine
+from const import DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_RECYCLE
+import util.metrics as metrics
+
+
+def pool_options(db_type: str) -> dict:
+    if db_type in ["pgsql", "mysql"]:
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_POOL_MAX_OVERFLOW,
+            # Replaces connections dropped by the server while idle
+            "pool_pre_ping": True,
+            "pool_recycle": DB_POOL_RECYCLE,
+        }
+    # SQLite file databases are opened per connection, without a pool
+    return {}
+
+
+class EngineRegistry:
+    """
+    SQLAlchemy engines shared by every SqlDB in the process, one per
+    database, so queries check out a pooled connection rather than each
+    SqlDB instance creating (and discarding) a pool of its own.
+    """
+
+    def __init__(self) -> None:
+        self.engines = {}
+        self.lock = threading.Lock()
+
+    def get(self, db_type: str, db_url: str, **kwargs):
+        """
+        Returns the engine for a database, creating it if needed.
+        Keyword arguments override the default pool options.
+        """
+        key = (db_type, db_url, tuple(sorted(kwargs.items())))
+        with self.lock:
+            if key not in self.engines:
+                options = pool_options(db_type) | kwargs
+                self.engines[key] = create_engine(db_url, **options)
+            return self.engines[key]
+
+    def stats(self) -> list:
+        data = []
+        for (db_type, _, _), engine in list(self.engines.items()):
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            data.append(
+                {
+                    "db_type": db_type,
+                    # Without credentials, as these are exposed in metrics
+                    "database": engine.url.database or engine.url.host or "",
+                    "size": pool.size(),
+                    "checked_in": pool.checkedin(),
+                    "checked_out": pool.checkedout(),
+                    "overflow": pool.overflow(),
+                }
+            )
+        return data
+
+    def dispose(self):
+        """Closes all pooled connections, e.g. after forking"""
+        with self.lock:
+            for engine in self.engines.values():
+                engine.dispose()
+            self.engines.clear()
+
+
+engines = EngineRegistry()
+
+
+@metrics.registry.collector
+def collect_engine_metrics():
+    for i in engines.stats():
+        labels = {"db_type": i.pop("db_type"), "database": i.pop("database")}
+        for state, value in i.items():
+            metrics.db_pool.set(value, state=state, **labels)
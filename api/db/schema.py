@@ -1,12 +1,52 @@
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 from util.enums import TradeType
 
 
+# `defi_swaps` columns which SqlFilter matches on, each indexed with
+# `finished_at` as every query is limited to a timespan.
+FILTER_COLUMNS = [
+    "pair_std",
+    "pair_std_reverse",
+    "maker_coin",
+    "taker_coin",
+    "maker_gui",
+    "taker_gui",
+    "maker_pubkey",
+    "taker_pubkey",
+    "maker_version",
+    "taker_version",
+]
+
+
+def swap_indexes(tablename: str) -> tuple:
+    """
+    Indexes for the hot `defi_swaps` queries. Index names must be unique
+    per schema, so they are prefixed with the table name.
+    """
+    indexes = [
+        Index(f"ix_{tablename}_finished_at", "finished_at"),
+        Index(f"ix_{tablename}_is_success_finished_at", "is_success", "finished_at"),
+        Index(f"ix_{tablename}_last_updated", "last_updated"),
+        # Last / first traded per pair only considers successful swaps
+        Index(
+            f"ix_{tablename}_pair_finished_at_success",
+            "pair",
+            "finished_at",
+            postgresql_where=text("is_success = 1"),
+        ),
+    ]
+    for i in FILTER_COLUMNS:
+        indexes.append(Index(f"ix_{tablename}_{i}_finished_at", i, "finished_at"))
+    return tuple(indexes)
+
+
 class DefiSwap(SQLModel, table=True):
     __tablename__ = "defi_swaps"
+    __table_args__ = swap_indexes("defi_swaps")
 
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: str = Field(
@@ -46,6 +86,7 @@ class DefiSwap(SQLModel, table=True):
 
 class DefiSwapTest(SQLModel, table=True):
     __tablename__ = "defi_swaps_test"
+    __table_args__ = swap_indexes("defi_swaps_test")
 
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: str = Field(
@@ -140,3 +181,202 @@ class StatsSwap(SQLModel, table=True):
     taker_coin_usd_price: Decimal = 0.00
     taker_pubkey: str = "unknown"
     maker_pubkey: str = "unknown"
+
+
+class PairStats(SQLModel):
+    """Swap stats per pair variant, summarised per hour or day."""
+
+    bucket: int = Field(default=0, primary_key=True)
+    pair: str = Field(default="XXX-PROTO_YYY-PROTO", primary_key=True)
+    pair_std: str = Field(default="XXX_YYY", index=True)
+    num_swaps: int = 0
+    base_volume: Decimal = 0
+    quote_volume: Decimal = 0
+    base_volume_usd: Decimal = 0
+    quote_volume_usd: Decimal = 0
+    price_min: Decimal = 0
+    price_max: Decimal = 0
+    price_first: Decimal = 0
+    price_last: Decimal = 0
+    first_finished_at: int = 0
+    last_finished_at: int = 0
+
+
+class CoinStats(SQLModel):
+    """Swap stats per coin variant, summarised per hour or day."""
+
+    bucket: int = Field(default=0, primary_key=True)
+    coin: str = Field(default="XXX-PROTO", primary_key=True)
+    ticker: str = Field(default="XXX", index=True)
+    maker_swaps: int = 0
+    taker_swaps: int = 0
+    maker_volume: Decimal = 0
+    taker_volume: Decimal = 0
+    maker_volume_usd: Decimal = 0
+    taker_volume_usd: Decimal = 0
+
+
+class PairStatsHourly(PairStats, table=True):
+    __tablename__ = "pair_stats_hourly"
+
+
+class PairStatsDaily(PairStats, table=True):
+    __tablename__ = "pair_stats_daily"
+
+
+class CoinStatsHourly(CoinStats, table=True):
+    __tablename__ = "coin_stats_hourly"
+
+
+class CoinStatsDaily(CoinStats, table=True):
+    __tablename__ = "coin_stats_daily"
+
+
+class PairStatsHourlyTest(PairStats, table=True):
+    __tablename__ = "pair_stats_hourly_test"
+
+
+class PairStatsDailyTest(PairStats, table=True):
+    __tablename__ = "pair_stats_daily_test"
+
+
+class CoinStatsHourlyTest(CoinStats, table=True):
+    __tablename__ = "coin_stats_hourly_test"
+
+
+class CoinStatsDailyTest(CoinStats, table=True):
+    __tablename__ = "coin_stats_daily_test"
+
+
+class FirstLastTraded(SQLModel):
+    """
+    The first and last successful swap for each value (`category`) of
+    a `defi_swaps` column, e.g. for each pair or maker gui.
+    """
+
+    column_name: str = Field(default="pair", primary_key=True)
+    category: str = Field(default="XXX-PROTO_YYY-PROTO", primary_key=True)
+    first_swap_uuid: str = ""
+    first_swap_time: int = 0
+    first_swap_price: Decimal = 0
+    first_maker_amount: Decimal = 0
+    first_taker_amount: Decimal = 0
+    first_trade_type: TradeType = "ALL"
+    last_swap_uuid: str = ""
+    last_swap_time: int = Field(default=0, index=True)
+    last_swap_price: Decimal = 0
+    last_maker_amount: Decimal = 0
+    last_taker_amount: Decimal = 0
+    last_trade_type: TradeType = "ALL"
+
+
+class FirstLastTradedTable(FirstLastTraded, table=True):
+    __tablename__ = "first_last_traded"
+
+
+class FirstLastTradedTest(FirstLastTraded, table=True):
+    __tablename__ = "first_last_traded_test"
+
+
+class SyncState(SQLModel):
+    """
+    How far swaps have been imported from a source database. `last_id`
+    is the highest source row id imported, and `finished_at` the latest
+    swap time imported (the high-water mark).
+    """
+
+    source: str = Field(default="mm2", primary_key=True)
+    last_id: int = 0
+    finished_at: int = 0
+    synced_at: int = 0
+    reconciled_at: int = 0
+
+
+class SyncStateTable(SyncState, table=True):
+    __tablename__ = "sync_state"
+
+
+class SyncStateTest(SyncState, table=True):
+    __tablename__ = "sync_state_test"
+
+
+class BackfillChunk(SQLModel):
+    """A timespan of swaps imported by `db/backfill.py`"""
+
+    start_time: int = Field(default=0, primary_key=True)
+    end_time: int = Field(default=0, primary_key=True)
+    swaps: int = 0
+    completed_at: int = 0
+
+
+class BackfillChunkTable(BackfillChunk, table=True):
+    __tablename__ = "backfill_chunks"
+
+
+class BackfillChunkTest(BackfillChunk, table=True):
+    __tablename__ = "backfill_chunks_test"
+
+
+# `defi_swaps` columns the first and last swaps are summarised for
+FIRST_LAST_COLUMNS = [
+    "pair",
+    "maker_coin",
+    "taker_coin",
+    "maker_coin_ticker",
+    "taker_coin_ticker",
+    "maker_coin_platform",
+    "taker_coin_platform",
+    "maker_gui",
+    "taker_gui",
+    "maker_pubkey",
+    "taker_pubkey",
+    "maker_version",
+    "taker_version",
+]
+
+# Rollup tables for each period, with their length in seconds
+ROLLUPS = {
+    "hourly": {"seconds": 3600, "pair": PairStatsHourly, "coin": CoinStatsHourly},
+    "daily": {"seconds": 86400, "pair": PairStatsDaily, "coin": CoinStatsDaily},
+}
+ROLLUPS_TEST = {
+    "hourly": {
+        "seconds": 3600,
+        "pair": PairStatsHourlyTest,
+        "coin": CoinStatsHourlyTest,
+    },
+    "daily": {
+        "seconds": 86400,
+        "pair": PairStatsDailyTest,
+        "coin": CoinStatsDailyTest,
+    },
+}
+
+
+# When a swap is imported again, or from another source, these columns
+# take the higher of the existing and imported values
+SWAP_MAX_COLUMNS = [
+    "taker_amount",
+    "maker_amount",
+    "started_at",
+    "finished_at",
+    "is_success",
+    "price",
+    "reverse_price",
+]
+
+# and these take the imported value, unless it is blank
+SWAP_TEXT_COLUMNS = [
+    "taker_coin",
+    "taker_coin_ticker",
+    "taker_coin_platform",
+    "taker_gui",
+    "taker_pubkey",
+    "taker_version",
+    "maker_coin",
+    "maker_coin_ticker",
+    "maker_coin_platform",
+    "maker_gui",
+    "maker_pubkey",
+    "maker_version",
+]
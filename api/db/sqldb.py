@@ -1,14 +1,30 @@
 #!/usr/bin/env python3
+import csv
+import io
 import os
+import threading
 import time
 from decimal import Decimal
 from datetime import date, datetime, timezone
 from datetime import time as dt_time
 from dotenv import load_dotenv
 from itertools import chain
-from sqlalchemy import Numeric, func
-from sqlalchemy.sql.expression import bindparam
-from sqlmodel import Session, SQLModel, create_engine, text, update, select, or_
+from sqlalchemy import (
+    Numeric,
+    case,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal,
+    literal_column,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql import column as sql_column
+from sqlalchemy.sql import table as sql_table
+from sqlmodel import Session, SQLModel, text, select, or_
 from typing import Dict
 from const import (
     MYSQL_USERNAME,
@@ -22,7 +38,26 @@ from const import (
     POSTGRES_PORT,
     MM2_DB_PATH_ALL
 )
-from db.schema import DefiSwap, DefiSwapTest, StatsSwap, CipiSwap, CipiSwapFailed
+from db.engines import engines
+from db.schema import (
+    BackfillChunkTable,
+    BackfillChunkTest,
+    DefiSwap,
+    DefiSwapTest,
+    StatsSwap,
+    CipiSwap,
+    CipiSwapFailed,
+    FirstLastTradedTable,
+    FirstLastTradedTest,
+    FIRST_LAST_COLUMNS,
+    ROLLUPS,
+    ROLLUPS_TEST,
+    SWAP_MAX_COLUMNS,
+    SWAP_TEXT_COLUMNS,
+    SyncStateTable,
+    SyncStateTest,
+)
+from util.enums import TradeType
 from util.exceptions import InvalidParamCombination
 from util.logger import logger, timed
 from util.transform import merge, sortdata, deplatform, invert, derive, template
@@ -33,6 +68,13 @@ import util.validate as validate
 
 load_dotenv()
 
+# Source databases swaps are imported from
+SYNC_SOURCES = ["cipi", "mm2"]
+
+# Held while the rollup / first last traded tables are first populated
+rollups_lock = threading.Lock()
+first_last_lock = threading.Lock()
+
 
 class SqlDB:
     def __init__(
@@ -51,8 +93,16 @@ class SqlDB:
             self.port = POSTGRES_PORT
             if os.getenv("IS_TESTING") == "True" == "True":
                 self.table = DefiSwapTest
+                self.rollups = ROLLUPS_TEST
+                self.first_last = FirstLastTradedTest
+                self.sync_state = SyncStateTest
+                self.backfill = BackfillChunkTest
             else:
                 self.table = DefiSwap
+                self.rollups = ROLLUPS
+                self.first_last = FirstLastTradedTable
+                self.sync_state = SyncStateTable
+                self.backfill = BackfillChunkTable
             self.db_url = (
                 f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}"
             )
@@ -73,9 +123,88 @@ class SqlDB:
             self.db_url = f"mysql://{self.user}:{self.password}@{self.host}:{self.port}"
             self.db_url += f"/{self.database}"
 
-        self.engine = create_engine(self.db_url)  # ), echo=True)
+        self.engine = engines.get(self.db_type, self.db_url)
         self.sqlfilter = SqlFilter(self.table)
 
+    def rollups_populated(self, period: str = "hourly") -> bool:
+        """
+        Whether the rollup tables have been populated. They are filled
+        in the background after the tables are created, and until then
+        stats are aggregated from the swaps table instead.
+        """
+        try:
+            table = self.rollups[period]["pair"]
+            with Session(self.engine) as session:
+                return session.query(table.bucket).limit(1).first() is not None
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"Failed to check {period} rollups: {e}")
+            return False
+
+    def bucket_swaps(self, q, seconds: int, start: int, end: int):
+        bucket = self.table.finished_at - self.table.finished_at % seconds
+        q = q.filter(self.table.is_success == 1)
+        q = q.filter(self.table.finished_at >= start, self.table.finished_at < end)
+        return q, bucket
+
+    def pair_rollup_query(self, session, seconds: int, start: int, end: int):
+        """Returns the pair stats rows of buckets from start to end"""
+        is_buy = self.table.trade_type == TradeType.BUY
+        base_amount = case((is_buy, self.table.maker_amount), else_=self.table.taker_amount)
+        quote_amount = case((is_buy, self.table.taker_amount), else_=self.table.maker_amount)
+        base_usd = case(
+            (is_buy, self.table.maker_coin_usd_price),
+            else_=self.table.taker_coin_usd_price,
+        )
+        quote_usd = case(
+            (is_buy, self.table.taker_coin_usd_price),
+            else_=self.table.maker_coin_usd_price,
+        )
+        first = aggregate_order_by(
+            self.table.price, self.table.finished_at, self.table.id
+        )
+        last = aggregate_order_by(
+            self.table.price,
+            self.table.finished_at.desc(),
+            self.table.id.desc(),
+        )
+        q, bucket = self.bucket_swaps(session.query(), seconds, start, end)
+        q = q.add_columns(
+            bucket.label("bucket"),
+            self.table.pair.label("pair"),
+            self.table.pair_std.label("pair_std"),
+            func.count(self.table.id).label("num_swaps"),
+            func.sum(base_amount).label("base_volume"),
+            func.sum(quote_amount).label("quote_volume"),
+            func.sum(base_amount * base_usd).label("base_volume_usd"),
+            func.sum(quote_amount * quote_usd).label("quote_volume_usd"),
+            func.min(self.table.price).label("price_min"),
+            func.max(self.table.price).label("price_max"),
+            array_agg(first)[1].label("price_first"),
+            array_agg(last)[1].label("price_last"),
+            func.min(self.table.finished_at).label("first_finished_at"),
+            func.max(self.table.finished_at).label("last_finished_at"),
+        )
+        return q.group_by(bucket, self.table.pair, self.table.pair_std)
+
+    def coin_rollup_query(
+        self, session, side: str, seconds: int, start: int, end: int
+    ):
+        """Returns a side's coin stats rows of buckets in the timespan"""
+        coin = getattr(self.table, f"{side}_coin")
+        ticker = getattr(self.table, f"{side}_coin_ticker")
+        amount = getattr(self.table, f"{side}_amount")
+        usd_price = getattr(self.table, f"{side}_coin_usd_price")
+        q, bucket = self.bucket_swaps(session.query(), seconds, start, end)
+        q = q.add_columns(
+            bucket.label("bucket"),
+            coin.label("coin"),
+            ticker.label("ticker"),
+            func.count(self.table.id).label(f"{side}_swaps"),
+            func.sum(amount).label(f"{side}_volume"),
+            func.sum(amount * usd_price).label(f"{side}_volume_usd"),
+        )
+        return q.group_by(bucket, coin, ticker)
+
 
 class SqlFilter:
     def __init__(self, table=DefiSwap) -> None:
@@ -120,8 +249,8 @@ class SqlFilter:
         if pubkey is not None:
             q = q.filter(
                 or_(
-                    pubkey == self.table.pubkey_gui,
-                    pubkey == self.table.pubkey_gui,
+                    pubkey == self.table.maker_pubkey,
+                    pubkey == self.table.taker_pubkey,
                 )
             )
         return q
@@ -165,8 +294,8 @@ class SqlFilter:
         if version is not None:
             q = q.filter(
                 or_(
-                    version == self.table.version_gui,
-                    version == self.table.version_gui,
+                    version == self.table.maker_version,
+                    version == self.table.taker_version,
                 )
             )
         return q
@@ -191,6 +320,409 @@ class SqlUpdate(SqlDB):
         except Exception as e:  # pragma: no cover
             logger.warning(e)
 
+    @timed
+    def upsert_swaps(self, swaps: list):
+        """
+        Merges swaps into the swaps table. They are staged in a temporary
+        table with COPY, then inserted in one statement which reconciles
+        conflicts with the existing row: amounts, prices, timestamps and
+        status take the higher value, blank text fields keep the existing
+        value, and the pair / trade type columns are kept as they are.
+        Returns the number of swaps inserted and updated, and the earliest
+        time the updated swaps had finished at before, as a later finish
+        time moves them to another rollup bucket.
+        """
+        try:
+            table = self.table.__table__
+            cols = [i for i in table.columns if i.name != "id"]
+            names = [i.name for i in cols]
+            # Enums are stored by name, so values are processed by type
+            processors = [i.type.bind_processor(self.engine.dialect) for i in cols]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for swap in swaps:
+                row = []
+                for k, process in zip(names, processors):
+                    v = swap.get(k)
+                    if v is not None and process is not None:
+                        v = process(v)
+                    row.append("\\N" if v is None else v)
+                writer.writerow(row)
+            buffer.seek(0)
+
+            staged = sql_table("swaps_import", *[sql_column(i) for i in names])
+            q = (
+                select(*[staged.c[i] for i in names])
+                .distinct(staged.c.uuid)
+                .order_by(staged.c.uuid, staged.c.last_updated.desc())
+            )
+            stmt = pg_insert(table).from_select(names, q)
+            new = stmt.excluded
+            values = {i: func.greatest(table.c[i], new[i]) for i in SWAP_MAX_COLUMNS}
+            for i in SWAP_TEXT_COLUMNS:
+                values[i] = case(
+                    (new[i].in_(["", "None", "unknown"]), table.c[i]), else_=new[i]
+                )
+            values["duration"] = values["finished_at"] - values["started_at"]
+            values["last_updated"] = new.last_updated
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["uuid"], set_=values
+            ).returning(literal_column("xmax = 0"))
+
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "CREATE TEMP TABLE swaps_import ON COMMIT DROP AS "
+                        f"SELECT {', '.join(names)} FROM {table.name} WITH NO DATA"
+                    )
+                )
+                cursor = conn.connection.cursor()
+                cursor.copy_expert(
+                    f"COPY swaps_import ({', '.join(names)}) FROM STDIN "
+                    "WITH (FORMAT csv, NULL '\\N')",
+                    buffer,
+                )
+                previous = conn.execute(
+                    select(func.min(table.c.finished_at)).where(
+                        table.c.uuid.in_(select(staged.c.uuid))
+                    )
+                ).scalar()
+                inserted = [i[0] for i in conn.execute(stmt)]
+            data = {
+                "inserted": inserted.count(True),
+                "updated": inserted.count(False),
+                "previous_finished_at": previous,
+            }
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"{data['inserted']} swaps added, {data['updated']} updated"
+        return default.result(data=data, msg=msg, loglevel="updated", ignore_until=5)
+
+    @timed
+    def init_rollups(self):
+        """
+        Creates any missing rollup tables. They are left empty, to be
+        populated by `populate_rollups` once the API is serving.
+        """
+        try:
+            tables = [
+                j.__table__
+                for i in self.rollups.values()
+                for j in [i["pair"], i["coin"]]
+            ]
+            with self.engine.connect() as conn:
+                missing = [
+                    i for i in tables if not self.engine.dialect.has_table(conn, i.name)
+                ]
+            if len(missing) == 0:
+                return default.result(msg="Rollup tables exist", loglevel="muted")
+            SQLModel.metadata.create_all(self.engine, tables=missing)
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Created rollup tables: {[i.name for i in missing]}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def populate_rollups(self):
+        """
+        Summarises all swaps into the rollup tables if they are empty.
+        Skipped while another thread is populating them.
+        """
+        if not rollups_lock.acquire(blocking=False):
+            msg = "Rollup tables are being populated"
+            return default.result(msg=msg, loglevel="muted")
+        try:
+            if self.rollups_populated():
+                return default.result(msg="Rollup tables populated", loglevel="muted")
+            self.refresh_rollups()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        finally:
+            rollups_lock.release()
+        msg = "Populated rollup tables"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def refresh_rollups(self, start_time: int = 0, end_time: int = 0):
+        """
+        Recalculates the hourly and daily pair / coin stats tables for
+        all buckets overlapping the given timespan. Buckets are rebuilt
+        from `defi_swaps` rather than adjusted, so swaps which have been
+        updated or failed since the last refresh are accounted for.
+        If no start time is given, all swaps are summarised.
+        """
+        try:
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            with Session(self.engine) as session:
+                if start_time == 0:
+                    start_time = session.query(func.min(self.table.finished_at))
+                    start_time = start_time.scalar() or 0
+                for period, rollup in self.rollups.items():
+                    seconds = rollup["seconds"]
+                    start = int(start_time) - int(start_time) % seconds
+                    end = int(end_time) - int(end_time) % seconds + seconds
+                    for table in [rollup["pair"], rollup["coin"]]:
+                        session.execute(
+                            delete(table)
+                            .where(table.bucket >= start)
+                            .where(table.bucket < end)
+                        )
+                    self.rollup_pairs(session, rollup["pair"], seconds, start, end)
+                    self.rollup_coins(session, rollup["coin"], seconds, start, end)
+                session.commit()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Rollups refreshed from {start_time} - {end_time}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=5)
+
+    @timed
+    def init_first_last(self):
+        """
+        Creates the first / last traded table if missing. It is left
+        empty, to be filled by `populate_first_last` once the API is
+        serving, and `last_trade` queries the swaps table until then.
+        """
+        try:
+            table = self.first_last.__table__
+            with self.engine.connect() as conn:
+                if self.engine.dialect.has_table(conn, table.name):
+                    msg = "First / last traded table exists"
+                    return default.result(msg=msg, loglevel="muted")
+            SQLModel.metadata.create_all(self.engine, tables=[table])
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Created {table.name}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    def first_last_populated(self) -> bool:
+        try:
+            with Session(self.engine) as session:
+                q = session.query(self.first_last.column_name).limit(1)
+                return q.first() is not None
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"Failed to check first / last traded table: {e}")
+            return False
+
+    @timed
+    def populate_first_last(self):
+        """
+        Fills the first / last traded table from all swaps if it is
+        empty. Skipped while another thread is filling it.
+        """
+        if not first_last_lock.acquire(blocking=False):
+            msg = "First / last traded table is being populated"
+            return default.result(msg=msg, loglevel="muted")
+        try:
+            if self.first_last_populated():
+                msg = "First / last traded table populated"
+                return default.result(msg=msg, loglevel="muted")
+            self.refresh_first_last()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        finally:
+            first_last_lock.release()
+        msg = "Populated first / last traded table"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def init_indexes(self):
+        """
+        Creates any of the swaps table's indexes which are missing, e.g.
+        those added to `db/schema.py` since the table was created. They
+        are built concurrently, so imports are not blocked meanwhile.
+        """
+        try:
+            table = self.table.__table__
+            with self.engine.connect() as conn:
+                existing = [
+                    i["name"] for i in inspect(conn).get_indexes(table.name)
+                ]
+            missing = [i for i in table.indexes if i.name not in existing]
+            if len(missing) == 0:
+                return default.result(msg="Swap indexes exist", loglevel="muted")
+            # CONCURRENTLY can not be used inside a transaction
+            engine = self.engine.execution_options(isolation_level="AUTOCOMMIT")
+            with engine.connect() as conn:
+                for i in missing:
+                    ddl = str(CreateIndex(i).compile(dialect=engine.dialect))
+                    ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                    conn.execute(text(ddl))
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Created indexes on {table.name}: {[i.name for i in missing]}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def init_sync_state(self):
+        """Creates the sync state table if missing"""
+        try:
+            table = self.sync_state.__table__
+            with self.engine.connect() as conn:
+                if self.engine.dialect.has_table(conn, table.name):
+                    msg = "Sync state table exists"
+                    return default.result(msg=msg, loglevel="muted")
+            SQLModel.metadata.create_all(self.engine, tables=[table])
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Created {table.name}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def get_sync_state(self, source: str):
+        """
+        Returns the sync state of a source database, which is empty if
+        it has not been synced yet.
+        """
+        try:
+            with Session(self.engine) as session:
+                state = session.get(self.sync_state, source)
+                data = {} if state is None else state.dict()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Got {source} sync state"
+        return default.result(data=data, msg=msg, loglevel="muted")
+
+    @timed
+    def set_sync_state(self, source: str, **kwargs):
+        try:
+            stmt = pg_insert(self.sync_state).values(source=source, **kwargs)
+            stmt = stmt.on_conflict_do_update(index_elements=["source"], set_=kwargs)
+            with Session(self.engine) as session:
+                session.execute(stmt)
+                session.commit()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"{source} sync state updated: {kwargs}"
+        return default.result(msg=msg, loglevel="muted")
+
+    @timed
+    def init_backfill(self):
+        """Creates the backfill checkpoint table if missing"""
+        try:
+            table = self.backfill.__table__
+            with self.engine.connect() as conn:
+                if self.engine.dialect.has_table(conn, table.name):
+                    msg = "Backfill checkpoint table exists"
+                    return default.result(msg=msg, loglevel="muted")
+            SQLModel.metadata.create_all(self.engine, tables=[table])
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Created {table.name}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=0)
+
+    @timed
+    def backfilled_chunks(self) -> list:
+        """Returns the (start_time, end_time) of each completed chunk"""
+        try:
+            with Session(self.engine) as session:
+                q = session.query(self.backfill.start_time, self.backfill.end_time)
+                data = [tuple(i) for i in q.all()]
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"{len(data)} backfill chunks completed"
+        return default.result(data=data, msg=msg, loglevel="muted")
+
+    @timed
+    def complete_backfill_chunk(self, start_time: int, end_time: int, swaps: int):
+        try:
+            values = {"swaps": swaps, "completed_at": int(cron.now_utc())}
+            stmt = pg_insert(self.backfill).values(
+                start_time=start_time, end_time=end_time, **values
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["start_time", "end_time"], set_=values
+            )
+            with Session(self.engine) as session:
+                session.execute(stmt)
+                session.commit()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Backfill chunk {start_time} - {end_time} completed"
+        return default.result(msg=msg, loglevel="muted")
+
+    @timed
+    def refresh_first_last(self, start_time: int = 0, end_time: int = 0):
+        """
+        Updates the first / last traded table with successful swaps which
+        finished in the given timespan. A category's first swap is only
+        replaced by an earlier one and its last by a later one, so
+        importers only need to pass the timespan they imported.
+        If no start time is given, the table is rebuilt from all swaps.
+        """
+        try:
+            with Session(self.engine) as session:
+                if start_time == 0:
+                    session.execute(delete(self.first_last))
+                for column in FIRST_LAST_COLUMNS:
+                    for side in ["first", "last"]:
+                        self.upsert_first_last(
+                            session, column, side, start_time, end_time
+                        )
+                session.commit()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"First / last traded refreshed from {start_time} - {end_time}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=5)
+
+    def upsert_first_last(
+        self, session, column: str, side: str, start_time: int, end_time: int
+    ):
+        category = getattr(self.table, column)
+        fields = {
+            "swap_uuid": self.table.uuid,
+            "swap_time": self.table.finished_at,
+            "swap_price": self.table.price,
+            "maker_amount": self.table.maker_amount,
+            "taker_amount": self.table.taker_amount,
+            "trade_type": self.table.trade_type,
+        }
+        if side == "first":
+            order = [self.table.finished_at.asc(), self.table.id.asc()]
+        else:
+            order = [self.table.finished_at.desc(), self.table.id.desc()]
+        # New categories get the same swap as first and last, and the
+        # other side is then updated by its own pass. Both are always
+        # inserted, as NOT NULL is checked before conflicts are.
+        sides = ["first", "last"]
+        q = session.query(
+            literal(column), category, *[v for i in sides for v in fields.values()]
+        )
+        q = q.filter(self.table.is_success == 1, category.isnot(None))
+        if start_time != 0:
+            q = q.filter(self.table.finished_at >= start_time)
+        if end_time != 0:
+            q = q.filter(self.table.finished_at <= end_time)
+        q = q.distinct(category).order_by(category, *order)
+        cols = ["column_name", "category"] + [f"{i}_{k}" for i in sides for k in fields]
+        stmt = pg_insert(self.first_last).from_select(
+            cols, q.subquery().select(), include_defaults=False
+        )
+        current = self.first_last.__table__.c[f"{side}_swap_time"]
+        new = stmt.excluded[f"{side}_swap_time"]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["column_name", "category"],
+            set_={f"{side}_{k}": stmt.excluded[f"{side}_{k}"] for k in fields},
+            where=new < current if side == "first" else new > current,
+        )
+        session.execute(stmt)
+
+    def rollup_pairs(self, session, table, seconds: int, start: int, end: int):
+        q = self.pair_rollup_query(session, seconds, start, end)
+        cols = [i["name"] for i in q.column_descriptions]
+        session.execute(insert(table).from_select(cols, q.subquery().select()))
+
+    def rollup_coins(self, session, table, seconds: int, start: int, end: int):
+        for side in ["maker", "taker"]:
+            q = self.coin_rollup_query(session, side, seconds, start, end)
+            cols = [i["name"] for i in q.column_descriptions]
+            stmt = pg_insert(table).from_select(cols, q.subquery().select())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["bucket", "coin"],
+                set_={i: stmt.excluded[i] for i in cols[3:]},
+            )
+            session.execute(stmt)
+
 
 class SqlQuery(SqlDB):
     def __init__(
@@ -230,19 +762,6 @@ class SqlQuery(SqlDB):
             if end_time == 0:
                 end_time = int(cron.now_utc())
 
-            resp = {
-                "start_time": start_time,
-                "end_time": end_time,
-                "range_days": (end_time - start_time) / 86400,
-                "total_swaps": 0,
-                "maker_volume_usd": 0,
-                "taker_volume_usd": 0,
-                "trade_volume_usd": 0,
-                "volumes": {},
-            }
-            total_maker_swaps = 0
-            total_taker_swaps = 0
-
             with Session(self.engine) as session:
                 q = session.query(
                     func.sum(func.cast(self.table.maker_amount, Numeric)).label(
@@ -262,35 +781,7 @@ class SqlQuery(SqlDB):
                 q = q.order_by(
                     self.table.maker_coin, self.table.maker_coin_ticker.desc()
                 )
-                data = [dict(i) for i in q.all()]
-
-            for i in data:
-                ticker = i["ticker"]
-                variant = i["coin"]
-                num_swaps = int(i["num_swaps"])
-                maker_vol = Decimal(i["maker_volume"])
-
-                if ticker not in resp["volumes"]:
-                    resp["volumes"].update(
-                        {ticker: {"ALL": template.coin_trade_vol_item()}}
-                    )
-
-                if variant not in resp["volumes"][ticker]:
-                    resp["volumes"][ticker].update(
-                        {variant: template.coin_trade_vol_item()}
-                    )
-
-                total_maker_swaps += num_swaps
-                resp["volumes"][ticker][variant]["maker_swaps"] += num_swaps
-                resp["volumes"][ticker][variant]["maker_volume"] += maker_vol
-                resp["volumes"][ticker][variant]["total_swaps"] += num_swaps
-                resp["volumes"][ticker][variant]["total_volume"] += maker_vol
-
-                resp["volumes"][ticker]["ALL"]["maker_swaps"] += num_swaps
-                resp["volumes"][ticker]["ALL"]["maker_volume"] += maker_vol
-                resp["volumes"][ticker]["ALL"]["total_volume"] += maker_vol
-                resp["volumes"][ticker]["ALL"]["total_swaps"] += num_swaps
-                resp["total_swaps"] += num_swaps
+                maker_data = [dict(i) for i in q.all()]
 
             with Session(self.engine) as session:
                 q = session.query(
@@ -311,13 +802,41 @@ class SqlQuery(SqlDB):
                 q = q.order_by(
                     self.table.taker_coin, self.table.taker_coin_ticker.desc()
                 )
-                data = [dict(i) for i in q.all()]
+                taker_data = [dict(i) for i in q.all()]
+
+            resp = self.coin_volumes_from_rows(
+                maker_data, taker_data, start_time, end_time
+            )
+            return default.result(
+                data=resp, msg="coin_trade_volumes complete", loglevel="debug"
+            )
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
 
+    def coin_volumes_from_rows(
+        self, maker_data: list, taker_data: list, start_time: int, end_time: int
+    ) -> dict:
+        """
+        Formats maker and taker volumes grouped by coin and ticker, as
+        returned by `coin_trade_volumes` queries, into the volumes dict.
+        """
+        resp = {
+            "start_time": start_time,
+            "end_time": end_time,
+            "range_days": (end_time - start_time) / 86400,
+            "total_swaps": 0,
+            "maker_volume_usd": 0,
+            "taker_volume_usd": 0,
+            "trade_volume_usd": 0,
+            "volumes": {},
+        }
+        total_swaps = {"maker": 0, "taker": 0}
+        for side, data in [("maker", maker_data), ("taker", taker_data)]:
             for i in data:
                 ticker = i["ticker"]
                 variant = i["coin"]
                 num_swaps = int(i["num_swaps"])
-                taker_vol = Decimal(i["taker_volume"])
+                vol = Decimal(i[f"{side}_volume"])
 
                 if ticker not in resp["volumes"]:
                     resp["volumes"].update(
@@ -329,28 +848,18 @@ class SqlQuery(SqlDB):
                         {variant: template.coin_trade_vol_item()}
                     )
 
-                total_taker_swaps += num_swaps
-                resp["volumes"][ticker][variant]["taker_volume"] += taker_vol
-                resp["volumes"][ticker][variant]["total_volume"] += taker_vol
-                resp["volumes"][ticker][variant]["taker_swaps"] += num_swaps
-                resp["volumes"][ticker][variant]["total_swaps"] += num_swaps
+                total_swaps[side] += num_swaps
+                for j in [variant, "ALL"]:
+                    resp["volumes"][ticker][j][f"{side}_swaps"] += num_swaps
+                    resp["volumes"][ticker][j][f"{side}_volume"] += vol
+                    resp["volumes"][ticker][j]["total_swaps"] += num_swaps
+                    resp["volumes"][ticker][j]["total_volume"] += vol
 
-                resp["volumes"][ticker]["ALL"]["taker_swaps"] += num_swaps
-                resp["volumes"][ticker]["ALL"]["taker_volume"] += taker_vol
-                resp["volumes"][ticker]["ALL"]["total_swaps"] += num_swaps
-                resp["volumes"][ticker]["ALL"]["total_volume"] += taker_vol
-
-                resp["total_swaps"] += num_swaps
-
-            # Swap counts halved, avoid double counts from coins in pair
-            resp.update(
-                {"total_swaps": int((total_maker_swaps + total_taker_swaps) / 2)}
-            )
-            return default.result(
-                data=resp, msg="coin_trade_volumes complete", loglevel="debug"
-            )
-        except Exception as e:  # pragma: no cover
-            return default.result(msg=e, loglevel="warning")
+        # Swap counts halved, avoid double counts from coins in pair
+        resp.update(
+            {"total_swaps": int((total_swaps["maker"] + total_swaps["taker"]) / 2)}
+        )
+        return resp
 
     @timed
     def coin_trade_volumes_usd(self, volumes: Dict) -> list:
@@ -411,17 +920,6 @@ class SqlQuery(SqlDB):
             if end_time == 0:
                 end_time = int(cron.now_utc())
 
-            resp = {
-                "start_time": start_time,
-                "end_time": end_time,
-                "range_days": int((end_time - start_time) / 86400),
-                "total_swaps": 0,
-                "base_volume_usd": 0,
-                "quote_volume_usd": 0,
-                "trade_volume_usd": 0,
-                "volumes": {},
-            }
-            suffix = derive.suffix(resp["range_days"])
             with Session(self.engine) as session:
                 q = session.query(
                     self.table.pair,
@@ -445,34 +943,7 @@ class SqlQuery(SqlDB):
                 q = q.order_by(self.table.pair.asc())
                 data = [dict(i) for i in q.all()]
 
-            for i in data:
-                variant = i["pair"]
-                depair = deplatform.pair(variant)
-                if depair not in resp["volumes"]:
-                    resp["volumes"].update(
-                        {depair: {"ALL": template.pair_volume_item(suffix=suffix)}}
-                    )
-                if variant not in resp["volumes"][depair]:
-                    resp["volumes"][depair].update(
-                        {variant: template.pair_volume_item(suffix=suffix)}
-                    )
-
-                num_swaps = int(i["num_swaps"])
-                if i["trade_type"] == "buy":
-                    base_vol = Decimal(i["maker_volume"])
-                    quote_vol = Decimal(i["taker_volume"])
-
-                elif i["trade_type"] == "sell":
-                    base_vol = Decimal(i["taker_volume"])
-                    quote_vol = Decimal(i["maker_volume"])
-                resp["volumes"][depair]["ALL"][f"trades_{suffix}"] += num_swaps
-                resp["volumes"][depair]["ALL"]["base_volume"] += base_vol
-                resp["volumes"][depair]["ALL"]["quote_volume"] += quote_vol
-                resp["volumes"][depair][variant][f"trades_{suffix}"] += num_swaps
-                resp["volumes"][depair][variant]["base_volume"] += base_vol
-                resp["volumes"][depair][variant]["quote_volume"] += quote_vol
-                resp["total_swaps"] += num_swaps
-
+            resp = self.pair_volumes_from_rows(data, start_time, end_time)
             return default.result(
                 data=resp,
                 msg="pair_trade_volumes complete",
@@ -482,6 +953,53 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
+    def pair_volumes_from_rows(
+        self, data: list, start_time: int, end_time: int
+    ) -> dict:
+        """
+        Formats volumes grouped by pair and trade type, as returned by
+        `pair_trade_volumes` queries, into the volumes dict.
+        """
+        resp = {
+            "start_time": start_time,
+            "end_time": end_time,
+            "range_days": int((end_time - start_time) / 86400),
+            "total_swaps": 0,
+            "base_volume_usd": 0,
+            "quote_volume_usd": 0,
+            "trade_volume_usd": 0,
+            "volumes": {},
+        }
+        suffix = derive.suffix(resp["range_days"])
+        for i in data:
+            variant = i["pair"]
+            depair = deplatform.pair(variant)
+            if depair not in resp["volumes"]:
+                resp["volumes"].update(
+                    {depair: {"ALL": template.pair_volume_item(suffix=suffix)}}
+                )
+            if variant not in resp["volumes"][depair]:
+                resp["volumes"][depair].update(
+                    {variant: template.pair_volume_item(suffix=suffix)}
+                )
+
+            num_swaps = int(i["num_swaps"])
+            if i["trade_type"] == "buy":
+                base_vol = Decimal(i["maker_volume"])
+                quote_vol = Decimal(i["taker_volume"])
+
+            elif i["trade_type"] == "sell":
+                base_vol = Decimal(i["taker_volume"])
+                quote_vol = Decimal(i["maker_volume"])
+            resp["volumes"][depair]["ALL"][f"trades_{suffix}"] += num_swaps
+            resp["volumes"][depair]["ALL"]["base_volume"] += base_vol
+            resp["volumes"][depair]["ALL"]["quote_volume"] += quote_vol
+            resp["volumes"][depair][variant][f"trades_{suffix}"] += num_swaps
+            resp["volumes"][depair][variant]["base_volume"] += base_vol
+            resp["volumes"][depair][variant]["quote_volume"] += quote_vol
+            resp["total_swaps"] += num_swaps
+        return resp
+
     @timed
     def pair_trade_volumes_usd(self, volumes: Dict) -> list:
         """
@@ -537,11 +1055,173 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
+    @timed
+    def pair_stats(
+        self,
+        start_time: int = 0,
+        end_time: int = 0,
+        pair_str: str | None = None,
+        period: str = "daily",
+    ) -> list:
+        """
+        Returns hourly or daily stats for each pair variant between two
+        timestamps from the rollup tables, ordered by bucket. Buckets
+        which overlap the start or end time are included.
+        If no timestamp is given, returns data for last 24 hrs.
+        """
+        try:
+            if start_time == 0:
+                start_time = int(cron.now_utc()) - 86400
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            table = self.rollups[period]["pair"]
+            seconds = self.rollups[period]["seconds"]
+            if not self.rollups_populated(period):
+                data = self.live_pair_stats(start_time, end_time, pair_str, seconds)
+                return default.result(
+                    data=data, msg="pair_stats complete (live)", loglevel="query"
+                )
+            with Session(self.engine) as session:
+                q = session.query(table)
+                q = q.filter(table.bucket > start_time - seconds)
+                q = q.filter(table.bucket < end_time)
+                if pair_str is not None:
+                    q = q.filter(table.pair_std == deplatform.pair(pair_str))
+                q = q.order_by(table.bucket, table.pair)
+                data = [i.dict() for i in q.all()]
+            return default.result(
+                data=data, msg="pair_stats complete", loglevel="query"
+            )
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    @timed
+    def coin_stats(
+        self,
+        start_time: int = 0,
+        end_time: int = 0,
+        coin: str | None = None,
+        period: str = "daily",
+    ) -> list:
+        """
+        Returns hourly or daily stats for each coin variant between two
+        timestamps from the rollup tables, ordered by bucket. Buckets
+        which overlap the start or end time are included.
+        If no timestamp is given, returns data for last 24 hrs.
+        """
+        try:
+            if start_time == 0:
+                start_time = int(cron.now_utc()) - 86400
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            table = self.rollups[period]["coin"]
+            seconds = self.rollups[period]["seconds"]
+            if not self.rollups_populated(period):
+                data = self.live_coin_stats(start_time, end_time, coin, seconds)
+                return default.result(
+                    data=data, msg="coin_stats complete (live)", loglevel="query"
+                )
+            with Session(self.engine) as session:
+                q = session.query(table)
+                q = q.filter(table.bucket > start_time - seconds)
+                q = q.filter(table.bucket < end_time)
+                if coin is not None:
+                    q = q.filter(table.ticker == deplatform.coin(coin))
+                q = q.order_by(table.bucket, table.coin)
+                data = [i.dict() for i in q.all()]
+            return default.result(
+                data=data, msg="coin_stats complete", loglevel="query"
+            )
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    def live_buckets(self, start_time: int, end_time: int, seconds: int):
+        """
+        Returns the timespan of the buckets `pair_stats` and `coin_stats`
+        include, which overlap the start or end time.
+        """
+        start = int(start_time) - int(start_time) % seconds
+        end = -(-int(end_time) // seconds) * seconds
+        return start, end
+
+    def live_pair_stats(self, start_time, end_time, pair_str, seconds: int) -> list:
+        """As `pair_stats`, aggregated from the swaps table"""
+        start, end = self.live_buckets(start_time, end_time, seconds)
+        with Session(self.engine) as session:
+            q = self.pair_rollup_query(session, seconds, start, end)
+            if pair_str is not None:
+                q = q.filter(self.table.pair_std == deplatform.pair(pair_str))
+            data = [dict(i._mapping) for i in q.all()]
+        return sorted(data, key=lambda i: (i["bucket"], i["pair"]))
+
+    def live_coin_stats(self, start_time, end_time, coin, seconds: int) -> list:
+        """As `coin_stats`, aggregated from the swaps table"""
+        start, end = self.live_buckets(start_time, end_time, seconds)
+        data = {}
+        with Session(self.engine) as session:
+            for side in ["maker", "taker"]:
+                q = self.coin_rollup_query(session, side, seconds, start, end)
+                if coin is not None:
+                    ticker = getattr(self.table, f"{side}_coin_ticker")
+                    q = q.filter(ticker == deplatform.coin(coin))
+                for row in q.all():
+                    row = dict(row._mapping)
+                    key = (row["bucket"], row["coin"])
+                    if key not in data:
+                        data[key] = {
+                            "maker_swaps": 0,
+                            "taker_swaps": 0,
+                            "maker_volume": Decimal(0),
+                            "taker_volume": Decimal(0),
+                            "maker_volume_usd": Decimal(0),
+                            "taker_volume_usd": Decimal(0),
+                        }
+                    data[key].update(row)
+        return [data[i] for i in sorted(data)]
+
+    @timed
+    def daily_coin_volumes(
+        self, coin: str, days: int = 1, variants: list | None = None
+    ) -> Dict:
+        """
+        Returns total volume traded of a coin for each of the last `days`
+        days (UTC), optionally limited to some of the coin's variants.
+        """
+        try:
+            today = int(cron.now_utc()) - int(cron.now_utc()) % 86400
+            start_time = today - 86400 * (int(days) - 1)
+            rows = self.coin_stats(
+                start_time=start_time, end_time=today + 86400, coin=coin
+            )
+            volumes = {i: Decimal(0) for i in range(today, start_time - 1, -86400)}
+            for i in rows:
+                if variants is None or i["coin"] in variants:
+                    volumes[i["bucket"]] += i["maker_volume"] + i["taker_volume"]
+            data = {
+                datetime.fromtimestamp(k, timezone.utc).strftime("%Y-%m-%d"): v
+                for k, v in volumes.items()
+            }
+            return default.result(
+                data=data, msg="daily_coin_volumes complete", loglevel="query"
+            )
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
     # TODO: Pair swap duration stats.
     # Fastest, slowest, average, [x,y] for graph
     # TODO: Subclass 'last trade'
     @timed
     def last_trade(self, group_by_cols, is_success: bool = True, since=0):
+        if (
+            len(group_by_cols) == 1
+            and group_by_cols[0].key in FIRST_LAST_COLUMNS
+            and is_success
+            and since == 0
+        ):
+            data = self.first_last_traded(group_by_cols[0].key)
+            # Empty until the table is filled by `populate_first_last`
+            if isinstance(data, dict) and len(data) > 0:
+                return data
         try:
             with Session(self.engine) as session:
                 resp = {}
@@ -609,6 +1289,26 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
+    @timed
+    def first_last_traded(self, column: str):
+        """
+        Returns the first and last successful swap for each value of a
+        `defi_swaps` column from the first / last traded table, in the
+        same format as `last_trade`.
+        """
+        try:
+            with Session(self.engine) as session:
+                q = session.query(self.first_last)
+                q = q.filter(self.first_last.column_name == column)
+                data = {
+                    i.category: i.dict(exclude={"column_name", "category"})
+                    for i in q.all()
+                }
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"first_last_traded for {column} complete"
+        return default.result(data=data, msg=msg, loglevel="query", ignore_until=5)
+
     @timed
     def pair_last_trade(self, is_success: bool = True, since=0):
         try:
@@ -840,7 +1540,7 @@ class SqlQuery(SqlDB):
                     variants = derive.pair_variants(pair_str)
                     for variant in variants:
                         # exclude duplication for bridge swaps
-                        if bridge_swap and variant != sortdata.pair_by_market_cap(
+                        if bridge_swap and sortdata.is_reversed(
                             variant, gecko_source=self.gecko_source
                         ):
                             continue
@@ -890,6 +1590,66 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
+    @timed
+    def swaps_updated_since(self, last_updated: int = 0, start_time: int = 0):
+        """
+        Returns the volume and price columns of all swaps (successful or
+        not) added or updated since `last_updated`, which finished after
+        `start_time`. Used for incremental aggregation.
+        """
+        try:
+            with Session(self.engine) as session:
+                q = session.query(
+                    self.table.uuid,
+                    self.table.pair,
+                    self.table.trade_type,
+                    self.table.is_success,
+                    self.table.maker_coin,
+                    self.table.maker_coin_ticker,
+                    self.table.maker_amount,
+                    self.table.taker_coin,
+                    self.table.taker_coin_ticker,
+                    self.table.taker_amount,
+                    self.table.price,
+                    self.table.reverse_price,
+                    self.table.finished_at,
+                    self.table.last_updated,
+                )
+                q = q.filter(
+                    self.table.last_updated >= last_updated,
+                    self.table.finished_at > start_time,
+                )
+                q = q.order_by(self.table.last_updated)
+                data = [dict(i) for i in q.all()]
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Got {len(data)} swaps updated since {last_updated}"
+        return default.result(data=data, msg=msg, loglevel="query", ignore_until=3)
+
+    @timed
+    def swaps_since_id(self, last_id: int = 0, start_time: int = 0):
+        """
+        Returns successful swaps from a source database with a row id
+        above `last_id`, ordered by id. Rows are only ever appended to
+        the source databases, so this returns the swaps added since the
+        row `last_id` was read. Optionally limited to swaps which
+        finished (or for Cipi's database, started) after `start_time`.
+        """
+        try:
+            if self.table.__tablename__ in ["swaps", "swaps_failed"]:
+                start_time = datetime.fromtimestamp(start_time, timezone.utc)
+            with Session(self.engine) as session:
+                q = select(self.table).where(self.table.id > last_id)
+                q = self.sqlfilter.since(q, start_time)
+                q = self.sqlfilter.success(q)
+                q = q.order_by(self.table.id)
+                data = [dict(i) for i in session.exec(q)]
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Got {len(data)} swaps from {self.table.__tablename__}"
+        msg += f" since row {last_id}"
+        return default.result(data=data, msg=msg, loglevel="muted")
+
     @timed
     def get_swaps_for_coin(
         self,
@@ -1183,163 +1943,61 @@ class SqlSource:
     @timed
     def import_cipi_swaps(
         self,
-        pgdb: SqlDB,
-        pgdb_query: SqlQuery,
+        pgdb: SqlUpdate,
         start_time=int(cron.now_utc() - 86400),
         end_time=int(cron.now_utc()),
+        source_query: SqlQuery | None = None,
     ):
         try:
             # import Cipi's swap data
-            ext_mysql = SqlQuery(db_type="mysql", gecko_source=self.gecko_source)
-            cipi_swaps = ext_mysql.get_swaps(start_time=start_time, end_time=end_time)
+            if source_query is None:
+                source_query = self.source_query("cipi")
+            cipi_swaps = source_query.get_swaps(
+                start_time=start_time, end_time=end_time
+            )
             cipi_swaps = self.normalise_swap_data(cipi_swaps)
             if len(cipi_swaps) > 0:
-                with Session(pgdb.engine) as session:
-                    count = pgdb_query.get_count(start_time=1)
-                    cipi_swaps_data = {}
-                    for i in cipi_swaps:
-                        cipi_swaps_data.update({i["uuid"]: i})
-                    overlapping_swaps = (
-                        session.query(DefiSwap)
-                        .filter(DefiSwap.uuid.in_(cipi_swaps_data.keys()))
-                        .all()
-                    )
-
-                    updates = []
-                    for each in overlapping_swaps:
-                        # Get dict row for existing swaps
-                        cipi_data = self.cipi_to_defi_swap(
-                            cipi_swaps_data[each.uuid], each.__dict__
-                        ).__dict__
-                        # create bindparam
-                        cipi_data.update({"_id": each.id})
-                        # remove id field to avoid contraint errors
-                        if "_sa_instance_state" in cipi_data:
-                            del cipi_data["_sa_instance_state"]
-                        if "id" in cipi_data:
-                            del cipi_data["id"]
-                        # all to bulk update list
-                        updates.append(cipi_data)
-                        # remove from processing queue
-                        cipi_swaps_data.pop(each.uuid)
-
-                    if len(updates) > 0:
-                        # Update existing records
-                        bind_values = {
-                            i: bindparam(i)
-                            for i in updates[0].keys()
-                            if i not in ["_id"]
-                        }
-                        stmt = (
-                            update(DefiSwap)
-                            .where(DefiSwap.id == bindparam("_id"))
-                            .values(bind_values)
-                        )
-                        session.execute(stmt, updates)
-
-                    # Add new records left in processing queue
-                    for uuid in cipi_swaps_data.keys():
-                        swap = self.cipi_to_defi_swap(cipi_swaps_data[uuid])
-
-                        if "_sa_instance_state" in swap:
-                            del swap["_sa_instance_state"]
-                        if "id" in swap:
-                            del swap["id"]
-                        if uuid not in updates:
-                            session.add(swap)
-                    session.commit()
-                    count_after = pgdb_query.get_count(start_time=1)
-                    msg = f"{count_after - count} records added, "
-                    msg += f"{len(updates)} updated from Cipi database"
+                swaps = [self.cipi_to_defi_swap(i) for i in cipi_swaps]
+                counts = pgdb.upsert_swaps(
+                    [i.dict() for i in swaps if i is not None]
+                )
+                msg = f"{counts['inserted']} records added, "
+                msg += f"{counts['updated']} updated from Cipi database"
             else:
+                counts = {"inserted": 0, "updated": 0}
                 msg = "Zero Cipi swaps returned!"
 
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
-        return default.result(msg=msg, loglevel="sourced")
+        return default.result(data=counts, msg=msg, loglevel="sourced")
 
     @timed
     def import_mm2_swaps(
         self,
-        pgdb: SqlDB,
-        pgdb_query: SqlQuery,
+        pgdb: SqlUpdate,
         start_time=int(cron.now_utc() - 86400),
         end_time=int(cron.now_utc()),
+        source_query: SqlQuery | None = None,
     ):
         try:
             # Import in Sqlite (all) database
-            mm2_sqlite = SqlQuery(
-                db_type="sqlite",
-                db_path=MM2_DB_PATH_ALL,
-                gecko_source=self.gecko_source,
-            )
-            mm2_swaps = mm2_sqlite.get_swaps(start_time=start_time, end_time=end_time)
+            if source_query is None:
+                source_query = self.source_query("mm2")
+            mm2_swaps = source_query.get_swaps(start_time=start_time, end_time=end_time)
             mm2_swaps = self.normalise_swap_data(mm2_swaps)
             if len(mm2_swaps) > 0:
-                with Session(pgdb.engine) as session:
-                    count = pgdb_query.get_count(start_time=1)
-                    mm2_swaps_data = {}
-                    for i in mm2_swaps:
-                        mm2_swaps_data.update({i["uuid"]: i})
-
-                    overlapping_swaps = (
-                        session.query(DefiSwap)
-                        .filter(DefiSwap.uuid.in_(mm2_swaps_data.keys()))
-                        .all()
-                    )
-
-                    updates = []
-                    for each in overlapping_swaps:
-                        # Get dict row for existing swaps
-                        mm2_data = self.mm2_to_defi_swap(
-                            mm2_swaps_data[each.uuid], each.__dict__
-                        ).__dict__
-                        # create bindparam
-                        mm2_data.update({"_id": each.id})
-                        # remove id field to avoid contraint errors
-                        if "id" in mm2_data:
-                            del mm2_data["id"]
-                        if "_sa_instance_state" in mm2_data:
-                            del mm2_data["_sa_instance_state"]
-                        # all to bulk update list
-                        updates.append(mm2_data)
-                        # remove from processing queue
-                        mm2_swaps_data.pop(each.uuid)
-
-                    if len(updates) > 0:
-                        for d in updates:
-                            d = self.ensure_valid_pair(d)
-                        # Update existing records
-                        bind_values = {
-                            i: bindparam(i)
-                            for i in updates[0].keys()
-                            if i not in ["_id"]
-                        }
-                        stmt = (
-                            update(DefiSwap)
-                            .where(DefiSwap.id == bindparam("_id"))
-                            .values(bind_values)
-                        )
-                        session.execute(stmt, updates)
-
-                    # Add new records left in processing queue
-                    for uuid in mm2_swaps_data.keys():
-                        swap = self.mm2_to_defi_swap(mm2_swaps_data[uuid])
-                        if "_sa_instance_state" in swap:
-                            del swap["_sa_instance_state"]
-                        if "id" in swap:
-                            del swap["id"]
-                        if uuid not in updates:
-                            session.add(swap)
-                    session.commit()
-                    count_after = pgdb_query.get_count(start_time=1)
-                    msg = f"{count_after - count} records added, "
-                    msg += f"{len(updates)} updated from MM2.db"
+                swaps = [self.mm2_to_defi_swap(i) for i in mm2_swaps]
+                counts = pgdb.upsert_swaps(
+                    [i.dict() for i in swaps if i is not None]
+                )
+                msg = f"{counts['inserted']} records added, "
+                msg += f"{counts['updated']} updated from MM2.db"
             else:
+                counts = {"inserted": 0, "updated": 0}
                 msg = "Zero MM2 swaps returned!"
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
-        return default.result(msg=msg, loglevel="sourced")
+        return default.result(data=counts, msg=msg, loglevel="sourced")
 
     @timed
     def populate_pgsqldb(
@@ -1350,12 +2008,10 @@ class SqlSource:
         try:
             pgdb = SqlUpdate(db_type="pgsql")
             pgdb_query = SqlQuery(db_type="pgsql", gecko_source=self.gecko_source)
-            self.import_cipi_swaps(
-                pgdb, pgdb_query, start_time=start_time, end_time=end_time
-            )
-            self.import_mm2_swaps(
-                pgdb, pgdb_query, start_time=start_time, end_time=end_time
-            )
+            self.import_cipi_swaps(pgdb, start_time=start_time, end_time=end_time)
+            self.import_mm2_swaps(pgdb, start_time=start_time, end_time=end_time)
+            pgdb.refresh_rollups(start_time=start_time, end_time=end_time)
+            pgdb.refresh_first_last(start_time=start_time, end_time=end_time)
             pgdb_query.describe('defi_swaps')
 
         except Exception as e:  # pragma: no cover
@@ -1363,6 +2019,110 @@ class SqlSource:
         msg = f"Importing swaps from {start_time} - {end_time} complete"
         return default.result(msg=msg, loglevel="updated", ignore_until=10)
 
+    @timed
+    def sync_pgsqldb(self):
+        """
+        Imports swaps added to the source databases since they were last
+        synced, then refreshes the summary tables from the earliest of
+        them. When nothing was added, nothing else is queried.
+        """
+        try:
+            now = int(cron.now_utc())
+            pgdb = SqlUpdate(db_type="pgsql")
+            synced = [self.sync_source(pgdb, i) for i in SYNC_SOURCES]
+            starts = [i["start_time"] for i in synced if i.get("swaps", 0) > 0]
+            if len(starts) == 0:
+                return default.result(msg="No new swaps to sync", loglevel="muted")
+            # Swaps without a finish time are zero, which means "all" here
+            start_time = max(min(starts), 1)
+            if pgdb.rollups_populated():
+                pgdb.refresh_rollups(start_time=start_time, end_time=now)
+            else:
+                # Partial rollups would be used instead of live stats
+                pgdb.populate_rollups()
+            if pgdb.first_last_populated():
+                pgdb.refresh_first_last(start_time=start_time, end_time=now)
+            else:
+                pgdb.populate_first_last()
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Synced swaps from {start_time} - {now}"
+        return default.result(msg=msg, loglevel="updated", ignore_until=10)
+
+    def source_query(self, source: str):
+        if source == "cipi":
+            return SqlQuery(db_type="mysql", gecko_source=self.gecko_source)
+        return SqlQuery(
+            db_type="sqlite", db_path=MM2_DB_PATH_ALL, gecko_source=self.gecko_source
+        )
+
+    @timed
+    def sync_source(
+        self,
+        pgdb: SqlUpdate,
+        source: str,
+        source_query: SqlQuery | None = None,
+        reconcile_every: int = 3600,
+        reconcile_window: int = 86400,
+    ):
+        """
+        Imports swaps added to a source database since its last sync, and
+        advances its sync state. Swaps repaired in place in the source
+        are not seen by that, so every `reconcile_every` seconds, swaps
+        which finished within `reconcile_window` of the high-water mark
+        are imported again. Returns the number of swaps imported, and the
+        earliest time they finished at, or had finished at before.
+        """
+        try:
+            now = int(cron.now_utc())
+            if source_query is None:
+                source_query = self.source_query(source)
+            convert = getattr(self, f"{source}_to_defi_swap")
+            state = pgdb.get_sync_state(source)
+            if len(state) == 0:
+                # Older swaps are imported with `scripts/import_swaps.py`
+                start_time = now - reconcile_window
+                state = {"last_id": 0, "finished_at": start_time, "reconciled_at": now}
+                rows = source_query.swaps_since_id(0, start_time=start_time)
+            else:
+                rows = source_query.swaps_since_id(state["last_id"])
+            if now - state["reconciled_at"] >= reconcile_every:
+                rows += source_query.get_swaps(
+                    start_time=state["finished_at"] - reconcile_window,
+                    end_time=now + 86400,
+                )
+                state["reconciled_at"] = now
+
+            swaps = [convert(i) for i in self.normalise_swap_data(rows)]
+            swaps = [i.dict() for i in swaps if i is not None]
+            finished = [i["finished_at"] for i in swaps]
+            if len(swaps) > 0:
+                counts = pgdb.upsert_swaps(swaps)
+                if "inserted" not in counts:
+                    # Sync state is not advanced, so these are retried
+                    msg = f"Failed to import {len(swaps)} {source} swaps"
+                    return default.result(msg=msg, loglevel="warning")
+                # Rollups of the buckets updated swaps were moved from
+                if counts["previous_finished_at"] is not None:
+                    finished.append(counts["previous_finished_at"])
+            pgdb.set_sync_state(
+                source,
+                last_id=max([state["last_id"]] + [i["id"] for i in rows]),
+                finished_at=max(
+                    [state["finished_at"]] + [i["finished_at"] for i in swaps]
+                ),
+                synced_at=now,
+                reconciled_at=state["reconciled_at"],
+            )
+            data = {
+                "swaps": len(swaps),
+                "start_time": min(finished, default=now),
+            }
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        msg = f"Synced {len(swaps)} {source} swaps"
+        return default.result(data=data, msg=msg, loglevel="sourced", ignore_until=5)
+
     @timed
     def reset_defi_stats_table(self):
         pgdb = SqlUpdate("pgsql")
@@ -1439,7 +2199,7 @@ class SqlSource:
                     maker_version=cipi_data["maker_version"],
                     started_at=int(cipi_data["started_at"].timestamp()),
                     # Not in Cipi's DB, but better than zero.
-                    finished_at=cipi_data["started_at"],
+                    finished_at=int(cipi_data["started_at"].timestamp()),
                     # Not in Cipi's DB, but able to derive.
                     price=cipi_data["price"],
                     reverse_price=cipi_data["reverse_price"],
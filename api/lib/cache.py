@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from util.exceptions import CacheFilenameNotFound, CacheItemNotFound
 from util.files import Files
 from util.logger import logger, timed
@@ -7,9 +10,11 @@ from util.urls import Urls
 from util.cron import cron
 import util.defaults as default
 import util.memcache as memcache
+import util.metrics as metrics
 import util.validate as validate
 import lib.cache_calc as cache_calc
 import lib.external as external
+from lib.prerendered import prerendered
 
 
 class Cache:  # pragma: no cover
@@ -123,25 +128,37 @@ class CacheItem:
     def get_data(self):
         data = {}
         if self.filename is not None:
+            since_updated = self.since_updated()
+            if since_updated is not None:  # pragma: no cover
+                since_updated_min = int(since_updated / 60)
+                if since_updated_min > self.cache_expiry:
+                    msg = f"{self.name} has not been updated for over {since_updated_min} min"
+                    logger.muted(msg)
             data = self.files.load_jsonfile(self.filename)
             if data is not None:  # pragma: no cover
-                if "last_updated" in data:
-                    since_updated = int(cron.now_utc()) - data["last_updated"]
-                    since_updated_min = int(since_updated / 60)
-                    if since_updated_min > self.cache_expiry:
-                        msg = f"{self.name} has not been updated for over {since_updated_min} min"
-                        logger.muted(msg)
                 if "data" in data:
                     return data["data"]
         return data
 
-    def since_updated_min(self):  # pragma: no cover
+    def since_updated(self):  # pragma: no cover
+        """
+        Returns seconds since the cache file was updated, from its
+        manifest if available, so the whole file is not parsed.
+        """
         if self.filename is not None:
+            meta = self.files.load_meta(self.filename)
+            if meta is not None and meta.get("last_updated") is not None:
+                return int(cron.now_utc()) - meta["last_updated"]
             data = self.files.load_jsonfile(self.filename)
             if data is not None:
                 if "last_updated" in data:
-                    since_updated = int(cron.now_utc()) - data["last_updated"]
-                    return int(since_updated / 60)
+                    return int(cron.now_utc()) - data["last_updated"]
+        return None
+
+    def since_updated_min(self):  # pragma: no cover
+        since_updated = self.since_updated()
+        if since_updated is not None:
+            return int(since_updated / 60)
         return "unknown"
 
     def update_data(self):
@@ -287,6 +304,7 @@ class CacheItem:
 
             if data is not None:
                 if validate.loop_data(data, self):
+                    prerendered.refresh(self.name, data)
                     data = {"last_updated": int(cron.now_utc()), "data": data}
                     r = self.files.save_json(self.filename, data)
                     msg = f"Saved {self.filename}"
@@ -308,49 +326,82 @@ class CacheItem:
             return default.error(e, msg=msg)
 
 
+# Cache items saved to file, loaded into memcache on startup
+CACHE_FILES = [
+    "coins_config",
+    "coins",
+    "fixer_rates",
+    "gecko_source",
+    "gecko_pairs",
+    "coin_volumes_24hr",
+    "pairs_last_traded",
+    "pairs_last_traded_24hr",
+    "pair_prices_24hr",
+    "pair_volumes_24hr",
+    "pair_volumes_14d",
+    "pairs_orderbook_extended",
+    "adex_24hr",
+    "adex_fortnite",
+    "tickers",
+    "markets_summary",
+    "stats_api_summary",
+]
+
+
+def load_cache_file(name: str) -> Dict:
+    """
+    Loads a cache item's file into memcache, returning its data and
+    whether it is `fresh`, `stale` (older than its expiry) or `missing`.
+    """
+    try:
+        item = CacheItem(name=name)
+        # Reads the file once, with its age from the manifest if saved
+        meta = item.files.load_meta(item.filename) or {}
+        cached = item.files.load_jsonfile(item.filename) or {}
+        last_updated = meta.get("last_updated", cached.get("last_updated"))
+        age = None
+        if last_updated is not None:
+            age = int(cron.now_utc()) - last_updated
+        data = cached.get("data", cached)
+        getattr(memcache, f"set_{name}")(data)
+        if data is None or len(data) == 0:
+            return {"status": "missing", "age": age, "data": None}
+        prerendered.refresh(name, data)
+        status = "stale"
+        if age is not None and age / 60 <= item.cache_expiry:
+            status = "fresh"
+        return {"status": status, "age": age, "data": data}
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Failed to load {name} cache file: {e}")
+        return {"status": "missing", "age": None, "data": None}
+
+
+def load_cache_files(names: List[str] = CACHE_FILES, max_workers: int = 8):
+    """Loads cache files into memcache concurrently"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(names, executor.map(load_cache_file, names)))
+
+
+@metrics.registry.collector
+def collect_cache_file_metrics():
+    """Sets the age and size of each cache file from its manifest"""
+    files = Files()
+    now = time.time()
+    for name in CACHE_FILES:
+        fn = files.get_cache_fn(name)
+        if fn is None or not os.path.exists(fn):
+            continue
+        meta = files.load_meta(fn) or {}
+        # Files saved before manifests were added only have an mtime
+        saved_at = meta.get("saved_at") or os.path.getmtime(fn)
+        size = meta.get("size") or os.path.getsize(fn)
+        metrics.cache_item_age_seconds.set(round(now - saved_at, 3), item=name)
+        metrics.cache_item_size_bytes.set(size, item=name)
+
+
 def reset_cache_files():
     if 'IS_TESTING' in os.environ:
         logger.calc(f"Resetting cache [testing: {os.environ['IS_TESTING']}]")
     else:
         os.environ['IS_TESTING'] = "False"
-    memcache.set_coins_config(CacheItem(name="coins_config").data)
-    coins_config = memcache.get_coins_config()
-    memcache.set_coins(CacheItem(name="coins", coins_config=coins_config).data)
-    memcache.set_fixer_rates(
-        CacheItem(name="fixer_rates", coins_config=coins_config).data
-    )
-    memcache.set_gecko_source(
-        CacheItem(name="gecko_source", coins_config=coins_config).data
-    )
-    memcache.set_gecko_pairs(
-        CacheItem(name="gecko_pairs", coins_config=coins_config).data
-    )
-    memcache.set_coin_volumes_24hr(
-        CacheItem(name="coin_volumes_24hr", coins_config=coins_config).data
-    )
-    memcache.set_pairs_last_traded(
-        CacheItem(name="pairs_last_traded", coins_config=coins_config).data
-    )
-    memcache.set_pair_prices_24hr(
-        CacheItem(name="pair_prices_24hr", coins_config=coins_config).data
-    )
-    memcache.set_pair_volumes_24hr(
-        CacheItem(name="pair_volumes_24hr", coins_config=coins_config).data
-    )
-    memcache.set_pair_volumes_14d(
-        CacheItem(name="pair_volumes_14d", coins_config=coins_config).data
-    )
-    memcache.set_pairs_orderbook_extended(
-        CacheItem(name="pairs_orderbook_extended", coins_config=coins_config).data
-    )
-    memcache.set_adex_24hr(CacheItem(name="adex_24hr", coins_config=coins_config).data)
-    memcache.set_adex_fortnite(
-        CacheItem(name="adex_fortnite", coins_config=coins_config).data
-    )
-    memcache.set_tickers(CacheItem(name="tickers", coins_config=coins_config).data)
-    memcache.set_markets_summary(
-        CacheItem(name="markets_summary", coins_config=coins_config).data
-    )
-    memcache.set_stats_api_summary(
-        CacheItem(name="stats_api_summary", coins_config=coins_config).data
-    )
+    return load_cache_files()
@@ -2,14 +2,17 @@
 from decimal import Decimal
 from lib.coins import Coins
 from lib.pair import Pair
+from lib.volume_aggregator import volume_aggregator
 from util.cron import cron
 from util.logger import logger, timed
 from util.transform import clean, derive, merge, template, convert
 import db.sqldb as db
+import lib.dex_api as dex
 import lib.prices
 import util.defaults as default
 import util.helper as helper
 import util.memcache as memcache
+import util.validate as validate
 
 
 from util.transform import deplatform
@@ -25,6 +28,7 @@ class CacheCalc:
         pair_prices_24hr_cache=None,
         pairs_orderbook_extended_cache=None,
         pair_volumes_24hr_cache=None,
+        pair_volumes_14d_cache=None,
     ) -> None:
         self._priced_coins = None
         self._coins_obj = None
@@ -35,6 +39,7 @@ class CacheCalc:
         self._pairs_orderbook_extended_cache = pairs_orderbook_extended_cache
         self._pair_prices_24hr_cache = pair_prices_24hr_cache
         self._pair_volumes_24hr_cache = pair_volumes_24hr_cache
+        self._pair_volumes_14d_cache = pair_volumes_14d_cache
 
     @property
     def pg_query(self):
@@ -76,7 +81,7 @@ class CacheCalc:
     @timed
     def coin_volumes_24hr(self):
         try:
-            vols = self.pg_query.coin_trade_volumes()
+            vols = volume_aggregator.coin_trade_volumes(window=86400)
             vols_usd = self.pg_query.coin_trade_volumes_usd(vols)
             for coin in vols_usd["volumes"]:
                 for variant in vols_usd["volumes"][coin]:
@@ -158,6 +163,22 @@ class CacheCalc:
             traded_pairs = derive.pairs_traded_since(
                 ts, self.pairs_last_traded_cache, deplatformed=False
             )
+            if refresh:
+                # Populates the variant caches, returns once all are done.
+                variants = [
+                    variant
+                    for depair in depairs
+                    for variant in derive.pair_variants(depair)
+                    if variant in traded_pairs
+                    and validate.orderbook_request(
+                        *derive.base_quote(variant), coins_config=self.coins_config
+                    )
+                ]
+                return dex.orderbook_fetcher.refresh(
+                    variants,
+                    gecko_source=self.gecko_source,
+                    pair_prices_24hr_cache=self.pair_prices_24hr_cache,
+                )
             data = []
             for depair in depairs:
                 x = Pair(
@@ -165,9 +186,7 @@ class CacheCalc:
                     coins_config=self.coins_config,
                     gecko_source=self.gecko_source,
                     pair_prices_24hr_cache=self.pair_prices_24hr_cache,
-                ).orderbook(
-                    depair, depth=100, traded_pairs=traded_pairs, refresh=refresh
-                )
+                ).orderbook(depair, depth=100, traded_pairs=traded_pairs)
                 data.append(x)
             orderbook_data = {}
             liquidity_usd = 0
@@ -194,7 +213,8 @@ class CacheCalc:
                             )
                 liquidity_usd += Decimal(depair_data["ALL"]["liquidity_usd"])
 
-            vols_24hr = self.pair_volumes_24hr()
+            # Upstream cache is refreshed before this by the scheduler
+            vols_24hr = self.pair_volumes_24hr_cache
             if vols_24hr is not None:
                 swaps_24hr = vols_24hr["total_swaps"]
                 volume_usd_24hr = vols_24hr["trade_volume_usd"]
@@ -226,7 +246,7 @@ class CacheCalc:
     @timed
     def pair_volumes_24hr(self):
         try:
-            vols = self.pg_query.pair_trade_volumes()
+            vols = volume_aggregator.pair_trade_volumes(window=86400)
             vols_usd = self.pg_query.pair_trade_volumes_usd(vols)
             for pair_str in vols_usd["volumes"]:
                 for variant in vols_usd["volumes"][pair_str]:
@@ -240,14 +260,16 @@ class CacheCalc:
             msg = f"pair_volumes_24hr failed! {e}"
             logger.warning(msg)
 
+    @property
+    def pair_volumes_14d_cache(self):
+        if self._pair_volumes_14d_cache is None:
+            self._pair_volumes_14d_cache = memcache.get_pair_volumes_14d()
+        return self._pair_volumes_14d_cache
+
     @timed
     def pair_volumes_14d(self):
         try:
-            start_time = int(cron.now_utc()) - 86400 * 14
-            end_time = int(cron.now_utc())
-            vols = self.pg_query.pair_trade_volumes(
-                start_time=start_time, end_time=end_time
-            )
+            vols = volume_aggregator.pair_trade_volumes(window=86400 * 14)
             vols_usd = self.pg_query.pair_trade_volumes_usd(vols)
             for pair_str in vols_usd["volumes"]:
                 for variant in vols_usd["volumes"][pair_str]:
@@ -457,7 +479,7 @@ class CacheCalc:
             data = memcache.get_adex_fortnite()
             if data is None or refresh:
                 books = self.pairs_orderbook_extended_cache
-                vols = self.pair_volumes_14d()
+                vols = self.pair_volumes_14d_cache
                 if None not in [books, vols]:
                     data = {
                         "days": 14,
@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
+import hashlib
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from decimal import Decimal
-from typing import Dict
+from typing import Dict, List
 import requests
-import threading
-from const import MM2_RPC_PORTS, MM2_RPC_HOSTS, API_ROOT_PATH
+from const import (
+    MM2_RPC_PORTS,
+    MM2_RPC_HOSTS,
+    API_ROOT_PATH,
+    ORDERBOOK_FETCH_WORKERS,
+    ORDERBOOK_FETCH_TIMEOUT,
+    ORDERBOOK_BATCH_TIMEOUT,
+    ORDERBOOK_FETCH_BATCH_SIZE,
+)
 from lib.cache_query import cache_query
 from util.cron import cron
 from util.files import Files
@@ -11,9 +22,62 @@ from util.logger import logger, timed
 from util.transform import sortdata, clean, invert, derive, template, convert, merge
 import util.defaults as default
 import util.memcache as memcache
+import util.metrics as metrics
 import util.validate as validate
 
 
+# Keep-alive connections to mm2, shared by all DexAPI instances
+session = requests.Session()
+
+
+def rpc_method(params) -> str:
+    if isinstance(params, list):
+        return "batch"
+    return params.get("method", "unknown")
+
+
+def mm2_post(session: requests.Session, mm2_rpc: str, params, **kwargs):
+    """
+    Posts a request to mm2, recording its latency, and a failure if it
+    times out or does not return JSON.
+    """
+    method = rpc_method(params)
+    start = time.perf_counter()
+    try:
+        return session.post(mm2_rpc, json=params, **kwargs).json()
+    except requests.exceptions.Timeout:
+        metrics.mm2_rpc_errors_total.inc(method=method, status="timed_out")
+        raise
+    except Exception:
+        metrics.mm2_rpc_errors_total.inc(method=method, status="failed")
+        raise
+    finally:
+        metrics.mm2_rpc_seconds.observe(time.perf_counter() - start, method=method)
+
+
+def rpc_error(method: str, count: int = 1):
+    """Counts requests which mm2 answered with an error"""
+    if count > 0:
+        metrics.mm2_rpc_errors_total.inc(count, method=method, status="error")
+
+
+def orderbook_digest(data: dict) -> str:
+    """Returns a hash of an orderbook's content, ignoring its timestamp"""
+    content = {k: v for k, v in data.items() if k != "timestamp"}
+    return hashlib.md5(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def orderbook_rpc_params(base: str, quote: str) -> dict:
+    return {
+        "mmrpc": "2.0",
+        "method": "orderbook",
+        "params": {"base": base, "rel": quote},
+        "id": 42,
+    }
+
+
 class DexAPI:
     def __init__(self, **kwargs):
         try:
@@ -30,10 +94,12 @@ class DexAPI:
     @timed
     def api(self, params: dict) -> dict:
         try:
-            r = requests.post(self.mm2_rpc, json=params)
-            resp = r.json()
+            resp = mm2_post(
+                session, self.mm2_rpc, params, timeout=ORDERBOOK_FETCH_TIMEOUT
+            )
             if "error" not in resp:
                 return resp["result"]
+            rpc_error(rpc_method(params))
             err = {"error": f"{resp}]"}
             return err
         except Exception as e:  # pragma: no cover
@@ -46,13 +112,7 @@ class DexAPI:
     def orderbook_rpc(self, base: str, quote: str) -> dict:
         """Either returns template, or actual result"""
         try:
-            params = {
-                "mmrpc": "2.0",
-                "method": "orderbook",
-                "params": {"base": base, "rel": quote},
-                "id": 42,
-            }
-            resp = self.api(params)
+            resp = self.api(orderbook_rpc_params(base, quote))
             if "error" in resp:
                 data = template.orderbook_rpc_resp(base=base, quote=quote)
                 return default.result(
@@ -68,50 +128,172 @@ class DexAPI:
             )
 
 
-class OrderbookRpcThread(threading.Thread):
+class OrderbookFetcher:
+    """
+    Refreshes variant orderbook caches with a fixed size pool of workers,
+    sharing a single keep-alive session to the mm2 RPC port. Orderbooks
+    are requested in mm2 batch requests of up to `batch_size` variants,
+    which are retried one variant at a time if the batch times out.
+    """
+
     def __init__(
         self,
-        base,
-        quote,
-        variant_cache_name,
-        depth,
-        gecko_source,
-        pair_prices_24hr_cache,
+        workers: int = ORDERBOOK_FETCH_WORKERS,
+        timeout: float = ORDERBOOK_FETCH_TIMEOUT,
+        batch_size: int = ORDERBOOK_FETCH_BATCH_SIZE,
+        mm2_rpc: str | None = None,
+        batch_timeout: float = ORDERBOOK_BATCH_TIMEOUT,
     ):
-        threading.Thread.__init__(self)
+        self.workers = workers
+        self.timeout = timeout
+        self.batch_timeout = batch_timeout
+        self.batch_size = batch_size
+        if mm2_rpc is None:
+            mm2_rpc = f"{MM2_RPC_HOSTS['8762']}:{MM2_RPC_PORTS['8762']}"
+        self.mm2_rpc = mm2_rpc
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=workers
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="orderbook"
+        )
+        self.last_refresh = template.orderbook_fetch_metrics()
+        # Digest of each variant's last successfully cached orderbook
+        self.digests = {}
+
+    def fetch_batch(self, variants: List[str]) -> Dict[str, tuple]:
+        """
+        Fetches orderbooks for a list of variants in a single mm2 batch
+        request, returning a (status, orderbook) tuple for each variant.
+        If the batch times out, each variant is requested on its own so
+        only the slow ones are counted as timed out.
+        """
+        pairs = [derive.base_quote(i) for i in variants]
+        params = [
+            dict(orderbook_rpc_params(base, quote), id=n)
+            for n, (base, quote) in enumerate(pairs)
+        ]
         try:
-            self.base = base
-            self.quote = quote
-            self.gecko_source = gecko_source
-            self.pair_prices_24hr_cache = pair_prices_24hr_cache
-            self.pair_str = f"{self.base}_{self.quote}"
-            self.variant_cache_name = variant_cache_name
-            self.depth = depth
+            # mm2 answers a batch once all its orderbooks are ready
+            timeout = self.timeout if len(variants) == 1 else self.batch_timeout
+            resp = mm2_post(self.session, self.mm2_rpc, params, timeout=timeout)
+            results = demux_batch_response(params, resp)
+            statuses = [
+                "succeeded" if "result" in i and "error" not in i else "failed"
+                for i in results
+            ]
+            rpc_error("orderbook", statuses.count("failed"))
+        except requests.exceptions.Timeout:
+            if len(variants) > 1:
+                resp = {}
+                for variant in variants:
+                    resp.update(self.fetch_batch([variant]))
+                return resp
+            statuses = ["timed_out"]
         except Exception as e:  # pragma: no cover
-            logger.warning(e)
+            logger.dexrpc(f"orderbook batch rpc failed for {variants}: {e}")
+            statuses = ["failed"] * len(variants)
+        resp = {}
+        for n, variant in enumerate(variants):
+            if statuses[n] == "succeeded":
+                data = results[n]["result"]
+            else:
+                base, quote = pairs[n]
+                data = template.orderbook_rpc_resp(base=base, quote=quote)
+            resp.update({variant: (statuses[n], data)})
+        return resp
+
+    def refresh_variants(self, variants, gecko_source, pair_prices_24hr_cache):
+        """
+        Fetches a batch of variant orderbooks and updates the caches of
+        those which succeeded, returning the status of each request.
+        Failed variants keep their cached orderbook until it expires.
+        """
+        statuses = []
+        for variant, (status, data) in self.fetch_batch(variants).items():
+            if status != "succeeded":
+                statuses.append(status)
+                continue
+            try:
+                data = orderbook_extras(
+                    pair_str=variant,
+                    data=data,
+                    gecko_source=gecko_source,
+                    pair_prices_24hr_cache=pair_prices_24hr_cache,
+                )
+                data = clean.decimal_dicts(data)
+                memcache.update(f"orderbook_{variant}", data, 900)
+                self.digests[variant] = orderbook_digest(data)
+            except Exception as e:  # pragma: no cover
+                logger.warning(f"Orderbook refresh for {variant} failed: {e}")
+                status = "failed"
+            statuses.append(status)
+        return statuses
+
+    def submit(self, variants, gecko_source, pair_prices_24hr_cache) -> Future:
+        return self.executor.submit(
+            self.refresh_variants, variants, gecko_source, pair_prices_24hr_cache
+        )
 
     @timed
-    def run(self):
-        try:
-            data = DexAPI().orderbook_rpc(self.base, self.quote)
-            data = orderbook_extras(
-                pair_str=self.pair_str,
-                data=data,
-                gecko_source=self.gecko_source,
-                pair_prices_24hr_cache=self.pair_prices_24hr_cache,
-            )
-            data = clean.decimal_dicts(data)
-            memcache.update(self.variant_cache_name, data, 900)
-        except Exception as e:  # pragma: no cover
-            logger.warning(e)
+    def refresh(self, variants, gecko_source, pair_prices_24hr_cache):
+        """
+        Refreshes the orderbook caches for a list of variants, returning
+        once all are complete with counts of each request outcome, and
+        the digest of each variant's cached orderbook under `orderbooks`.
+        """
+        start = time.monotonic()
+        variants = sorted(set(variants))
+        batches = [
+            variants[i:i + self.batch_size]
+            for i in range(0, len(variants), self.batch_size)
+        ]
+        futures = [
+            self.submit(i, gecko_source, pair_prices_24hr_cache) for i in batches
+        ]
+        metrics = template.orderbook_fetch_metrics()
+        metrics.update({"variants": len(variants), "batches": len(batches)})
+        for future in as_completed(futures):
+            for status in future.result():
+                metrics[status] += 1
+        metrics.update({"duration": round(time.monotonic() - start, 3)})
+        self.last_refresh = metrics
+        loglevel = "loop"
+        if metrics["failed"] + metrics["timed_out"] > 0:
+            loglevel = "warning"
+        msg = f"Orderbook refresh complete: {metrics}"
+        orderbooks = {i: self.digests[i] for i in variants if i in self.digests}
         return default.result(
-            data=data,
-            ignore_until=3,
-            msg=f"Threaded orderbook for {self.pair_str} complete",
-            loglevel="loop",
+            data=dict(metrics, orderbooks=orderbooks),
+            msg=msg,
+            loglevel=loglevel,
+            ignore_until=0,
         )
 
 
+orderbook_fetcher = OrderbookFetcher()
+
+
+def demux_batch_response(params: List[dict], resp) -> List[dict]:
+    """
+    Matches mm2 batch responses to their requests by `id`, falling back
+    to response order if ids are missing.
+    """
+    if not isinstance(resp, list):
+        raise ValueError(f"Expected a list of responses, got {resp}")
+    by_id = {}
+    for n, i in enumerate(resp):
+        if isinstance(i, dict):
+            by_id.update({i.get("id", n): i})
+    return [
+        by_id.get(i["id"], {"error": f"No response for request {i}"})
+        for i in params
+    ]
+
+
 @timed
 def get_orderbook(
     base: str,
@@ -125,7 +307,7 @@ def get_orderbook(
 ):
     try:
         """
-        If `refresh` is true request is threaded and added to cache.
+        If `refresh` is true request is queued and added to cache.
         If `refresh` is false, resp from cache or standard request.
         """
         if pair_prices_24hr_cache is None:
@@ -145,21 +327,23 @@ def get_orderbook(
                 pair_prices_24hr_cache=pair_prices_24hr_cache,
             )
         if refresh:
-            t = OrderbookRpcThread(
-                base,
-                quote,
-                variant_cache_name=variant_cache_name,
-                depth=depth,
+            orderbook_fetcher.submit(
+                [pair_str],
                 gecko_source=gecko_source,
                 pair_prices_24hr_cache=pair_prices_24hr_cache,
             )
-            t.start()
             return None
 
         # Use variant cache if available
         cached = memcache.get(variant_cache_name)
         if cached is not None:
-            data = cached
+            data = orderbook_prices(
+                pair_str=pair_str,
+                data=dict(cached),
+                gecko_source=gecko_source,
+                pair_prices_24hr_cache=pair_prices_24hr_cache,
+            )
+            data = clean.decimal_dicts(data)
             msg = f"Returning orderbook for {pair_str} from cache"
             loglevel = "cached"
         else:
@@ -206,7 +390,7 @@ def get_orderbook_fixture(pair_str, gecko_source, pair_prices_24hr_cache):
         logger.warning(f"fixture for {pair_str} does not exist!")
         base, quote = derive.base_quote(pair_str=pair_str)
         data = template.orderbook_rpc_resp(base=base, quote=quote)
-    is_reversed = pair_str != sortdata.pair_by_market_cap(pair_str, gecko_source=gecko_source)
+    is_reversed = sortdata.is_reversed(pair_str, gecko_source=gecko_source)
     if is_reversed:
         data = invert.orderbook_fixture(data)
     data = orderbook_extras(pair_str, data, gecko_source, pair_prices_24hr_cache)
@@ -241,6 +425,29 @@ def orderbook_extras(pair_str, data, gecko_source, pair_prices_24hr_cache):
                 "lowest_ask": derive.lowest_ask(data),
             }
         )
+        data = orderbook_prices(pair_str, data, gecko_source, pair_prices_24hr_cache)
+    except Exception as e:  # pragma: no cover
+        loglevel = "warning"
+        ignore_until = 0
+        msg = f"Orderbook.extras failed for {pair_str}: {e}"
+        logger.warning(msg)
+    ignore_until = 3
+    loglevel = "pair"
+    msg = f"Got Orderbook.extras for {pair_str}"
+    return default.result(
+        data=data, msg=msg, loglevel=loglevel, ignore_until=ignore_until
+    )
+
+
+@timed
+def orderbook_prices(pair_str, data, gecko_source, pair_prices_24hr_cache):
+    """
+    Adds the pair's 24hr price stats and USD prices to an orderbook.
+    Cached orderbooks are refetched on their own interval, so these are
+    applied again when one is read, to use the current prices.
+    """
+    try:
+        base, quote = derive.base_quote(pair_str=pair_str)
         # Data below needs segwit merge
         segwit_variants = derive.pair_variants(pair_str, segwit_only=True)
         prices_data = []
@@ -271,16 +478,10 @@ def orderbook_extras(pair_str, data, gecko_source, pair_prices_24hr_cache):
         )
         data.update(combined_prices_data)
     except Exception as e:  # pragma: no cover
-        loglevel = "warning"
-        ignore_until = 0
-        msg = f"Orderbook.extras failed for {pair_str}: {e}"
-        logger.warning(msg)
-    ignore_until = 3
-    loglevel = "pair"
-    msg = f"Got Orderbook.extras for {pair_str}"
-    return default.result(
-        data=data, msg=msg, loglevel=loglevel, ignore_until=ignore_until
-    )
+        msg = f"Orderbook prices failed for {pair_str}: {e}"
+        return default.result(data=data, msg=msg, loglevel="warning", ignore_until=0)
+    msg = f"Got orderbook prices for {pair_str}"
+    return default.result(data=data, msg=msg, loglevel="pair", ignore_until=3)
 
 
 @timed
@@ -6,6 +6,7 @@ from typing import Optional, Dict, List
 import db.sqldb as db
 import lib.dex_api as dex
 import lib.last as last_traded
+from lib.swap_store import swap_store
 import util.defaults as default
 import util.memcache as memcache
 from util.cron import cron
@@ -120,9 +121,7 @@ class Pair:  # pragma: no cover
 
     @cached_property
     def is_reversed(self):
-        return self.as_str != sortdata.pair_by_market_cap(
-            self.as_str, gecko_source=self.gecko_source
-        )
+        return sortdata.is_reversed(self.as_str, gecko_source=self.gecko_source)
 
     @cached_property
     def variants(self):
@@ -132,6 +131,19 @@ class Pair:  # pragma: no cover
     def segwit_variants(self):
         return derive.pair_variants(self.as_str, segwit_only=True)
 
+    def get_swaps(self, start_time: int, end_time: int) -> Dict[str, List]:
+        """
+        Returns this pair's swaps for each variant, from the swap store
+        if it holds the time range, otherwise from the database.
+        """
+        if swap_store.covers(start_time):
+            return swap_store.get_swaps(
+                self.as_str, start_time, end_time, gecko_source=self.gecko_source
+            )
+        return self.pg_query.get_swaps(
+            start_time=start_time, end_time=end_time, pair_str=self.as_str
+        )
+
     @timed
     def historical_trades(
         self,
@@ -148,11 +160,7 @@ class Pair:  # pragma: no cover
                 end_time = int(cron.now_utc())
 
             resp = {}
-            swaps_for_pair = self.pg_query.get_swaps(
-                start_time=start_time,
-                end_time=end_time,
-                pair_str=self.as_str,
-            )
+            swaps_for_pair = self.get_swaps(start_time, end_time)
             for variant in swaps_for_pair:
                 trades_info = []
                 for swap in swaps_for_pair[variant]:
@@ -275,33 +283,35 @@ class Pair:  # pragma: no cover
                 )
             data = {}
             data = clean.decimal_dicts(data)
-            swaps_for_pair_combo = self.pg_query.get_swaps(
-                start_time=int(cron.now_utc() - 86400 * days),
-                end_time=int(cron.now_utc()),
-                pair_str=self.as_str,
+            swaps_for_pair_combo = self.get_swaps(
+                int(cron.now_utc() - 86400 * days), int(cron.now_utc())
             )
             last_data = self.pairs_last_traded_cache
             for variant in swaps_for_pair_combo:
                 last = last_traded.pair_last_trade_cache(self.as_str, last_data)
-                swap_prices = self.get_swap_prices(swaps_for_pair_combo[variant])
+                swaps = sortdata.dict_lists(
+                    swaps_for_pair_combo[variant], "finished_at"
+                )
 
                 data[variant] = template.pair_prices_info(suffix)
 
-                # TODO: using timestamps as an index works for now,
-                # but breaks when two swaps have the same timestamp.
-                if len(swap_prices) > 0:
-                    swap_vals = list(swap_prices.values())
-                    swap_keys = list(swap_prices.keys())
-                    highest_price = max(swap_vals)
-                    lowest_price = min(swap_vals)
-                    newest_price = swap_prices[max(swap_prices.keys())]
-                    oldest_price = swap_prices[min(swap_prices.keys())]
+                # Swaps are in time order, so all swaps count even if
+                # some finished at the same time.
+                if len(swaps) > 0:
+                    price_key = "reverse_price" if self.is_reversed else "price"
+                    prices = [i[price_key] for i in swaps]
+                    highest_price = max(prices)
+                    lowest_price = min(prices)
+                    newest_price = prices[-1]
+                    oldest_price = prices[0]
                     price_change = newest_price - oldest_price
-                    pct_change = newest_price / oldest_price - 1
+                    pct_change = 0
+                    if oldest_price != 0:
+                        pct_change = newest_price / oldest_price - 1
 
                     data[variant] = {
-                        "oldest_price_time": swap_keys[swap_vals.index(oldest_price)],
-                        "newest_price_time": swap_keys[swap_vals.index(newest_price)],
+                        "oldest_price_time": swaps[0]["finished_at"],
+                        "newest_price_time": swaps[-1]["finished_at"],
                         f"oldest_price_{suffix}": oldest_price,
                         f"newest_price_{suffix}": newest_price,
                         f"highest_price_{suffix}": highest_price,
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import gzip
+import json
+import hashlib
+from typing import Dict, List
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from models.gecko import GeckoTickers
+from models.markets import MarketsSummaryItem
+from models.stats_api import StatsApiSummary
+from util.cron import cron
+from util.logger import logger, timed
+import util.defaults as default
+import util.memcache as memcache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def gecko_tickers(data: Dict) -> Dict:
+    """Formats the `tickers` cache for `/gecko/tickers`"""
+    return {
+        "last_update": int(cron.now_utc()),
+        "pairs_count": data["pairs_count"],
+        "swaps_count": data["swaps_count"],
+        "combined_volume_usd": data["combined_volume_usd"],
+        "combined_liquidity_usd": data["combined_liquidity_usd"],
+        "data": [data["data"][depair] for depair in data["data"]],
+    }
+
+
+def markets_summary(data: List) -> List:
+    """Formats the `markets_summary` cache for `/markets/summary`"""
+    # TODO: remove aliases when dashboard updates
+    return [
+        i
+        | {
+            "trading_pair": i["pair"],
+            "price_change_percent_24hr": i["price_change_pct_24hr"],
+        }
+        for i in data
+    ]
+
+
+def stats_api_summary(data: List) -> List:
+    """Formats the `stats_api_summary` cache for `/stats-api/summary`"""
+    return data
+
+
+# Endpoint responses rendered whenever their source cache item is saved.
+ENDPOINTS = {
+    "gecko_tickers": {
+        "source": "tickers",
+        "format": gecko_tickers,
+        "model": GeckoTickers,
+    },
+    "markets_summary": {
+        "source": "markets_summary",
+        "format": markets_summary,
+        "model": List[MarketsSummaryItem],
+    },
+    "stats_api_summary": {
+        "source": "stats_api_summary",
+        "format": stats_api_summary,
+        "model": List[StatsApiSummary],
+    },
+}
+
+
+def encodings() -> List[str]:
+    if brotli is not None:
+        return ["br", "gzip", "identity"]
+    return ["gzip", "identity"]
+
+
+def encode(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """
+    Returns the encodings we can serve which an `Accept-Encoding` header
+    allows, highest q-value first, then in our order of preference.
+    """
+    qvalues = {}
+    for i in header.split(","):
+        coding, *params = [j.strip() for j in i.split(";")]
+        if coding == "":
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    default_q = qvalues.get("*", 0.0)
+    # Unless excluded, an uncompressed response is always acceptable,
+    # as the least preferred (q=0.001 being the lowest allowed value)
+    qvalues.setdefault("identity", default_q if "*" in qvalues else 0.001)
+    accepted = [i for i in encodings() if qvalues.get(i, default_q) > 0]
+    return sorted(accepted, key=lambda i: -qvalues.get(i, default_q))
+
+
+def cache_name(endpoint: str, encoding: str) -> str:
+    return f"prerendered_{endpoint}_{encoding}"
+
+
+class Prerendered:
+    """
+    Serves pre-rendered JSON responses for hot read-only endpoints.
+
+    When a source cache item is saved, the response for each endpoint
+    using it is validated against the endpoint's response model and
+    serialized once, then stored in memcache with an ETag for each
+    content encoding. Requests are answered with the stored bytes,
+    skipping per request validation and serialization.
+    """
+
+    def __init__(self, endpoints: Dict = ENDPOINTS):
+        self.endpoints = endpoints
+
+    def format(self, endpoint: str, data):
+        """Returns the endpoint's response content for its source data"""
+        return self.endpoints[endpoint]["format"](data)
+
+    def render(self, endpoint: str, data) -> bytes:
+        """Returns the JSON body FastAPI would return for the endpoint"""
+        content = parse_obj_as(
+            self.endpoints[endpoint]["model"], self.format(endpoint, data)
+        )
+        return json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    @timed
+    def refresh(self, source: str, data):
+        """Renders and caches the responses of endpoints using `source`"""
+        rendered = []
+        for endpoint, cfg in self.endpoints.items():
+            if cfg["source"] != source:
+                continue
+            try:
+                body = self.render(endpoint, data)
+                digest = hashlib.md5(body).hexdigest()
+                for encoding in encodings():
+                    # Each encoding is a different representation
+                    etag = f'"{digest}-{encoding}"'
+                    blob = etag.encode("utf-8") + b"\n" + encode(body, encoding)
+                    memcache.update(cache_name(endpoint, encoding), blob, 3600)
+                rendered.append(endpoint)
+            except Exception as e:
+                logger.warning(f"Failed to prerender {endpoint}: {e}")
+        msg = f"Prerendered {rendered} from {source}"
+        return default.result(data=rendered, msg=msg, loglevel="cached", ignore_until=5)
+
+    def get(self, endpoint: str, encoding: str):
+        """Returns the ETag and body of a cached response, or None"""
+        blob = memcache.get(cache_name(endpoint, encoding))
+        if not isinstance(blob, bytes):
+            return None
+        etag, body = blob.split(b"\n", 1)
+        return etag.decode("utf-8"), body
+
+    def response(self, endpoint: str, request: Request) -> Response | None:
+        """
+        Returns the cached response for the endpoint, in the best
+        encoding the client accepts, or a 304 if the client's copy is
+        current. Returns None if there is no cached response yet.
+        """
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding in accepted:
+            cached = self.get(endpoint, encoding)
+            if cached is None:
+                continue
+            etag, body = cached
+            headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+            if_none_match = request.headers.get("if-none-match", "")
+            if etag in [i.strip() for i in if_none_match.split(",")]:
+                return Response(status_code=304, headers=headers)
+            if encoding != "identity":
+                headers.update({"Content-Encoding": encoding})
+            return Response(
+                content=body, media_type="application/json", headers=headers
+            )
+        return None
+
+
+prerendered = Prerendered()
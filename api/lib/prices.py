@@ -1,12 +1,134 @@
 #!/usr/bin/env python3
+from decimal import Decimal
+from typing import Dict, List
+import numpy as np
+import lib.last as last_traded
 from lib.pair import Pair
+from lib.swap_store import SwapStore, swap_store
 from util.cron import cron
 from util.logger import timed
-from util.transform import derive
+from util.transform import clean, derive, sortdata
 import util.defaults as default
 import util.memcache as memcache
 
 
+class PriceStats:
+    """
+    Computes the price statistics of `Pair.get_pair_prices_info` for
+    all pairs and their variants in one pass over the swap store.
+
+    Swaps in the time range are grouped by their two coins, giving the
+    rows of the first, last, lowest and highest priced swap for each
+    group. As rows are kept in time order, swaps finishing at the same
+    time are all counted, and the last one added is the newest.
+    """
+
+    STATS = ["first", "last", "min", "max"]
+
+    def __init__(self, store: SwapStore = swap_store):
+        self.store = store
+
+    def groups(self, rows: np.ndarray) -> Dict[str, Dict[int, Dict]]:
+        """Returns group stats by coin pair key, for each price column"""
+        keys = self.store.coin_pair_keys()
+        resp = {}
+        for value in ["price", "reverse_price"]:
+            groups = self.store.group_by(rows, keys, value)
+            resp.update(
+                {
+                    value: {
+                        int(k): {i: int(groups[i][n]) for i in self.STATS}
+                        for n, k in enumerate(groups["ids"])
+                    }
+                }
+            )
+        return resp
+
+    def combine(self, stats: List[Dict], value: str) -> Dict:
+        """Merges the group stats of several variants"""
+        prices = self.store.decimals[value]
+        return {
+            "first": min(i["first"] for i in stats),
+            "last": max(i["last"] for i in stats),
+            "min": min([i["min"] for i in stats], key=lambda row: prices[row]),
+            "max": max([i["max"] for i in stats], key=lambda row: prices[row]),
+        }
+
+    def info(self, stats: Dict, value: str, suffix: str, extras: Dict) -> Dict:
+        """Formats group stats like `Pair.get_pair_prices_info`"""
+        prices = self.store.decimals[value]
+        finished_at = self.store.columns["finished_at"]
+        oldest_price = prices[stats["first"]]
+        newest_price = prices[stats["last"]]
+        pct_change = Decimal(0)
+        if oldest_price != 0:
+            pct_change = newest_price / oldest_price - 1
+        data = {
+            "oldest_price_time": int(finished_at[stats["first"]]),
+            "newest_price_time": int(finished_at[stats["last"]]),
+            f"oldest_price_{suffix}": oldest_price,
+            f"newest_price_{suffix}": newest_price,
+            f"highest_price_{suffix}": prices[stats["max"]],
+            f"lowest_price_{suffix}": prices[stats["min"]],
+            f"price_change_pct_{suffix}": pct_change,
+            f"price_change_{suffix}": newest_price - oldest_price,
+        }
+        return clean.decimal_dicts(data | extras)
+
+    @timed
+    def pair_prices_info(
+        self,
+        pairs: List[str],
+        days: int = 1,
+        gecko_source=None,
+        pairs_last_traded_cache=None,
+    ) -> Dict[str, Dict]:
+        """
+        Returns the price info for each variant of each pair which was
+        traded in the last `days`, and for `ALL` of a pair's variants.
+        """
+        suffix = derive.suffix(days)
+        end_time = int(cron.now_utc())
+        start_time = end_time - 86400 * days
+        with self.store.lock:
+            groups = self.groups(self.store.select(start_time, end_time))
+            resp = {}
+            for depair in pairs:
+                is_reversed = sortdata.is_reversed(depair, gecko_source=gecko_source)
+                value = "reverse_price" if is_reversed else "price"
+                base, quote = derive.base_quote(depair)
+                last = last_traded.pair_last_trade_cache(
+                    depair, pairs_last_traded_cache
+                )
+                extras = {
+                    "base_price_usd": derive.gecko_price(base, gecko_source=gecko_source),
+                    "quote_price_usd": derive.gecko_price(
+                        quote, gecko_source=gecko_source
+                    ),
+                    "last_swap_uuid": last["last_swap_uuid"],
+                }
+                variants = {}
+                for variant, v_base, v_quote in self.store.variants(
+                    depair, gecko_source
+                ):
+                    key = self.store.coin_pair_key(v_base, v_quote)
+                    if key in groups[value]:
+                        variants.update({variant: groups[value][key]})
+                resp.update({depair: {}})
+                if len(variants) == 0:
+                    continue
+                variants.update({"ALL": self.combine(list(variants.values()), value)})
+                for variant, stats in variants.items():
+                    resp[depair].update(
+                        {variant: self.info(stats, value, suffix, extras)}
+                    )
+        msg = f"Price stats for {len(pairs)} pairs from {len(self.store)} swaps"
+        return default.result(data=resp, msg=msg, loglevel="calc", ignore_until=3)
+
+
+price_stats = PriceStats()
+
+
 @timed
 def pair_prices(days=1, from_memcache: bool = False, coins_config=None, gecko_source=None):
     try:
@@ -21,15 +143,23 @@ def pair_prices(days=1, from_memcache: bool = False, coins_config=None, gecko_so
         # Filter out pairs older than requested time
         ts = cron.now_utc() - days * 86400
         pairs = derive.pairs_traded_since(ts, pairs_last_traded_cache)
-        prices_data = {
-            i: Pair(
-                pair_str=i,
-                pairs_last_traded_cache=pairs_last_traded_cache,
-                coins_config=coins_config,
+        if swap_store.covers(int(cron.now_utc()) - days * 86400):
+            prices_data = price_stats.pair_prices_info(
+                pairs,
+                days,
                 gecko_source=gecko_source,
-            ).get_pair_prices_info(days)
-            for i in pairs
-        }
+                pairs_last_traded_cache=pairs_last_traded_cache,
+            )
+        else:
+            prices_data = {
+                i: Pair(
+                    pair_str=i,
+                    pairs_last_traded_cache=pairs_last_traded_cache,
+                    coins_config=coins_config,
+                    gecko_source=gecko_source,
+                ).get_pair_prices_info(days)
+                for i in pairs
+            }
         resp = {}
         for depair in prices_data:
             resp.update({depair: {}})
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from graphlib import TopologicalSorter
+from threading import Lock
+from typing import Callable, Dict, List
+from lib.cache import CacheItem
+from lib.cache_calc import CacheCalc
+from lib.swap_store import swap_store
+from util.logger import logger, timed
+import util.defaults as default
+import util.metrics as metrics
+
+
+class CacheNode:
+    """
+    A single refreshable item in the cache dependency graph.
+
+    Nodes with an `interval` are refreshed whenever that many seconds
+    have passed since their last refresh (external sources, database
+    queries, mm2 orderbooks). All nodes are also refreshed within the
+    same cycle when any of their dependencies produced new data.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deps: List[str] = list(),
+        interval: int | None = None,
+        refresh: Callable | None = None,
+    ):
+        self.name = name
+        self.deps = list(deps)
+        self.interval = interval
+        self._refresh = refresh
+        self.last_run = None
+        self.fingerprint = None
+
+    def refresh(self):
+        if self._refresh is not None:
+            return self._refresh()
+        return CacheItem(name=self.name).save()
+
+    def is_due(self, now: float, changed: set) -> bool:
+        if self.last_run is None:
+            return True
+        if len(changed.intersection(self.deps)) > 0:
+            return True
+        if self.interval is not None:
+            return now - self.last_run >= self.interval
+        return False
+
+
+def refresh_failed(result) -> bool:
+    """
+    Whether a custom refresh failed. `@timed` returns None when it
+    raised, and the `default.result` itself when it returned no data.
+    """
+    if result is None:
+        return True
+    return isinstance(result, dict) and ("error" in result or "loglevel" in result)
+
+
+def fingerprint(result) -> str | None:
+    """Returns a hash of a saved cache item's data, or None if failed."""
+    if not isinstance(result, dict) or "last_updated" not in result:
+        return None
+    data = json.dumps(result.get("data"), sort_keys=True, default=str)
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+class CacheScheduler:
+    """
+    Refreshes cache items in dependency order, once per cycle.
+
+    Independent nodes are run concurrently, and nodes which are not due
+    are skipped unless one of their dependencies changed this cycle.
+    """
+
+    def __init__(self, nodes: List[CacheNode], max_workers: int = 6):
+        self.nodes = {i.name: i for i in nodes}
+        self.max_workers = max_workers
+        self.lock = Lock()
+        missing = [
+            f"{i.name} -> {dep}"
+            for i in nodes
+            for dep in i.deps
+            if dep not in self.nodes
+        ]
+        if len(missing) > 0:
+            raise ValueError(f"Unknown cache dependencies: {missing}")
+        # Raises graphlib.CycleError early if the graph is invalid
+        self.order = list(self.graph.static_order())
+
+    @property
+    def graph(self) -> TopologicalSorter:
+        return TopologicalSorter({k: v.deps for k, v in self.nodes.items()})
+
+    def restore(self, name: str, data, age: int | None, fresh: bool):
+        """
+        Registers data loaded from a cache file, so fresh items are not
+        refreshed until their interval has passed, and unchanged data
+        does not trigger a refresh of dependent items.
+        """
+        node = self.nodes.get(name)
+        if node is None:
+            return
+        node.fingerprint = fingerprint({"last_updated": 0, "data": data})
+        if fresh and age is not None:
+            node.last_run = time.time() - age
+
+    def run_node(self, node: CacheNode, now: float, changed: set) -> str:
+        if not node.is_due(now, changed):
+            return "skipped"
+        start = time.perf_counter()
+        status = self.refresh_node(node, now)
+        metrics.cache_refresh_seconds.observe(
+            time.perf_counter() - start, item=node.name
+        )
+        metrics.cache_refresh_total.inc(item=node.name, status=status)
+        return status
+
+    def refresh_node(self, node: CacheNode, now: float) -> str:
+        try:
+            result = node.refresh()
+        except Exception as e:
+            logger.warning(f"[{node.name}] refresh failed: {e}")
+            return "failed"
+        if node._refresh is not None and refresh_failed(result):
+            logger.warning(f"[{node.name}] refresh failed: {result}")
+            return "failed"
+        node.last_run = now
+        new_fingerprint = fingerprint(result)
+        if new_fingerprint is None:
+            if node._refresh is not None:
+                # Not a saved cache item, so no data to compare.
+                return "changed"
+            return "failed"
+        if new_fingerprint == node.fingerprint:
+            return "unchanged"
+        node.fingerprint = new_fingerprint
+        return "changed"
+
+    @timed
+    def run_cycle(self, now: float | None = None) -> Dict[str, str]:
+        """Runs a single refresh cycle, returning each node's status"""
+        if not self.lock.acquire(blocking=False):
+            msg = "Cache refresh cycle already running, skipping."
+            return default.result(msg=msg, loglevel="warning", ignore_until=0)
+        try:
+            if now is None:
+                now = time.time()
+            status = {}
+            changed = set()
+            graph = self.graph
+            graph.prepare()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = {}
+                while graph.is_active():
+                    for name in graph.get_ready():
+                        node = self.nodes[name]
+                        future = executor.submit(
+                            self.run_node, node, now, set(changed)
+                        )
+                        pending.update({future: name})
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = pending.pop(future)
+                        status.update({name: future.result()})
+                        if status[name] == "changed":
+                            changed.add(name)
+                        graph.done(name)
+            counts = {
+                i: list(status.values()).count(i)
+                for i in ["changed", "unchanged", "skipped", "failed"]
+            }
+            msg = f"Cache refresh cycle complete: {counts}"
+            return default.result(
+                data=status, msg=msg, loglevel="loop", ignore_until=0
+            )
+        finally:
+            self.lock.release()
+
+
+def refresh_orderbook_variants():
+    # Populates the per variant orderbook caches. Returns their digests as
+    # the data, so dependents are only rebuilt when an orderbook changed.
+    result = CacheCalc().pairs_orderbook_extended(refresh=True)
+    if not isinstance(result, dict) or "orderbooks" not in result:
+        return None
+    return {"last_updated": int(time.time()), "data": result["orderbooks"]}
+
+
+def refresh_swap_store():
+    # Request handlers only read from the store, so it is kept current
+    # here. Its high-water mark and size change when swaps are ingested.
+    result = swap_store.refresh(force=True)
+    if not isinstance(result, int):
+        return None
+    data = {"last_updated": swap_store.last_updated, "swaps": len(swap_store)}
+    return {"last_updated": int(time.time()), "data": data}
+
+
+def cache_nodes() -> List[CacheNode]:
+    volume_deps = ["gecko_source"]
+    summary_deps = [
+        "pairs_orderbook_extended",
+        "pair_volumes_24hr",
+        "pairs_last_traded",
+        "pair_prices_24hr",
+    ]
+    return [
+        # External sources
+        CacheNode("coins_config", interval=14400),
+        CacheNode("coins", interval=14400),
+        CacheNode("fixer_rates", interval=300),
+        CacheNode("prices_tickers_v1", interval=90),
+        CacheNode("prices_tickers_v2", interval=90),
+        CacheNode("gecko_source", deps=["coins_config"], interval=450),
+        # Database sourced
+        CacheNode("pairs_last_traded", deps=volume_deps, interval=90),
+        CacheNode("pairs_last_traded_24hr", deps=volume_deps, interval=90),
+        CacheNode("pair_volumes_24hr", deps=volume_deps, interval=90),
+        CacheNode("pair_volumes_14d", deps=volume_deps, interval=90),
+        CacheNode("coin_volumes_24hr", deps=volume_deps, interval=90),
+        CacheNode(
+            "swap_store",
+            interval=swap_store.max_age,
+            refresh=refresh_swap_store,
+        ),
+        CacheNode(
+            "pair_prices_24hr",
+            deps=[
+                "gecko_source",
+                "pairs_last_traded",
+                "pair_volumes_24hr",
+                "swap_store",
+            ],
+        ),
+        # mm2 sourced
+        # Only refetched on its interval, as its prices are applied again
+        # by `pairs_orderbook_extended` when they change.
+        CacheNode(
+            "orderbook_variants",
+            interval=120,
+            refresh=refresh_orderbook_variants,
+        ),
+        CacheNode(
+            "pairs_orderbook_extended",
+            deps=["orderbook_variants", "pair_volumes_24hr", "pair_prices_24hr"],
+        ),
+        # Derived from the above
+        CacheNode("markets_summary", deps=summary_deps),
+        CacheNode("stats_api_summary", deps=summary_deps),
+        CacheNode("tickers", deps=summary_deps),
+        CacheNode("gecko_pairs", deps=["pairs_last_traded"]),
+        CacheNode(
+            "adex_24hr", deps=["pairs_orderbook_extended", "pair_volumes_24hr"]
+        ),
+        CacheNode(
+            "adex_fortnite", deps=["pairs_orderbook_extended", "pair_volumes_14d"]
+        ),
+    ]
+
+
+cache_scheduler = CacheScheduler(cache_nodes())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+from decimal import Decimal
+from threading import RLock
+from typing import Dict, List
+import numpy as np
+import db.sqldb as db
+from util.cron import cron
+from util.logger import timed
+from util.transform import derive, sortdata
+import util.defaults as default
+import util.validate as validate
+
+TRADE_TYPES = ["buy", "sell", "all"]
+# Columns kept as floats for vectorized maths, and as the original
+# Decimals so that returned values are exact.
+AMOUNT_COLUMNS = ["price", "reverse_price", "maker_amount", "taker_amount"]
+INT_COLUMNS = {
+    "finished_at": np.int64,
+    "last_updated": np.int64,
+    "is_success": np.int8,
+    "trade_type": np.int8,
+    "pair": np.int32,
+    "maker_coin": np.int32,
+    "taker_coin": np.int32,
+}
+
+
+class Dictionary:
+    """Encodes repeated strings (pairs, coins) as integer ids."""
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def encode(self, value: str) -> int:
+        if value not in self.ids:
+            self.ids.update({value: len(self.values)})
+            self.values.append(value)
+        return self.ids[value]
+
+    def get(self, value: str) -> int:
+        """Returns the id of a value, or -1 if it was never seen"""
+        return self.ids.get(value, -1)
+
+    def decode(self, ids) -> List[str]:
+        return [self.values[i] for i in ids]
+
+
+class SwapStore:
+    """
+    Recent swaps held in memory as columns of NumPy arrays, for
+    analytics endpoints which would otherwise query and iterate over
+    full swap rows for every pair.
+
+    Pairs and coins are dictionary encoded as integer ids, and rows are
+    kept sorted by `finished_at` (ties in the order they were added) so
+    the first and last swaps of any selection are its first and last
+    rows. Like the VolumeAggregator, each refresh only queries swaps
+    added or updated since the last one, and swaps which finished
+    before the start of the window are dropped.
+    """
+
+    def __init__(self, window: int = 86400 * 30, max_age: int = 30, **kwargs):
+        self.window = window
+        self.max_age = max_age
+        self.kwargs = kwargs
+        self.lock = RLock()
+        self.reset()
+
+    def reset(self):
+        self.pairs = Dictionary()
+        self.coins = Dictionary()
+        self.uuids = np.empty(0, dtype=object)
+        self.columns = {k: np.empty(0, dtype=v) for k, v in INT_COLUMNS.items()}
+        for i in AMOUNT_COLUMNS:
+            self.columns.update({i: np.empty(0, dtype=np.float64)})
+        self.decimals = {i: np.empty(0, dtype=object) for i in AMOUNT_COLUMNS}
+        # uuid -> row
+        self.rows = {}
+        self.start_time = 0
+        self.last_updated = 0
+        self.refreshed_at = 0
+
+    @property
+    def pg_query(self):
+        return db.SqlQuery(**self.kwargs)
+
+    def __len__(self):
+        return len(self.uuids)
+
+    def encode_row(self, swap: Dict) -> Dict:
+        return {
+            "finished_at": swap["finished_at"],
+            "last_updated": swap["last_updated"],
+            "is_success": swap["is_success"],
+            "trade_type": TRADE_TYPES.index(swap["trade_type"]),
+            "pair": self.pairs.encode(swap["pair"]),
+            "maker_coin": self.coins.encode(swap["maker_coin"]),
+            "taker_coin": self.coins.encode(swap["taker_coin"]),
+        } | {i: Decimal(swap[i]) for i in AMOUNT_COLUMNS}
+
+    def set_rows(self, rows: np.ndarray, encoded: List[Dict]):
+        for k, dtype in INT_COLUMNS.items():
+            self.columns[k][rows] = np.array([i[k] for i in encoded], dtype=dtype)
+        for k in AMOUNT_COLUMNS:
+            values = np.array([i[k] for i in encoded], dtype=object)
+            self.decimals[k][rows] = values
+            self.columns[k][rows] = values.astype(np.float64)
+
+    def append_rows(self, uuids: List[str], encoded: List[Dict]):
+        self.uuids = np.concatenate([self.uuids, np.array(uuids, dtype=object)])
+        for k, dtype in INT_COLUMNS.items():
+            values = np.array([i[k] for i in encoded], dtype=dtype)
+            self.columns[k] = np.concatenate([self.columns[k], values])
+        for k in AMOUNT_COLUMNS:
+            values = np.array([i[k] for i in encoded], dtype=object)
+            self.decimals[k] = np.concatenate([self.decimals[k], values])
+            self.columns[k] = np.concatenate(
+                [self.columns[k], values.astype(np.float64)]
+            )
+
+    def take(self, rows: np.ndarray):
+        """Keeps only the given rows, in the given order"""
+        self.uuids = self.uuids[rows]
+        for k in self.columns:
+            self.columns[k] = self.columns[k][rows]
+        for k in self.decimals:
+            self.decimals[k] = self.decimals[k][rows]
+        self.rows = {uuid: n for n, uuid in enumerate(self.uuids)}
+
+    def ingest(self, swaps: List[Dict], now: int):
+        """Applies new or updated swaps, then drops expired ones."""
+        self.start_time = now - self.window
+        swaps = [i for i in swaps if i["finished_at"] >= self.start_time]
+        updated = {}
+        added = {}
+        for swap in swaps:
+            self.last_updated = max(self.last_updated, swap["last_updated"])
+            target = updated if swap["uuid"] in self.rows else added
+            target.update({swap["uuid"]: self.encode_row(swap)})
+        if len(updated) > 0:
+            rows = np.array([self.rows[i] for i in updated], dtype=np.int64)
+            self.set_rows(rows, list(updated.values()))
+        if len(added) > 0:
+            self.rows.update({k: len(self.rows) + n for n, k in enumerate(added)})
+            self.append_rows(list(added), list(added.values()))
+        finished_at = self.columns["finished_at"]
+        keep = finished_at >= self.start_time
+        if len(updated) > 0 or len(added) > 0 or not keep.all():
+            rows = np.flatnonzero(keep)
+            # A stable sort keeps the order swaps were added in for ties
+            self.take(rows[np.argsort(finished_at[rows], kind="stable")])
+        self.refreshed_at = now
+
+    @timed
+    def refresh(self, now: int | None = None, force: bool = False):
+        """
+        Ingests swaps updated since the last refresh. Only called from
+        the cache scheduler, so the query runs without holding the lock
+        which readers wait on, and only the ingest is locked.
+        """
+        if now is None:
+            now = int(cron.now_utc())
+        if not force and now - self.refreshed_at < self.max_age:
+            msg = f"SwapStore refreshed {now - self.refreshed_at}s ago"
+            return default.result(data=0, msg=msg, loglevel="muted")
+        swaps = self.pg_query.swaps_updated_since(
+            last_updated=self.last_updated, start_time=now - self.window
+        )
+        if not isinstance(swaps, list):
+            msg = f"SwapStore refresh failed: {swaps}"
+            return default.result(msg=msg, loglevel="warning", ignore_until=0)
+        with self.lock:
+            self.ingest(swaps, now)
+        msg = f"SwapStore added {len(swaps)} swaps ({len(self)} in store)"
+        return default.result(data=len(swaps), msg=msg, loglevel="calc", ignore_until=3)
+
+    def covers(self, start_time: int, now: int | None = None) -> bool:
+        """
+        True if the store holds all swaps since `start_time`, and has
+        been refreshed recently enough to be used instead of the database.
+        """
+        if now is None:
+            now = int(cron.now_utc())
+        # Stale once refreshes have failed for a few cycles in a row
+        if self.refreshed_at == 0 or now - self.refreshed_at > 4 * self.max_age:
+            return False
+        return start_time >= self.start_time
+
+    def select(
+        self, start_time: int, end_time: int, mask=None, success_only: bool = True
+    ) -> np.ndarray:
+        """
+        Returns the rows of swaps which finished between the timestamps
+        (exclusive, like SqlQuery), ordered by `finished_at`.
+        """
+        finished_at = self.columns["finished_at"]
+        # Rows are sorted, so the time range is a slice
+        lo = np.searchsorted(finished_at, start_time, side="right")
+        hi = np.searchsorted(finished_at, end_time, side="left")
+        rows = np.arange(lo, hi)
+        keep = np.ones(len(rows), dtype=bool)
+        if success_only:
+            keep &= self.columns["is_success"][rows] == 1
+        if mask is not None:
+            keep &= mask[rows]
+        return rows[keep]
+
+    def coin_mask(self, coin: str) -> np.ndarray:
+        """Swaps with `coin` on either side"""
+        coin_id = self.coins.get(coin)
+        return (self.columns["maker_coin"] == coin_id) | (
+            self.columns["taker_coin"] == coin_id
+        )
+
+    def pair_mask(self, base: str, quote: str) -> np.ndarray:
+        """Swaps between `base` and `quote`, in either direction"""
+        maker = self.columns["maker_coin"]
+        taker = self.columns["taker_coin"]
+        base_id = self.coins.get(base)
+        quote_id = self.coins.get(quote)
+        if base_id == quote_id:
+            return self.coin_mask(base)
+        return ((maker == base_id) & (taker == quote_id)) | (
+            (maker == quote_id) & (taker == base_id)
+        )
+
+    def coin_pair_keys(self) -> np.ndarray:
+        """Returns a key per row for its two coins, in either direction"""
+        maker = self.columns["maker_coin"].astype(np.int64)
+        taker = self.columns["taker_coin"].astype(np.int64)
+        return np.minimum(maker, taker) << 32 | np.maximum(maker, taker)
+
+    def coin_pair_key(self, base: str, quote: str) -> int:
+        base_id = self.coins.get(base)
+        quote_id = self.coins.get(quote)
+        return min(base_id, quote_id) << 32 | max(base_id, quote_id)
+
+    def variants(self, pair_str: str, gecko_source=None) -> List[tuple]:
+        """Returns (variant, base, quote) for the variants of a pair"""
+        resp = []
+        bridge_swap = validate.is_bridge_swap(pair_str)
+        for variant in derive.pair_variants(pair_str):
+            # exclude duplication for bridge swaps
+            if bridge_swap and sortdata.is_reversed(variant, gecko_source=gecko_source):
+                continue
+            resp.append((variant, *derive.base_quote(variant)))
+        return resp
+
+    def pair_swaps(
+        self, pair_str: str, start_time: int, end_time: int, gecko_source=None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Returns the rows of a pair's swaps for each of its variants, and
+        for `ALL` variants newest first, like `SqlQuery.get_swaps`.
+        """
+        with self.lock:
+            resp = {}
+            for variant, base, quote in self.variants(pair_str, gecko_source):
+                resp.update(
+                    {
+                        variant: self.select(
+                            start_time, end_time, self.pair_mask(base, quote)
+                        )
+                    }
+                )
+            rows = np.concatenate([np.empty(0, dtype=np.int64)] + list(resp.values()))
+            order = np.argsort(-self.columns["finished_at"][rows], kind="stable")
+            resp.update({"ALL": rows[order]})
+            return resp
+
+    def get_swaps(
+        self, pair_str: str, start_time: int, end_time: int, gecko_source=None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Returns the same output as `SqlQuery.get_swaps` for a pair, with
+        the columns held in the store.
+        """
+        with self.lock:
+            resp = self.pair_swaps(pair_str, start_time, end_time, gecko_source)
+            return {k: self.records(v) for k, v in resp.items()}
+
+    def group_by(self, rows: np.ndarray, key: str | np.ndarray, value: str) -> Dict:
+        """
+        Groups rows by an encoded column (e.g. `pair`), or an array of
+        keys for all rows, returning the count, sum, and the rows with
+        the first, last, lowest and highest `value` in each group, as
+        arrays ordered by key.
+        """
+        if len(rows) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return {
+                i: empty for i in ["ids", "count", "sum", "first", "last", "min", "max"]
+            }
+        if isinstance(key, str):
+            key = self.columns[key]
+        keys = key[rows]
+        # Rows are in time order, so the first row per key is the oldest
+        by_time = rows[np.lexsort((rows, keys))]
+        sorted_keys = key[by_time]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(by_time)] - 1
+        by_value = rows[np.lexsort((rows, self.columns[value][rows], keys))]
+        return {
+            "ids": sorted_keys[starts],
+            "count": ends - starts + 1,
+            "sum": np.add.reduceat(self.columns[value][by_time], starts),
+            "first": by_time[starts],
+            "last": by_time[ends],
+            "min": by_value[starts],
+            "max": by_value[ends],
+        }
+
+    def records(self, rows: np.ndarray) -> List[Dict]:
+        """Returns rows as swap dicts, with exact amounts and prices"""
+        pairs = self.pairs.decode(self.columns["pair"][rows])
+        makers = self.coins.decode(self.columns["maker_coin"][rows])
+        takers = self.coins.decode(self.columns["taker_coin"][rows])
+        return [
+            {
+                "uuid": self.uuids[row],
+                "pair": pairs[n],
+                "maker_coin": makers[n],
+                "taker_coin": takers[n],
+                "trade_type": TRADE_TYPES[self.columns["trade_type"][row]],
+                "finished_at": int(self.columns["finished_at"][row]),
+                "is_success": int(self.columns["is_success"][row]),
+            }
+            | {i: self.decimals[i][row] for i in AMOUNT_COLUMNS}
+            for n, row in enumerate(rows)
+        ]
+
+
+swap_store = SwapStore()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+from bisect import insort
+from decimal import Decimal
+from threading import RLock
+from typing import Dict, List
+import db.sqldb as db
+from util.cron import cron
+from util.logger import timed
+import util.defaults as default
+
+
+class VolumeTotals:
+    """Running volume totals per pair variant and per coin variant."""
+
+    def __init__(self):
+        # (pair, trade_type) -> [maker_volume, taker_volume, num_swaps]
+        self.pairs = {}
+        # (coin, ticker) -> [volume, num_swaps]
+        self.makers = {}
+        self.takers = {}
+
+    def add(self, swap: Dict, sign: int = 1):
+        key = (swap["pair"], swap["trade_type"])
+        pair = self.pairs.setdefault(key, [Decimal(0), Decimal(0), 0])
+        pair[0] += sign * swap["maker_amount"]
+        pair[1] += sign * swap["taker_amount"]
+        pair[2] += sign
+        for side, totals in [("maker", self.makers), ("taker", self.takers)]:
+            key = (swap[f"{side}_coin"], swap[f"{side}_coin_ticker"])
+            coin = totals.setdefault(key, [Decimal(0), 0])
+            coin[0] += sign * swap[f"{side}_amount"]
+            coin[1] += sign
+
+    def merge(self, other, sign: int = 1):
+        for key, (maker_vol, taker_vol, num_swaps) in other.pairs.items():
+            pair = self.pairs.setdefault(key, [Decimal(0), Decimal(0), 0])
+            pair[0] += sign * maker_vol
+            pair[1] += sign * taker_vol
+            pair[2] += sign * num_swaps
+        for side in ["makers", "takers"]:
+            totals = getattr(self, side)
+            for key, (vol, num_swaps) in getattr(other, side).items():
+                coin = totals.setdefault(key, [Decimal(0), 0])
+                coin[0] += sign * vol
+                coin[1] += sign * num_swaps
+
+    def pair_rows(self) -> List[Dict]:
+        """Returns rows in the format of the `pair_trade_volumes` query"""
+        return [
+            {
+                "pair": pair,
+                "trade_type": trade_type,
+                "maker_volume": v[0],
+                "taker_volume": v[1],
+                "num_swaps": v[2],
+            }
+            for (pair, trade_type), v in sorted(self.pairs.items())
+            if v[2] > 0
+        ]
+
+    def coin_rows(self, side: str) -> List[Dict]:
+        """Returns rows in the format of the `coin_trade_volumes` query"""
+        return [
+            {
+                "coin": coin,
+                "ticker": ticker,
+                f"{side}_volume": v[0],
+                "num_swaps": v[1],
+            }
+            for (coin, ticker), v in sorted(getattr(self, f"{side}s").items())
+            if v[1] > 0
+        ]
+
+
+class VolumeAggregator:
+    """
+    Incrementally aggregates swap volumes into fixed size time buckets,
+    keeping running totals for each of the configured windows.
+
+    Each refresh only queries swaps added or updated since the last one,
+    and expires buckets which have fallen out of a window, so the cost
+    grows with the number of new swaps rather than the window size.
+    Windows have a resolution of one bucket, so the oldest bucket is
+    included in full while it overlaps the window.
+    """
+
+    def __init__(self, windows: List[int], bucket_size: int = 300, **kwargs):
+        self.windows = sorted(windows)
+        self.bucket_size = bucket_size
+        self.kwargs = kwargs
+        self.lock = RLock()
+        self.reset()
+
+    def reset(self):
+        # bucket start time -> VolumeTotals
+        self.buckets = {}
+        self.bucket_times = []
+        # bucket start time -> uuids of swaps counted in the bucket
+        self.bucket_uuids = {}
+        # uuid -> (bucket start time, swap) of swaps counted in a bucket
+        self.swaps = {}
+        # window -> (start of oldest bucket included, VolumeTotals)
+        self.totals = {i: [0, VolumeTotals()] for i in self.windows}
+        self.last_updated = 0
+        self.refreshed_at = 0
+
+    @property
+    def pg_query(self):
+        return db.SqlQuery(**self.kwargs)
+
+    def bucket_start(self, timestamp: int) -> int:
+        return int(timestamp) - int(timestamp) % self.bucket_size
+
+    def window_start(self, window: int, now: int) -> int:
+        return self.bucket_start(now - window)
+
+    def remove_swap(self, uuid: str):
+        if uuid not in self.swaps:
+            return
+        bucket_ts, swap = self.swaps.pop(uuid)
+        self.buckets[bucket_ts].add(swap, sign=-1)
+        self.bucket_uuids[bucket_ts].discard(uuid)
+        for start, totals in self.totals.values():
+            if bucket_ts >= start:
+                totals.add(swap, sign=-1)
+
+    def add_swap(self, swap: Dict):
+        self.remove_swap(swap["uuid"])
+        if swap["is_success"] != 1:
+            return
+        bucket_ts = self.bucket_start(swap["finished_at"])
+        if bucket_ts < min([i[0] for i in self.totals.values()]):
+            return
+        if bucket_ts not in self.buckets:
+            self.buckets.update({bucket_ts: VolumeTotals()})
+            self.bucket_uuids.update({bucket_ts: set()})
+            insort(self.bucket_times, bucket_ts)
+        swap = {
+            k: Decimal(v) if k in ["maker_amount", "taker_amount"] else v
+            for k, v in swap.items()
+        }
+        self.buckets[bucket_ts].add(swap)
+        self.swaps.update({swap["uuid"]: (bucket_ts, swap)})
+        self.bucket_uuids[bucket_ts].add(swap["uuid"])
+        for start, totals in self.totals.values():
+            if bucket_ts >= start:
+                totals.add(swap)
+
+    def expire(self, now: int):
+        """Removes buckets from the totals of windows they have left."""
+        for window in self.windows:
+            start, totals = self.totals[window]
+            new_start = self.window_start(window, now)
+            for bucket_ts in self.bucket_times:
+                if bucket_ts >= new_start:
+                    break
+                if bucket_ts >= start:
+                    totals.merge(self.buckets[bucket_ts], sign=-1)
+            self.totals[window][0] = new_start
+        # Drop buckets which are outside of all windows
+        oldest = self.totals[self.windows[-1]][0]
+        while len(self.bucket_times) > 0 and self.bucket_times[0] < oldest:
+            bucket_ts = self.bucket_times.pop(0)
+            self.buckets.pop(bucket_ts)
+            for uuid in self.bucket_uuids.pop(bucket_ts):
+                self.swaps.pop(uuid)
+
+    def ingest(self, swaps: List[Dict], now: int):
+        """Applies new or updated swaps, then expires old buckets."""
+        if self.refreshed_at == 0:
+            for window in self.windows:
+                self.totals[window][0] = self.window_start(window, now)
+        for swap in swaps:
+            self.add_swap(swap)
+            self.last_updated = max(self.last_updated, swap["last_updated"])
+        self.expire(now)
+        self.refreshed_at = now
+
+    @timed
+    def refresh(self, now: int | None = None):
+        with self.lock:
+            if now is None:
+                now = int(cron.now_utc())
+            start_time = now - self.windows[-1] - self.bucket_size
+            swaps = self.pg_query.swaps_updated_since(
+                last_updated=self.last_updated, start_time=start_time
+            )
+            if not isinstance(swaps, list):
+                msg = f"VolumeAggregator refresh failed: {swaps}"
+                return default.result(msg=msg, loglevel="warning", ignore_until=0)
+            self.ingest(swaps, now)
+            msg = f"VolumeAggregator added {len(swaps)} swaps"
+            msg += f" ({len(self.swaps)} in {len(self.buckets)} buckets)"
+            return default.result(
+                data=len(swaps), msg=msg, loglevel="calc", ignore_until=3
+            )
+
+    def totals_for(self, window: int) -> VolumeTotals:
+        if window not in self.totals:
+            raise ValueError(f"Window {window} is not aggregated!")
+        return self.totals[window][1]
+
+    def pair_trade_volumes(self, window: int = 86400) -> Dict:
+        """Returns the same output as `SqlQuery.pair_trade_volumes`"""
+        with self.lock:
+            self.refresh()
+            if self.refreshed_at == 0:
+                end_time = int(cron.now_utc())
+                return self.pg_query.pair_trade_volumes(
+                    start_time=end_time - window, end_time=end_time
+                )
+            rows = self.totals_for(window).pair_rows()
+            end_time = self.refreshed_at
+        return self.pg_query.pair_volumes_from_rows(rows, end_time - window, end_time)
+
+    def coin_trade_volumes(self, window: int = 86400) -> Dict:
+        """Returns the same output as `SqlQuery.coin_trade_volumes`"""
+        with self.lock:
+            self.refresh()
+            if self.refreshed_at == 0:
+                end_time = int(cron.now_utc())
+                return self.pg_query.coin_trade_volumes(
+                    start_time=end_time - window, end_time=end_time
+                )
+            totals = self.totals_for(window)
+            maker_rows = totals.coin_rows("maker")
+            taker_rows = totals.coin_rows("taker")
+            end_time = self.refreshed_at
+        return self.pg_query.coin_volumes_from_rows(
+            maker_rows, taker_rows, end_time - window, end_time
+        )
+
+
+volume_aggregator = VolumeAggregator(windows=[86400, 86400 * 14])
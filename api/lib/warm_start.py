@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import time
+from typing import Dict
+from lib.cache import CACHE_FILES, load_cache_files
+from lib.scheduler import CacheScheduler, cache_scheduler
+from util.logger import timed
+import util.defaults as default
+
+
+class WarmStart:
+    """
+    Serves the last saved cache files immediately on startup.
+
+    All cache files are loaded into memcache concurrently, including
+    stale ones, so endpoints return data from the first request. Items
+    which are still fresh according to their manifest are registered
+    with the scheduler as already refreshed, while stale or missing
+    items are refreshed by its first cycle in the background.
+    """
+
+    def __init__(self, scheduler: CacheScheduler, names=CACHE_FILES):
+        self.scheduler = scheduler
+        self.names = names
+        self.started_at = time.time()
+        self.ready_at = None
+        self.first_request_at = None
+        self.items = {}
+
+    @timed
+    def run(self, max_workers: int = 8):
+        loaded = load_cache_files(self.names, max_workers=max_workers)
+        for name, i in loaded.items():
+            if i["data"] is not None:
+                fresh = i["status"] == "fresh"
+                self.scheduler.restore(name, i["data"], i["age"], fresh)
+        self.items = {k: v["status"] for k, v in loaded.items()}
+        self.ready_at = time.time()
+        counts = {
+            i: list(self.items.values()).count(i)
+            for i in ["fresh", "stale", "missing"]
+        }
+        msg = f"Warm start loaded cache files in {self.ready_secs}s: {counts}"
+        return default.result(
+            data=self.items, msg=msg, loglevel="loop", ignore_until=0
+        )
+
+    def record_request(self):
+        if self.first_request_at is None:
+            self.first_request_at = time.time()
+
+    @property
+    def ready_secs(self) -> float | None:
+        if self.ready_at is None:
+            return None
+        return round(self.ready_at - self.started_at, 3)
+
+    @property
+    def time_to_first_request(self) -> float | None:
+        if self.first_request_at is None:
+            return None
+        return round(self.first_request_at - self.started_at, 3)
+
+    def status(self) -> Dict:
+        return {
+            "ready_secs": self.ready_secs,
+            "time_to_first_request": self.time_to_first_request,
+            "items": self.items,
+        }
+
+
+warm_start = WarmStart(cache_scheduler)
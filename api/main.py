@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 from util.cron import cron
 import uvicorn
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 
 """
 from fastapi.staticfiles import StaticFiles
@@ -28,23 +28,22 @@ from routes import (
     tickers,
     stats_api,
     new_db,
+    protected,
     stats_xyz
 )
-from lib.cache import Cache, CacheItem
+from lib.cache import Cache
+from lib.warm_start import warm_start
 from models.generic import ErrorMessage, HealthCheck
+import util.metrics as metrics
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # start up functions
-    for i in ["coins", "coins_config", "gecko_source"]:
-        cache_item = CacheItem(i)
-        cache_item.save()
-    yield
-    # shut down functions
+app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
 
-app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    warm_start.record_request()
+    return await call_next(request)
 
 app.include_router(cache_loop.router)
 
@@ -132,9 +131,22 @@ def healthcheck():
         "timestamp": int(cron.now_utc()),
         "status": "ok",
         "cache_age_mins": cache.healthcheck(),
+        "warm_start": warm_start.status(),
     }
 
 
+@app.get(
+    "/metrics",
+    tags=["Status"],
+    description="Latency, cache and mm2 RPC metrics in the Prometheus text format",
+    response_class=PlainTextResponse,
+)
+def get_metrics():
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 app.include_router(
     coins.router,
     prefix="/api/v3/coins",
@@ -159,6 +171,13 @@ app.include_router(
     responses={418: {"description": "I'm a teapot"}},
 )
 
+app.include_router(
+    protected.router,
+    prefix="/api/v3/protected",
+    tags=["Protected"],
+    responses={401: {"description": "Unauthorized"}},
+)
+
 if DEVMODE:
     app.include_router(
         new_db.router,
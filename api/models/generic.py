@@ -127,6 +127,7 @@ class HealthCheck(BaseModel):
     timestamp: int = 1777777777
     status: str = "ok"
     cache_age_mins: Dict[str, Any]
+    warm_start: Dict[str, Any] | None = None
 
 
 class CoinTradeVolume(BaseModel):
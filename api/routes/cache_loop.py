@@ -6,9 +6,10 @@ import db.sqldb as db
 import db.sqlitedb_merge as old_db_merge
 import util.defaults as default
 import util.memcache as memcache
-from lib.cache import Cache, CacheItem, reset_cache_files
-from lib.cache_calc import CacheCalc
-from util.logger import logger, timed
+from lib.cache import Cache
+from lib.scheduler import cache_scheduler
+from lib.warm_start import warm_start
+from util.logger import timed
 
 router = APIRouter()
 
@@ -63,226 +64,56 @@ def check_cache():  # pragma: no cover
 @router.on_event("startup")
 @timed
 def init_missing_cache():  # pragma: no cover
-    reset_cache_files()
+    # Loads saved cache files, stale or not, before serving requests.
+    warm_start.run()
     msg = "init missing cache loop complete!"
     return default.result(msg=msg, loglevel="loop", ignore_until=3)
 
 
-# ORDERBOOKS CACHE
+# CACHE REFRESH
 @router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def update_pairs_orderbook_extended():
-    if memcache.get("testing") is None:
-        try:
-            # builds from variant caches and saves to file
-            CacheItem(name="pairs_orderbook_extended").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pairs_orderbook_extended refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=120)
+@repeat_every(seconds=30)
 @timed
-def refresh_pairs_orderbook_extended():
+def refresh_cache():
     if memcache.get("testing") is None:
         try:
-            # threaded to populate variant caches
-            CacheCalc().pairs_orderbook_extended(refresh=True)
+            # Refreshes cache items in dependency order, as they become
+            # due. See `lib/scheduler.py` for the graph and intervals.
+            return cache_scheduler.run_cycle()
         except Exception as e:
             return default.result(msg=e, loglevel="warning")
-        msg = "pairs_orderbook_extended refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# PRICES CACHE
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def refresh_prices_24hr():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="pair_prices_24hr").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pair_prices_24hr refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# VOLUMES CACHE
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def get_pair_volumes_24hr():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="pair_volumes_24hr").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pair_volumes_24hr refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# VOLUMES CACHE
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def get_pair_volumes_14d():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="pair_volumes_14d").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pair_volumes_14d refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def get_coin_volumes_24hr():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="coin_volumes_24hr").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "coin_volumes_24hr refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# LAST TRADE
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def pairs_last_traded():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="pairs_last_traded").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pairs_last_traded loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def pairs_last_traded_24hr():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="pairs_last_traded_24hr").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pairs_last_traded_24hr loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# MARKETS CACHE
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def get_markets_summary():
-    if memcache.get("testing") is None:
-        try:
-            CacheItem(name="markets_summary").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "markets_summary loop for memcache complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def prices_service():  # pragma: no cover
-    if memcache.get("testing") is None:
-        try:
-            for i in ["prices_tickers_v1", "prices_tickers_v2"]:
-                CacheItem(i).save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "Prices update loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# EXTERNAL SOURCES CACHE
-@router.on_event("startup")
-@repeat_every(seconds=14400)
-@timed
-def coins():  # pragma: no cover
-    if memcache.get("testing") is None:
-        try:
-            for i in ["coins_config", "coins"]:
-                CacheItem(i).save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        return default.result(
-            msg="Coins update loop complete!", loglevel="loop", ignore_until=5
-        )
-
-
-@router.on_event("startup")
-@repeat_every(seconds=450)
-@timed
-def gecko_data():  # pragma: no cover
-    if memcache.get("testing") is None:
-        try:
-            CacheItem("gecko_source").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "Gecko source data update loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def gecko_pairs():  # pragma: no cover
-    if memcache.get("testing") is None:
-        try:
-            CacheItem("gecko_pairs").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "Gecko pairs data update loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
 
 
+# DATABASE SYNC
 @router.on_event("startup")
-@repeat_every(seconds=90)
 @timed
-def stats_api_summary():  # pragma: no cover
+def init_tables():  # pragma: no cover
     if memcache.get("testing") is None:
-        try:
-            CacheItem("stats_api_summary").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "stats_api_summary data update loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
+        db.SqlUpdate(db_type="pgsql").init_rollups()
+        db.SqlUpdate(db_type="pgsql").init_first_last()
+        db.SqlUpdate(db_type="pgsql").init_sync_state()
 
 
 @router.on_event("startup")
-@repeat_every(seconds=300)
+@repeat_every(seconds=60, max_repetitions=1)
 @timed
-def fixer_rates():  # pragma: no cover
+def migrate_tables():  # pragma: no cover
+    # Runs once in the background, as building indexes on an existing
+    # swaps table, or summarising all of its swaps into new rollup and
+    # first / last traded tables, takes minutes and startup would wait.
     if memcache.get("testing") is None:
-        try:
-            CacheItem(name="fixer_rates").save()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "Fixer rates update loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
+        db.SqlUpdate(db_type="pgsql").init_indexes()
+        db.SqlUpdate(db_type="pgsql").populate_rollups()
+        db.SqlUpdate(db_type="pgsql").populate_first_last()
 
 
-# DATABASE SYNC
 @router.on_event("startup")
 @repeat_every(seconds=300)
 @timed
 def populate_pgsqldb_loop():
     if memcache.get("testing") is None:
-        # updates last 24 hours swaps
-        db.SqlSource().populate_pgsqldb()
+        # imports swaps added since the last sync
+        db.SqlSource().sync_pgsqldb()
 
 
 @router.on_event("startup")
@@ -303,62 +134,6 @@ def import_dbs():
         return default.result(msg=msg, loglevel="merge")
 
 
-@router.on_event("startup")
-@repeat_every(seconds=120)
-@timed
-def adex_fortnite():
-    if memcache.get("testing") is None:
-        try:
-            pass
-            CacheItem(name="adex_fortnite").save()
-        except Exception as e:
-            logger.warning(default.result(msg=e, loglevel="warning"))
-        msg = "Adex fortnight loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-@router.on_event("startup")
-@repeat_every(seconds=120)
-@timed
-def adex_24hr():
-    if memcache.get("testing") is None:
-        try:
-            pass
-            CacheItem(name="adex_24hr").save()
-        except Exception as e:
-            logger.warning(default.result(msg=e, loglevel="warning"))
-        msg = "Adex 24hr loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# TICKERS
-@router.on_event("startup")
-@repeat_every(seconds=90)
-@timed
-def pair_tickers():
-    if memcache.get("testing") is None:
-        try:
-            CacheCalc().tickers(refresh=True)
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "pairs_last_traded loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
-# REVIEW
-@router.on_event("startup")
-@repeat_every(seconds=120)
-@timed
-def refresh_tickers():
-    if memcache.get("testing") is None:
-        try:
-            CacheCalc().tickers()
-        except Exception as e:
-            return default.result(msg=e, loglevel="warning")
-        msg = "Tickers refresh loop complete!"
-        return default.result(msg=msg, loglevel="loop", ignore_until=0)
-
-
 """
 
 @router.on_event("startup")
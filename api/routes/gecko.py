@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 from util.cron import cron
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Request, Response
 from fastapi.responses import JSONResponse
 from typing import List
 from lib.pair import Pair
 from lib.cache_calc import CacheCalc
 import lib.dex_api as dex
+from lib.prerendered import prerendered
 from models.generic import ErrorMessage
 from models.gecko import (
     GeckoPairsItem,
@@ -46,20 +47,13 @@ def gecko_pairs():
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def gecko_tickers():
+def gecko_tickers(request: Request):
     try:
+        resp = prerendered.response("gecko_tickers", request)
+        if resp is not None:
+            return resp
         data = CacheCalc().tickers()
-        resp = {
-            "last_update": int(cron.now_utc()),
-            "pairs_count": data["pairs_count"],
-            "swaps_count": data["swaps_count"],
-            "combined_volume_usd": data["combined_volume_usd"],
-            "combined_liquidity_usd": data["combined_liquidity_usd"],
-            "data": [],
-        }
-        for depair in data["data"]:
-            resp["data"].append(data["data"][depair])
-        return resp
+        return prerendered.format("gecko_tickers", data)
     except Exception as e:  # pragma: no cover
         logger.warning(f"{type(e)} Error in [/api/v3/gecko/tickers]: {e}")
         return {"error": f"{type(e)} Error in [/api/v3/gecko/tickers]: {e}"}
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 from decimal import Decimal
-from datetime import datetime, timedelta
 from util.cron import cron
 from typing import List, Dict
-from const import MARKETS_PAIRS_DAYS
+from const import MARKETS_PAIRS_DAYS, DB_AGGREGATE_TIMEOUT
+from db.async_sqldb import AsyncSqlQuery
 from models.generic import ErrorMessage
-from util.exceptions import BadPairFormatError
+from util.exceptions import BadPairFormatError, QueryLimitError, QueryTimeoutError
 from models.markets import (
     MarketsUsdVolume,
     MarketsFiatRatesItem,
@@ -22,14 +22,13 @@ from models.markets import (
 from lib.cache_calc import CacheCalc
 from lib.pair import Pair
 from lib.markets import Markets
+from lib.prerendered import prerendered
 from routes.metadata import markets_desc
 from util.enums import TradeType
 from util.logger import logger
 from util.transform import deplatform, derive, invert, sortdata
 import util.memcache as memcache
-from util.transform import template
 import util.validate as validate
-import db.sqldb as db
 
 router = APIRouter()
 
@@ -41,9 +40,14 @@ router = APIRouter()
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def atomicdex_info_api():
-    query = db.SqlQuery()
-    return query.swap_counts()
+async def atomicdex_info_api():
+    try:
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        return await query.swap_counts()
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
 
 
 @router.get(
@@ -67,9 +71,7 @@ def fiat_rates():
 def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     try:
         gecko_source = memcache.get_gecko_source()
-        is_reversed = pair_str != sortdata.pair_by_market_cap(
-            pair_str, gecko_source=gecko_source
-        )
+        is_reversed = sortdata.is_reversed(pair_str, gecko_source=gecko_source)
         if is_reversed:
             pair = Pair(pair_str=invert.pair(pair_str), gecko_source=gecko_source)
             data = pair.orderbook(pair_str=invert.pair(pair_str), depth=depth)
@@ -101,14 +103,13 @@ def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def summary():
+def summary(request: Request):
     try:
+        resp = prerendered.response("markets_summary", request)
+        if resp is not None:
+            return resp
         data = memcache.get_markets_summary()
-        # TODO: remove this when dashboard updates
-        for i in data:
-            i["trading_pair"] = i["pair"]
-            i["price_change_percent_24hr"] = i["price_change_pct_24hr"]
-        return data
+        return prerendered.format("markets_summary", data)
     except Exception as e:  # pragma: no cover
         logger.warning(f"{type(e)} Error in [/api/v3/market/summary]: {e}")
         return {"error": f"{type(e)} Error in [/api/v3/market/summary]: {e}"}
@@ -139,13 +140,17 @@ def summary_for_ticker(coin: str = "KMD"):
                     swaps_count += int(i["trades_24hr"])
                     liquidity += Decimal(i["liquidity_usd"])
                     volume += Decimal(i["volume_usd_24hr"])
-                    i["last_trade"] = i["last_swap"]
-                    i["price_change_percent_24hr"] = i["price_change_pct_24hr"]
-                    i["quote_usd_price"] = i["quote_price_usd"]
-                    i["base_usd_price"] = i["base_price_usd"]
-                    i["base"] = i["base_currency"]
-                    i["quote"] = i["quote_currency"]
-                    data.append(i)
+                    data.append(
+                        i
+                        | {
+                            "last_trade": i["last_swap"],
+                            "price_change_percent_24hr": i["price_change_pct_24hr"],
+                            "quote_usd_price": i["quote_price_usd"],
+                            "base_usd_price": i["base_price_usd"],
+                            "base": i["base_currency"],
+                            "quote": i["quote_currency"],
+                        }
+                    )
 
         resp = {
             "last_update": int(cron.now_utc()),
@@ -324,31 +329,19 @@ def usd_volume_24h():
     "/volumes_ticker/{coin}/{days_in_past}",
     description="Daily coin volume (e.g. `KMD, KMD-BEP20, KMD-ALL`) traded last 'x' days.",
 )
-def volumes_ticker(coin="KMD", days_in_past=1, trade_type: TradeType = TradeType.ALL):
+async def volumes_ticker(
+    coin="KMD", days_in_past=1, trade_type: TradeType = TradeType.ALL
+):
     try:
-        volumes_dict = {}
-        query = db.SqlQuery()
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
         # Individual tickers only, no merge except segwit
-        decoin = deplatform.coin(coin)
         variants = derive.coin_variants(coin, segwit_only=True)
-        for i in range(0, int(days_in_past)):
-            d = datetime.today() - timedelta(days=i)
-            d_str = d.strftime("%Y-%m-%d")
-            day_ts = int(int(d.strftime("%s")) / 86400) * 86400
-            start_time = int(day_ts)
-            end_time = int(day_ts) + 86400
-            volumes = query.coin_trade_volumes(start_time=start_time, end_time=end_time)
-            data = query.coin_trade_volumes_usd(volumes)
-            volumes_dict[d_str] = template.volumes_ticker()
-            for variant in variants:
-                if decoin in data["volumes"]:
-                    if variant in data["volumes"][decoin]:
-                        volumes_dict[d_str] = (
-                            volumes_dict[d_str] | data["volumes"][decoin][variant]
-                        )
-            data = {
-                d_str: volumes_dict[d_str]["total_volume"] for d_str in volumes_dict
-            }
-        return data
+        return await query.daily_coin_volumes(
+            coin=coin, days=int(days_in_past), variants=variants
+        )
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         logger.warning(e)
@@ -2,12 +2,18 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from typing import List, Dict
-from const import GENERIC_PAIRS_DAYS
+from const import GENERIC_PAIRS_DAYS, DB_AGGREGATE_TIMEOUT
+from db.async_sqldb import AsyncSqlQuery
 from lib.cache import Cache
 from lib.pair import Pair
 from models.generic import ErrorMessage, CoinTradeVolumes, PairTradeVolumes
 from util.enums import TradeType, GroupBy
-from util.exceptions import UuidNotFoundException, BadPairFormatError
+from util.exceptions import (
+    UuidNotFoundException,
+    BadPairFormatError,
+    QueryLimitError,
+    QueryTimeoutError,
+)
 from util.logger import logger
 from util.transform import deplatform
 import db.sqldb as db
@@ -31,13 +37,17 @@ cache = Cache()
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def get_pairs(remove_platforms: bool = True):
+async def get_pairs(remove_platforms: bool = True):
     try:
-        query = db.SqlQuery()
-        data = query.get_pairs(days=GENERIC_PAIRS_DAYS)
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        data = await query.get_pairs(days=GENERIC_PAIRS_DAYS)
         if remove_platforms:
             data = sorted(list(set([deplatform.pair(i) for i in data])))
         return data
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -51,7 +61,7 @@ def get_pairs(remove_platforms: bool = True):
     response_model=List,
     status_code=200,
 )
-def distinct(
+async def distinct(
     start_time: int = 0,
     end_time: int = 0,
     column: str | None = None,
@@ -66,9 +76,9 @@ def distinct(
     try:
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
         resp = sorted(
-            query.get_distinct(
+            await query.get_distinct(
                 start_time=start_time,
                 end_time=end_time,
                 column=column,
@@ -82,6 +92,10 @@ def distinct(
             )
         )
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -95,7 +109,7 @@ def distinct(
     response_model=List[db.DefiSwap] | Dict[str, List[db.DefiSwap]] | Dict,
     status_code=200,
 )
-def get_swaps(
+async def get_swaps(
     start_time: int = 0,
     end_time: int = 0,
     coin: str | None = None,
@@ -111,8 +125,8 @@ def get_swaps(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        resp = query.get_swaps(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        resp = await query.get_swaps(
             start_time=start_time,
             end_time=end_time,
             coin=coin,
@@ -124,6 +138,10 @@ def get_swaps(
             pubkey=pubkey,
         )
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -137,7 +155,7 @@ def get_swaps(
     response_model=List[db.DefiSwap],
     status_code=200,
 )
-def get_swaps_for_coin(
+async def get_swaps_for_coin(
     coin: str,
     start_time: int = 0,
     end_time: int = 0,
@@ -152,8 +170,8 @@ def get_swaps_for_coin(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        resp = query.get_swaps_for_coin(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        resp = await query.get_swaps_for_coin(
             start_time=start_time,
             end_time=end_time,
             coin=coin,
@@ -164,6 +182,10 @@ def get_swaps_for_coin(
             pubkey=pubkey,
         )
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -177,7 +199,7 @@ def get_swaps_for_coin(
     response_model=List[db.DefiSwap],
     status_code=200,
 )
-def get_swaps_for_pair(
+async def get_swaps_for_pair(
     pair_str: str,
     start_time: int = 0,
     end_time: int = 0,
@@ -195,8 +217,8 @@ def get_swaps_for_pair(
             end_time = int(cron.now_utc())
 
         base, quote = derive.base_quote(pair_str)
-        query = db.SqlQuery()
-        resp = query.get_swaps_for_pair(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        resp = await query.get_swaps_for_pair(
             start_time=start_time,
             end_time=end_time,
             base=base,
@@ -209,6 +231,10 @@ def get_swaps_for_pair(
             all_variants=all_variants,
         )
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -270,13 +296,17 @@ def historical_trades(
     response_model=db.DefiSwap,
     status_code=200,
 )
-def get_swap(uuid: str):
+async def get_swap(uuid: str):
     try:
-        query = db.SqlQuery()
-        resp = query.get_swap(uuid=uuid)
+        query = AsyncSqlQuery()
+        resp = await query.get_swap(uuid=uuid)
         if "error" in resp:
             raise UuidNotFoundException(resp["error"])
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -289,7 +319,7 @@ def get_swap(uuid: str):
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def swap_uuids(
+async def swap_uuids(
     start_time: int = 0,
     end_time: int = 0,
     coin: str | None = None,
@@ -300,8 +330,8 @@ def swap_uuids(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        uuids = query.swap_uuids(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        uuids = await query.swap_uuids(
             start_time=start_time, end_time=end_time, coin=coin, pair=pair
         )
         if coin is not None:
@@ -328,7 +358,7 @@ def swap_uuids(
             "swap_count": len(uuids),
             "swap_uuids": uuids,
         }
-    except BadPairFormatError as e:
+    except (BadPairFormatError, QueryLimitError, QueryTimeoutError) as e:
         err = {"error": e.name, "message": e.msg}
         return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
@@ -344,7 +374,7 @@ def swap_uuids(
     response_model=CoinTradeVolumes,
     status_code=200,
 )
-def coin_trade_volumes_usd(
+async def coin_trade_volumes_usd(
     start_time: int = 0,
     end_time: int = 0,
     pubkey: str | None = None,
@@ -356,12 +386,16 @@ def coin_trade_volumes_usd(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        volumes = query.coin_trade_volumes(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        volumes = await query.coin_trade_volumes(
             start_time=start_time,
             end_time=end_time,
         )
-        return query.coin_trade_volumes_usd(volumes=volumes)
+        return db.SqlQuery().coin_trade_volumes_usd(volumes=volumes)
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -375,7 +409,7 @@ def coin_trade_volumes_usd(
     response_model=PairTradeVolumes,
     status_code=200,
 )
-def pair_trade_volumes_usd(
+async def pair_trade_volumes_usd(
     start_time: int = 0,
     end_time: int = 0,
     pubkey: str | None = None,
@@ -388,8 +422,8 @@ def pair_trade_volumes_usd(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        volumes = query.pair_trade_volumes(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        volumes = await query.pair_trade_volumes(
             start_time=start_time,
             end_time=end_time,
             version=version,
@@ -397,7 +431,11 @@ def pair_trade_volumes_usd(
             coin=coin,
             gui=gui,
         )
-        return query.pair_trade_volumes_usd(volumes=volumes)
+        return db.SqlQuery().pair_trade_volumes_usd(volumes=volumes)
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -414,26 +452,30 @@ def pair_trade_volumes_usd(
     # response_model=PairTradeVolumes,
     status_code=200,
 )
-def last_traded(category: GroupBy, min_swaps: int = 0):
+async def last_traded(category: GroupBy, min_swaps: int = 0):
     try:
-        query = db.SqlQuery()
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
         match category:
             case GroupBy.pair:
-                return query.pair_last_trade()
+                return await query.pair_last_trade()
             case GroupBy.gui:
-                return query.gui_last_traded()
+                return await query.gui_last_traded()
             case GroupBy.coin:
-                return query.coin_last_traded()
+                return await query.coin_last_traded()
             case GroupBy.ticker:
-                return query.ticker_last_traded()
+                return await query.ticker_last_traded()
             case GroupBy.platform:
-                return query.platform_last_traded()
+                return await query.platform_last_traded()
             case GroupBy.pubkey:
-                return query.pubkey_last_traded()
+                return await query.pubkey_last_traded()
             case GroupBy.version:
-                return query.version_last_traded()
+                return await query.version_last_traded()
             case _:
                 return {"error": "Invalid selection for `group_by`"}
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         err = {"error": f"{e}"}
         logger.warning(err)
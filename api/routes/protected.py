@@ -1,7 +1,70 @@
 #!/usr/bin/env python3
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from const import API_USER, API_PASS
+from models.generic import ErrorMessage
+from util.logger import logger
+from util.profiler import profiler, ProfilerBusy
 
-from dotenv import load_dotenv
+security = HTTPBasic()
 
-load_dotenv()
 
-# TODO: We dont have protected enpoints yet, but they will go here
+def is_authorized(credentials: HTTPBasicCredentials) -> bool:
+    if not API_USER or not API_PASS:
+        # Protected endpoints are disabled until credentials are set
+        return False
+    user_ok = secrets.compare_digest(
+        credentials.username.encode("utf8"), API_USER.encode("utf8")
+    )
+    pass_ok = secrets.compare_digest(
+        credentials.password.encode("utf8"), API_PASS.encode("utf8")
+    )
+    return user_ok and pass_ok
+
+
+def authorize(credentials: HTTPBasicCredentials = Depends(security)):
+    if not is_authorized(credentials):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
+
+
+router = APIRouter(dependencies=[Depends(authorize)])
+
+
+@router.get(
+    "/profile",
+    description="Samples the stacks of all threads for `seconds`. Returns a "
+    "top `limit` summary, or a flamegraph compatible collapsed stack file "
+    "if `fmt` is `collapsed`.",
+    responses={406: {"model": ErrorMessage}, 409: {"model": ErrorMessage}},
+    status_code=200,
+)
+def profile(
+    seconds: float = 10, interval_ms: float = 10, limit: int = 25, fmt: str = "json"
+):
+    try:
+        result = profiler.run(seconds=seconds, interval=interval_ms / 1000)
+    except ProfilerBusy as e:
+        return JSONResponse(status_code=409, content={"error": f"{e}"})
+    except Exception as e:  # pragma: no cover
+        err = {"error": f"{e}"}
+        logger.warning(err)
+        return JSONResponse(status_code=406, content=err)
+    stacks = result.pop("stacks")
+    collapsed = profiler.collapsed(stacks)
+    if fmt == "collapsed":
+        return PlainTextResponse(
+            collapsed,
+            headers={"Content-Disposition": 'attachment; filename="profile.folded"'},
+        )
+    return result | {
+        "threads": profiler.threads(stacks),
+        "top": profiler.top(stacks, limit),
+        "collapsed": collapsed,
+    }
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 from typing import List
 from lib.cache import Cache
 from lib.cache_calc import CacheCalc
 from lib.pair import Pair
+from lib.prerendered import prerendered
 from models.generic import ErrorMessage
 from models.stats_api import (
     StatsApiAtomicdexIo,
@@ -72,7 +73,6 @@ def atomicdex_fortnight():
         return {"error": msg}
 
 
-# TODO: Cache this
 @router.get(
     "/summary",
     description="Pair summary for last 24 hours for all pairs traded in last 7 days.",
@@ -80,10 +80,13 @@ def atomicdex_fortnight():
     response_model=List[StatsApiSummary],
     status_code=200,
 )
-def summary():
+def summary(request: Request):
     try:
+        resp = prerendered.response("stats_api_summary", request)
+        if resp is not None:
+            return resp
         data = CacheCalc().stats_api_summary()
-        return data
+        return prerendered.format("stats_api_summary", data)
     except Exception as e:  # pragma: no cover
         logger.warning(f"{type(e)} Error in [/api/v3/stats-api/summary]: {e}")
         return {"error": f"{type(e)} Error in [/api/v3/stats-api/atomicdexio]: {e}"}
@@ -117,9 +120,7 @@ def orderbook(
 ):
     try:
         gecko_source = memcache.get_gecko_source()
-        is_reversed = pair_str != sortdata.pair_by_market_cap(
-            pair_str, gecko_source=gecko_source
-        )
+        is_reversed = sortdata.is_reversed(pair_str, gecko_source=gecko_source)
         if is_reversed:
             pair = Pair(pair_str=invert.pair(pair_str), gecko_source=gecko_source)
             data = pair.orderbook(pair_str=invert.pair(pair_str), depth=depth)
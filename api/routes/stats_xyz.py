@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-from datetime import datetime, timedelta
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from typing import Dict, List
@@ -84,9 +83,7 @@ def fiat_rates():
 def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     try:
         gecko_source = memcache.get_gecko_source()
-        is_reversed = pair_str != sortdata.pair_by_market_cap(
-            pair_str, gecko_source=gecko_source
-        )
+        is_reversed = sortdata.is_reversed(pair_str, gecko_source=gecko_source)
         if is_reversed:
             pair = Pair(pair_str=invert.pair(pair_str))
             data = pair.orderbook(
@@ -308,20 +305,5 @@ def usd_volume_24h():
     status_code=200,
 )
 def volumes_ticker(coin="KMD", days_in_past=1, trade_type: TradeType = TradeType.ALL):
-    # TODO: Use new DB
-    volumes_dict = {}
     query = db.SqlQuery()
-    # Individual tickers only, no merge except segwit
-    decoin = deplatform.coin(coin)
-    for i in range(0, int(days_in_past)):
-        d = datetime.today() - timedelta(days=i)
-        d_str = d.strftime("%Y-%m-%d")
-        day_ts = int(int(d.strftime("%s")) / 86400) * 86400
-        start_time = int(day_ts)
-        end_time = int(day_ts) + 86400
-        volumes = query.coin_trade_volumes(start_time=start_time, end_time=end_time)
-        data = query.coin_trade_volumes_usd(volumes)
-        volumes_dict[d_str] = 0
-        if decoin in data["volumes"]:
-            volumes_dict[d_str] = data["volumes"][decoin]["ALL"]["total_volume"]
-    return volumes_dict
+    return query.daily_coin_volumes(coin=coin, days=int(days_in_past))
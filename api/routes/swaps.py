@@ -3,7 +3,14 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from util.cron import cron
 from models.generic import ErrorMessage
-from util.exceptions import UuidNotFoundException, BadPairFormatError
+from const import DB_AGGREGATE_TIMEOUT
+from db.async_sqldb import AsyncSqlQuery
+from util.exceptions import (
+    UuidNotFoundException,
+    BadPairFormatError,
+    QueryLimitError,
+    QueryTimeoutError,
+)
 from util.logger import logger
 import db.sqldb as db
 router = APIRouter()
@@ -16,13 +23,17 @@ router = APIRouter()
     response_model=db.DefiSwap,
     status_code=200,
 )
-def get_swap(uuid: str):
+async def get_swap(uuid: str):
     try:
-        query = db.SqlQuery()
-        resp = query.get_swap(uuid=uuid)
+        query = AsyncSqlQuery()
+        resp = await query.get_swap(uuid=uuid)
         if "error" in resp:
             raise UuidNotFoundException(resp["error"])
         return resp
+    except (QueryLimitError, QueryTimeoutError) as e:
+        err = {"error": e.name, "message": e.msg}
+        logger.warning(err)
+        return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
         err = {"error": f"{e}"}
         logger.warning(err)
@@ -35,7 +46,7 @@ def get_swap(uuid: str):
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
-def swap_uuids(
+async def swap_uuids(
     start_time: int = 0,
     end_time: int = 0,
     coin: str | None = None,
@@ -46,8 +57,8 @@ def swap_uuids(
             start_time = int(cron.now_utc()) - 86400
         if end_time == 0:
             end_time = int(cron.now_utc())
-        query = db.SqlQuery()
-        uuids = query.swap_uuids(
+        query = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+        uuids = await query.swap_uuids(
             start_time=start_time, end_time=end_time, coin=coin, pair=pair
         )
         if coin is not None:
@@ -74,7 +85,7 @@ def swap_uuids(
             "swap_count": len(uuids),
             "swap_uuids": uuids,
         }
-    except BadPairFormatError as e:
+    except (BadPairFormatError, QueryLimitError, QueryTimeoutError) as e:
         err = {"error": e.name, "message": e.msg}
         return JSONResponse(status_code=e.status_code, content=err)
     except Exception as e:
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+from util.serde import CacheSerde, available_formats, available_compressions
+
+FIXTURES_PATH = f"{API_ROOT_PATH}/tests/fixtures"
+
+
+def load_fixtures(min_size):
+    fixtures = {}
+    for root, dirs, files in os.walk(FIXTURES_PATH):
+        for fn in sorted(files):
+            path = f"{root}/{fn}"
+            if not fn.endswith(".json") or os.path.getsize(path) < min_size:
+                continue
+            with open(path, "r") as f:
+                fixtures.update({path.replace(f"{FIXTURES_PATH}/", ""): json.load(f)})
+    return fixtures
+
+
+def timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def main():
+    desc = "Compare memcache serde formats on the cache fixtures in tests/fixtures."
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per fixture")
+    parser.add_argument(
+        "--min-size", type=int, default=10000, help="Minimum fixture size in bytes"
+    )
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.min_size)
+    print(f"{len(fixtures)} fixtures, {args.rounds} rounds each")
+    print(f"{'fixture':<36} {'serde':<16} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}")
+    for name, value in fixtures.items():
+        for fmt in available_formats():
+            for compression in available_compressions():
+                serde = CacheSerde(fmt=fmt, compression=compression, compress_min=0)
+                encode_ms, (data, flags) = timeit(
+                    lambda: serde.serialize(name, value), args.rounds
+                )
+                decode_ms, decoded = timeit(
+                    lambda: serde.deserialize(name, data, flags), args.rounds
+                )
+                assert decoded == value
+                label = f"{fmt}+{compression}" if compression else fmt
+                print(
+                    f"{name[-36:]:<36} {label:<16} {len(data):>10} "
+                    f"{encode_ms:>10.2f} {decode_ms:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
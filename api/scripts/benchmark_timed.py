@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import functools
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+from util.logger import timed, set_sample_rate
+import util.defaults as default
+
+
+def helper(days):
+    return f"{days}d"
+
+
+def result(days):
+    return default.result(data=f"{days}d", msg="done", loglevel="calc", ignore_until=3)
+
+
+def passthrough(func):
+    # The cheapest possible decorator, for comparison
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def timeit(func, rounds, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(rounds):
+            func(i)
+        ns = (time.perf_counter() - start) / rounds * 1e9
+        best = ns if best is None else min(best, ns)
+    return best
+
+
+def main():
+    desc = "Measure the per call overhead of the @timed decorator."
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument("--rounds", type=int, default=200000, help="Calls per case")
+    args = parser.parse_args()
+
+    print(f"{'case':<40} {'ns/call':>10} {'overhead ns':>12}")
+    for label, func in [("helper", helper), ("default.result", result)]:
+        baseline = timeit(func, args.rounds)
+        cases = [("undecorated", func), ("passthrough", passthrough(func))]
+        cases += [(f"sample_rate={i}", i) for i in [1, 0.01, 0]]
+        for case, wrapped in cases:
+            if not callable(wrapped):
+                set_sample_rate(wrapped)
+                wrapped = timed(func)
+            ns = timeit(wrapped, args.rounds)
+            print(f"{f'{label}, {case}':<40} {ns:>10.0f} {ns - baseline:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
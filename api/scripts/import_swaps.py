@@ -7,13 +7,11 @@ from datetime import datetime
 API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(API_ROOT_PATH)
 import db.sqldb as db
+from db.backfill import backfill
 from util.logger import logger
 
 from lib.cache import reset_cache_files
 
-os.environ["IS_TESTING"] = "False"
-reset_cache_files()
-
 def parse_date(date_str):
     try:
         return datetime.strptime(date_str, "%Y-%m-%d").date()
@@ -21,6 +19,10 @@ def parse_date(date_str):
         raise argparse.ArgumentTypeError("Invalid date format. Please use YYYY-M-D format.")
 
 def main():
+    # Set here rather than on import, as backfill workers import this
+    # module again when they are spawned.
+    os.environ["IS_TESTING"] = "False"
+    reset_cache_files()
     today = datetime.now().date().strftime("%Y-%m-%d")
 
     desc = 'Import swaps between two dates in the format YYYY-M-D.'
@@ -28,14 +30,19 @@ def main():
     parser.add_argument('--start', type=parse_date, help='Start date in YYYY-M-D format', default="2019-9-1")
     parser.add_argument('--end', type=parse_date, help='End date in YYYY-M-D format', default=today)
     parser.add_argument('--reset_table', action='store_true', help='Warning: This will dump the table, then recreate it empty.')
+    parser.add_argument('--chunk_days', type=int, help='Days of swaps imported per chunk', default=7)
+    parser.add_argument('--workers', type=int, help='Import processes, each using one Postgres connection', default=4)
 
     args = parser.parse_args()
     logger.info(f"Importing swaps between {args.start} and {args.end}...")
         
-    DB = db.SqlSource()
     if args.reset_table:
-        DB.reset_defi_stats_table()
-    DB.import_swaps(start_dt=args.start, end_dt=args.end)
+        db.SqlSource().reset_defi_stats_table()
+        # Otherwise chunks imported before the reset would be skipped
+        pgdb = db.SqlUpdate("pgsql")
+        pgdb.drop(pgdb.backfill)
+    # Completed chunks are skipped, so interrupted imports can resume
+    backfill(args.start, args.end, chunk_days=args.chunk_days, workers=args.workers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDERBOOK_FIXTURES = f"{API_ROOT_PATH}/tests/fixtures/orderbook"
+
+# Pairs the fake mm2 server is slow to respond for, to test timeouts.
+SLOW_PAIRS = ["DOC_MARTY"]
+
+
+def fake_mm2_response(request):
+    """Returns an mm2 style response for a single RPC request."""
+    params = request.get("params", {})
+    pair_str = f"{params.get('base')}_{params.get('rel')}"
+    if pair_str in SLOW_PAIRS:
+        time.sleep(1)
+    fn = f"{ORDERBOOK_FIXTURES}/{pair_str}.json"
+    if request.get("method") != "orderbook" or not os.path.exists(fn):
+        return {
+            "mmrpc": "2.0",
+            "error": f"No such coin: {pair_str}",
+            "id": request.get("id"),
+        }
+    with open(fn, "r") as f:
+        return {"mmrpc": "2.0", "result": json.load(f), "id": request.get("id")}
+
+
+class FakeMm2Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        request = json.loads(self.rfile.read(length))
+        self.server.requests_count += 1
+        if isinstance(request, list):
+            resp = [fake_mm2_response(i) for i in request]
+        else:
+            resp = fake_mm2_response(request)
+        body = json.dumps(resp).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client timed out before the response was sent
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_fake_mm2():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMm2Handler)
+    server.requests_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+from decimal import Decimal
+
+NOW = 1700000000
+
+
+def swap(uuid, finished_at, price=1, maker_amount=2, **kwargs):
+    """A KMD_LTC swap row, as the in memory swap stores ingest them"""
+    maker_amount = Decimal(maker_amount)
+    data = {
+        "uuid": uuid,
+        "pair": "KMD_LTC",
+        "trade_type": "buy",
+        "is_success": 1,
+        "maker_coin": "KMD",
+        "maker_coin_ticker": "KMD",
+        "maker_amount": maker_amount,
+        "taker_coin": "LTC",
+        "taker_coin_ticker": "LTC",
+        "taker_amount": maker_amount * Decimal(price),
+        "price": Decimal(price),
+        "reverse_price": 1 / Decimal(price),
+        "finished_at": finished_at,
+        "last_updated": finished_at,
+    }
+    data.update(kwargs)
+    return data
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+from const import DB_AGGREGATE_TIMEOUT
+from db.async_sqldb import AsyncSqlQuery
+from db.sqldb import SqlQuery
+from tests.fixtures_db import setup_swaps_db_data
+from util.exceptions import QueryLimitError, QueryTimeoutError
+from util.logger import timed
+import db.async_sqldb as async_sqldb
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_async_read_methods(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    query = AsyncSqlQuery()
+
+    async def reads():
+        return await asyncio.gather(
+            query.get_swap(uuid="00000000-FAIL-FAIL-FAIL-00000000"),
+            query.get_swaps(start_time=1),
+            query.swap_uuids(start_time=1, pair="KMD_LTC"),
+            query.get_count(start_time=1, coin="KMD"),
+        )
+
+    swap, swaps, uuids, count = run(reads())
+    expected = DB.get_swap(uuid="00000000-FAIL-FAIL-FAIL-00000000")
+    assert swap.keys() == expected.keys()
+    assert swap["finished_at"] == expected["finished_at"]
+    assert [i["uuid"] for i in swaps] == [
+        i["uuid"] for i in DB.get_swaps(start_time=1)
+    ]
+    assert uuids == DB.swap_uuids(start_time=1, pair="KMD_LTC")
+    assert count == DB.get_count(start_time=1, coin="KMD")
+
+    with pytest.raises(AttributeError):
+        query.upsert_swaps
+
+
+def test_async_timeout(monkeypatch):
+    @timed
+    def get_count(self, **kwargs):
+        with Session(self.engine) as session:
+            return session.exec(text("SELECT pg_sleep(1)")).first()
+
+    monkeypatch.setattr(SqlQuery, "get_count", get_count)
+    with pytest.raises(QueryTimeoutError) as e:
+        run(AsyncSqlQuery(timeout=0.05).get_count())
+    assert e.value.status_code == 504
+    # The timeout only applies to the query's own transaction
+    assert run(AsyncSqlQuery(timeout=2).get_count()) is not None
+
+
+def test_async_limiter(monkeypatch):
+    monkeypatch.setattr(async_sqldb, "DB_QUERY_QUEUE_TIMEOUT", 0.01)
+    query = AsyncSqlQuery()
+    aggregate = AsyncSqlQuery(timeout=DB_AGGREGATE_TIMEOUT)
+    assert query.limiter == "lookup"
+    assert aggregate.limiter == "aggregate"
+
+    async def limited():
+        limiters = {"lookup": asyncio.Semaphore(1), "aggregate": asyncio.Semaphore(1)}
+        monkeypatch.setattr(async_sqldb, "limiters", limiters)
+        async with limiters["lookup"]:
+            with pytest.raises(QueryLimitError) as e:
+                await query.get_count(start_time=1)
+            assert e.value.status_code == 503
+        # Freed slots are available again
+        return await query.get_count(start_time=1)
+
+    assert isinstance(run(limited()), int)
+
+    async def aggregates_full():
+        limiters = {"lookup": asyncio.Semaphore(1), "aggregate": asyncio.Semaphore(1)}
+        monkeypatch.setattr(async_sqldb, "limiters", limiters)
+        async with limiters["aggregate"]:
+            with pytest.raises(QueryLimitError):
+                await aggregate.get_count(start_time=1)
+            # Lookups do not wait for aggregates
+            return await query.get_count(start_time=1)
+
+    assert isinstance(run(aggregates_full()), int)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+from datetime import date
+from sqlalchemy import delete
+from db.backfill import Progress, chunks
+from db.sqldb import SqlUpdate
+
+
+def test_chunks():
+    r = chunks(date(2024, 1, 1), date(2024, 1, 10), days=4)
+    assert r == [
+        (1704067200, 1704412800),
+        (1704412800, 1704758400),
+        # The last chunk ends after the end date
+        (1704758400, 1704931200),
+    ]
+    assert chunks(date(2024, 1, 1), date(2024, 1, 1)) == [(1704067200, 1704153600)]
+
+
+def test_progress():
+    progress = Progress(total=4, now=100)
+    assert progress.eta(now=110) == 0
+    progress.update(swaps=500)
+    assert progress.rate(now=110) == 50
+    assert progress.eta(now=110) == 30
+    progress.update(swaps=0)
+    assert progress.summary(now=120) == (
+        "2/4 chunks, 500 swaps | 25.0 swaps/sec | ETA 0:00:20"
+    )
+
+
+def test_backfill_checkpoints():
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.init_backfill()
+    with pgdb.engine.begin() as conn:
+        conn.execute(delete(pgdb.backfill))
+    pgdb.complete_backfill_chunk(100, 200, swaps=5)
+    pgdb.complete_backfill_chunk(200, 300, swaps=0)
+    # Completing a chunk again only updates it
+    pgdb.complete_backfill_chunk(100, 200, swaps=6)
+    assert sorted(pgdb.backfilled_chunks()) == [(100, 200), (200, 300)]
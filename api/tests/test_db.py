@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
+from sqlalchemy import delete, inspect, text, update
+from sqlmodel import Session, SQLModel
 from util.cron import cron
 from decimal import Decimal
-from db.sqldb import SqlSource, SqlQuery
+from db.schema import StatsSwap
+from db.sqldb import SqlSource, SqlQuery, SqlUpdate
 from db.sqlitedb import get_sqlite_db, get_sqlite_db_paths
 from db.sqlitedb_merge import (
     list_sqlite_dbs,
@@ -204,6 +207,209 @@ def test_coin_trade_volumes_usd(setup_swaps_db_data):
     assert vols["ALL"]["trade_volume_usd"] == Decimal(str(1000402.9))
 
 
+def test_rollups(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    SqlUpdate(db_type="pgsql").refresh_rollups()
+    end_time = now - now % 86400 + 86400
+    start_time = end_time - 86400 * 14
+
+    r = DB.coin_stats(start_time=start_time, end_time=end_time, coin="KMD")
+    volumes = DB.coin_trade_volumes(start_time=start_time - 1, end_time=end_time)
+    vols = volumes["volumes"]["KMD"]["ALL"]
+    assert sum([i["maker_volume"] for i in r]) == vols["maker_volume"]
+    assert sum([i["taker_volume"] for i in r]) == vols["taker_volume"]
+    assert sum([i["maker_swaps"] for i in r]) == vols["maker_swaps"]
+
+    r = DB.pair_stats(start_time=start_time, end_time=end_time, period="hourly")
+    volumes = DB.pair_trade_volumes(start_time=start_time - 1, end_time=end_time)
+    assert sum([i["num_swaps"] for i in r]) == volumes["total_swaps"]
+    for i in r:
+        assert i["price_min"] <= i["price_first"] <= i["price_max"]
+        assert i["price_min"] <= i["price_last"] <= i["price_max"]
+
+    r = DB.daily_coin_volumes(coin="KMD", days=14)
+    assert len(r) == 14
+    assert sum(r.values()) == vols["total_volume"]
+
+
+def test_rollups_live(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.refresh_rollups()
+    start_time = now - 86400 * 14
+    expected = {
+        "pair": DB.pair_stats(start_time=start_time, end_time=now, period="hourly"),
+        "coin": DB.coin_stats(start_time=start_time, end_time=now, coin="KMD"),
+        "daily": DB.daily_coin_volumes(coin="KMD", days=14),
+    }
+    assert len(expected["pair"]) > 0
+    assert len(expected["coin"]) > 0
+
+    with pgdb.engine.begin() as conn:
+        for rollup in pgdb.rollups.values():
+            conn.execute(delete(rollup["pair"]))
+            conn.execute(delete(rollup["coin"]))
+    assert not DB.rollups_populated()
+    # Until populated, stats are aggregated from the swaps table
+    r = DB.pair_stats(start_time=start_time, end_time=now, period="hourly")
+    assert r == expected["pair"]
+    assert DB.coin_stats(start_time=start_time, end_time=now, coin="KMD") == (
+        expected["coin"]
+    )
+    assert DB.daily_coin_volumes(coin="KMD", days=14) == expected["daily"]
+
+    pgdb.populate_rollups()
+    assert DB.rollups_populated()
+    assert DB.pair_stats(start_time=start_time, end_time=now, period="hourly") == (
+        expected["pair"]
+    )
+
+
+def test_first_last_traded(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.init_first_last()
+    pgdb.refresh_first_last()
+    r = DB.first_last_traded("pair")
+    # `since` skips the summary table, and scans all swaps
+    expected = DB.last_trade([DB.table.pair], since=1)
+    assert r == expected
+    for i in r.values():
+        assert i["first_swap_time"] <= i["last_swap_time"]
+    assert DB.pair_last_trade() == expected
+
+    # Refreshing a timespan keeps earlier first swaps
+    pgdb.refresh_first_last(start_time=now - 3600, end_time=now)
+    assert DB.first_last_traded("pair") == expected
+
+    # While empty, last_trade scans the swaps table
+    with pgdb.engine.begin() as conn:
+        conn.execute(delete(pgdb.first_last))
+    assert not pgdb.first_last_populated()
+    assert DB.pair_last_trade() == expected
+    pgdb.populate_first_last()
+    assert pgdb.first_last_populated()
+    assert DB.first_last_traded("pair") == expected
+
+
+def test_init_indexes(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    name = f"ix_{DB.table.__tablename__}_maker_gui_finished_at"
+    with pgdb.engine.connect() as conn:
+        conn.execute(text(f"DROP INDEX {name}"))
+    pgdb.init_indexes()
+    with pgdb.engine.connect() as conn:
+        indexes = [i["name"] for i in inspect(conn).get_indexes(DB.table.__tablename__)]
+    assert name in indexes
+    assert {i.name for i in DB.table.__table__.indexes}.issubset(indexes)
+
+
+def test_upsert_swaps(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    uuid = "00000000-FAIL-FAIL-FAIL-00000000"
+    existing = DB.get_swap(uuid)
+    existing.pop("id")
+    updated = existing | {
+        "is_success": 1,
+        "maker_amount": existing["maker_amount"] + 1,
+        "taker_amount": existing["taker_amount"] - 1,
+        "maker_gui": "",
+        "taker_gui": "Komodo Wallet",
+        "pair": "LTC_KMD",
+        "finished_at": existing["finished_at"] + 3600,
+        "last_updated": now,
+    }
+    added = existing | {"uuid": "99999999-new", "last_updated": now}
+    r = pgdb.upsert_swaps([updated, added, added])
+    # The updated swap moved from the rollup bucket it finished in before
+    assert r == {
+        "inserted": 1,
+        "updated": 1,
+        "previous_finished_at": existing["finished_at"],
+    }
+    assert DB.get_swap(uuid)["finished_at"] == existing["finished_at"] + 3600
+    r = pgdb.upsert_swaps([added])
+    assert r["previous_finished_at"] == existing["finished_at"]
+    assert pgdb.upsert_swaps([])["previous_finished_at"] is None
+
+    swap = DB.get_swap(uuid)
+    # Higher values are kept
+    assert swap["is_success"] == 1
+    assert swap["maker_amount"] == existing["maker_amount"] + 1
+    assert swap["taker_amount"] == existing["taker_amount"]
+    # Blank text is ignored, and the pair is never changed
+    assert swap["maker_gui"] == existing["maker_gui"]
+    assert swap["taker_gui"] == "Komodo Wallet"
+    assert swap["pair"] == existing["pair"]
+    assert swap["trade_type"] == existing["trade_type"]
+    assert swap["last_updated"] == now
+    assert DB.get_swap("99999999-new")["maker_coin"] == existing["maker_coin"]
+
+
+def test_sync_source(setup_swaps_db_data, tmp_path):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.init_sync_state()
+    with pgdb.engine.begin() as conn:
+        conn.execute(delete(pgdb.sync_state).where(pgdb.sync_state.source == "mm2"))
+    mm2 = SqlQuery(db_type="sqlite", db_path=f"{tmp_path}/MM2.db")
+    SQLModel.metadata.create_all(mm2.engine, tables=[StatsSwap.__table__])
+
+    def add_swaps(*uuids, finished_at=hour_ago, is_success=1):
+        with Session(mm2.engine) as session:
+            for uuid in uuids:
+                swap = StatsSwap(
+                    uuid=uuid,
+                    maker_coin="KMD",
+                    taker_coin="LTC",
+                    maker_amount=100,
+                    taker_amount=1,
+                    started_at=finished_at - 60,
+                    finished_at=finished_at,
+                    is_success=is_success,
+                    maker_pubkey="",
+                    taker_pubkey="",
+                )
+                session.add(swap)
+            session.commit()
+
+    # Older than the first sync's window, so left for backfills
+    add_swaps("sync-old", finished_at=day_ago - 3600)
+    add_swaps("sync-a", "sync-b")
+    add_swaps("sync-failed", is_success=0)
+    source = SqlSource()
+    r = source.sync_source(pgdb, "mm2", mm2)
+    assert r == {"swaps": 2, "start_time": hour_ago}
+    state = pgdb.get_sync_state("mm2")
+    assert state["last_id"] == 3
+    assert state["finished_at"] == hour_ago
+    assert "error" in DB.get_swap("sync-old")
+    assert DB.get_swap("sync-a")["maker_amount"] == 100
+
+    # Only rows added since are imported
+    assert source.sync_source(pgdb, "mm2", mm2)["swaps"] == 0
+    add_swaps("sync-c", finished_at=now - 60)
+    assert source.sync_source(pgdb, "mm2", mm2)["start_time"] == now - 60
+    assert pgdb.get_sync_state("mm2")["last_id"] == 5
+    assert "error" not in DB.get_swap("sync-c")
+
+    # Repairs in place are picked up by the reconcile pass
+    with mm2.engine.begin() as conn:
+        conn.execute(
+            update(StatsSwap).where(StatsSwap.uuid == "sync-a").values(maker_amount=101)
+        )
+    assert source.sync_source(pgdb, "mm2", mm2)["swaps"] == 0
+    assert DB.get_swap("sync-a")["maker_amount"] == 100
+    source.sync_source(pgdb, "mm2", mm2, reconcile_every=0)
+    assert DB.get_swap("sync-a")["maker_amount"] == 101
+
+    # Later tests expect only the fixture swaps
+    with pgdb.engine.begin() as conn:
+        conn.execute(delete(DB.table).where(DB.table.uuid.like("sync-%")))
+
+
 def test_get_uuids(setup_swaps_db_data):
     DB = setup_swaps_db_data
     r = DB.swap_uuids(start_time=1, success_only=True)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import time
+import pytest
 import lib.dex_api as dex
 import util.memcache as memcache
 from util.logger import logger
+from tests.fixtures_mm2 import setup_fake_mm2  # noqa: F401
 
 coins_config = memcache.get_coins_config()
 gecko_source = memcache.get_gecko_source()
@@ -76,3 +78,84 @@ def test_get_orderbook():
     assert isinstance(r["bids"][0], dict)
     assert "volume" in r["asks"][0]
     assert "price" in r["bids"][0]
+
+
+def test_orderbook_fetcher(setup_fake_mm2):
+    server = setup_fake_mm2
+    host, port = server.server_address
+    fetcher = dex.OrderbookFetcher(
+        workers=2,
+        timeout=0.3,
+        batch_size=2,
+        mm2_rpc=f"http://{host}:{port}",
+        batch_timeout=0.5,
+    )
+    r = fetcher.fetch_batch(["KMD_LTC"])
+    assert r["KMD_LTC"][0] == "succeeded"
+    assert len(r["KMD_LTC"][1]["asks"]) == 3
+
+    r = fetcher.fetch_batch(["XXX_YYY", "KMD_LTC"])
+    assert r["XXX_YYY"][0] == "failed"
+    assert len(r["XXX_YYY"][1]["asks"]) == 0
+    assert r["KMD_LTC"][0] == "succeeded"
+    assert r["KMD_LTC"][1]["base"] == "KMD"
+
+    # The slow pair times out the batch, so each pair is retried alone
+    server.requests_count = 0
+    r = fetcher.fetch_batch(["DOC_MARTY", "KMD_LTC"])
+    assert r["DOC_MARTY"][0] == "timed_out"
+    assert r["KMD_LTC"][0] == "succeeded"
+    assert len(r["DOC_MARTY"][1]["bids"]) == 0
+    assert server.requests_count == 3
+
+    # Failed variants keep their cached orderbook
+    memcache.update("orderbook_XXX_YYY", {"pair": "XXX_YYY", "asks": [1]}, 60)
+    server.requests_count = 0
+    r = fetcher.refresh(
+        ["KMD_LTC", "KMD_LTC-segwit", "XXX_YYY", "KMD_LTC"],
+        gecko_source=gecko_source,
+        pair_prices_24hr_cache=memcache.get_pair_prices_24hr(),
+    )
+    assert server.requests_count == 2
+    assert r["variants"] == 3
+    assert r["batches"] == 2
+    assert r["succeeded"] == 2
+    assert r["failed"] == 1
+    assert r["timed_out"] == 0
+    assert fetcher.last_refresh == {k: v for k, v in r.items() if k != "orderbooks"}
+    # Only orderbooks which were cached have a digest
+    assert list(r["orderbooks"]) == ["KMD_LTC", "KMD_LTC-segwit"]
+    book = memcache.get("orderbook_KMD_LTC")
+    assert r["orderbooks"]["KMD_LTC"] == dex.orderbook_digest(book)
+    # Refetched at a later time, but with the same content
+    assert dex.orderbook_digest(dict(book, timestamp=0)) == r["orderbooks"]["KMD_LTC"]
+    cached = memcache.get("orderbook_KMD_LTC")
+    assert cached["pair"] == "KMD_LTC"
+    assert len(cached["asks"]) == 3
+    assert memcache.get("orderbook_XXX_YYY")["asks"] == [1]
+
+
+def test_demux_batch_response():
+    params = [{"method": "orderbook", "id": i} for i in range(3)]
+    resp = [{"result": 2, "id": 2}, {"result": 0, "id": 0}]
+    r = dex.demux_batch_response(params, resp)
+    assert r[0]["result"] == 0
+    assert "error" in r[1]
+    assert r[2]["result"] == 2
+
+    # No ids in response, so matched by order
+    r = dex.demux_batch_response(params, [{"result": 0}, {"result": 1}])
+    assert r[1]["result"] == 1
+
+    with pytest.raises(ValueError):
+        dex.demux_batch_response(params, {"error": "not a batch"})
+
+
+def test_orderbook_prices():
+    prices = memcache.get_pair_prices_24hr()
+    book = dex.orderbook_prices("KMD_LTC", {"asks": []}, gecko_source, prices)
+    assert book["trades_24hr"] > 0
+    # Cached orderbooks are given the prices current when they are read
+    book = dex.orderbook_prices("KMD_LTC", book, gecko_source, {})
+    assert book["trades_24hr"] == 0
+    assert book["asks"] == []
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import pytest
 from util.files import Files
 from util.urls import Urls
@@ -15,8 +16,8 @@ files = Files()
 urls = Urls()
 
 
-def test_save_json():
-    fn = files.get_cache_fn("foo")
+def test_save_json(tmp_path):
+    fn = f"{tmp_path}/foo.json"
 
     data = []
     resp = files.save_json(fn, data)
@@ -39,6 +40,49 @@ def test_save_json():
     assert resp["loglevel"] == "saved"
 
 
+def test_save_json_snapshot(tmp_path):
+    fn = f"{tmp_path}/foo.json"
+    data = {"last_updated": 1700000000, "data": [{"hello": "world"}]}
+    resp = files.save_json(fn, data)
+    assert resp["result"] == "success"
+    with open(fn, "rb") as f:
+        body = f.read()
+    # Compact json
+    assert body == b'{"last_updated":1700000000,"data":[{"hello":"world"}]}'
+    meta = files.load_meta(fn)
+    assert meta["last_updated"] == 1700000000
+    assert meta["size"] == len(body)
+    assert meta["checksum"] == hashlib.sha256(body).hexdigest()
+    assert meta["encoding"] == "json"
+    # No temp files left behind
+    folder, name = os.path.split(fn)
+    assert [i for i in os.listdir(folder) if i.startswith(f".{name}.")] == []
+
+    resp = files.save_json(fn, data, compress=True)
+    assert resp["result"] == "success"
+    assert files.load_meta(fn)["encoding"] == "json+gzip"
+    assert files.load_jsonfile(fn) == data
+
+    data = [{"hello": "world"}]
+    resp = files.save_json(fn, data)
+    assert files.load_meta(fn)["last_updated"] is None
+    assert files.load_meta("nofile") is None
+
+
+def test_load_jsonfile_checksum(tmp_path):
+    fn = f"{tmp_path}/foo.json"
+    data = {"last_updated": 1700000000, "data": [{"hello": "world"}]}
+    files.save_json(fn, data)
+    assert files.load_jsonfile(fn) == data
+    # A file not matching its manifest is treated as missing
+    with open(fn, "wb") as f:
+        f.write(b'{"last_updated":1700000000,"data":[]}')
+    assert files.load_jsonfile(fn) is None
+    # Files without a manifest are loaded as they are
+    os.remove(files.meta_fn(fn))
+    assert files.load_jsonfile(fn)["data"] == []
+
+
 def test_load_jsonfile():
     fn = files.get_cache_fn("foo")
     data = files.load_jsonfile(fn)
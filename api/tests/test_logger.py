@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import time
+import util.defaults as default
+import util.logger as logger
+from util.logger import timed
+
+
+@timed
+def slow(ignore_until):
+    time.sleep(0.01)
+    msg = f"slow {ignore_until}"
+    return default.result(data=1, msg=msg, loglevel="warning", ignore_until=ignore_until)
+
+
+@timed(sample_rate=0)
+def helper(days):
+    return f"{days}d"
+
+
+@timed
+def fails():
+    raise ValueError("failed")
+
+
+def test_timed(caplog):
+    logger.set_sample_rate(1)
+    assert helper(1) == "1d"
+    assert fails() is None
+    assert "failed" in caplog.text
+
+    # Results are logged if the call took longer than `ignore_until`
+    assert slow(0) == 1
+    assert slow(0.001) == 1
+    assert slow(5) == 1
+    assert "slow 0 " in caplog.text
+    assert "slow 0.001" in caplog.text
+    assert "slow 5" not in caplog.text
+
+    timings = logger.timings()
+    assert f"{__name__}.helper" not in timings
+    assert timings[f"{__name__}.slow"]["calls"] == 3
+    assert timings[f"{__name__}.slow"]["total_secs"] >= 0.03
+    max_secs = timings[f"{__name__}.slow"]["max_secs"]
+    assert 0.01 <= max_secs <= timings[f"{__name__}.slow"]["total_secs"]
+
+
+def test_timed_sample_rate(caplog):
+    rate = logger.TIMED_SAMPLE_RATE
+    logger.set_sample_rate(0)
+    try:
+        calls = logger.timings()[f"{__name__}.slow"]["calls"]
+        assert slow(0) == 1
+        assert slow(0.001) == 1
+        # Unsampled calls only log results which are always logged
+        assert "slow 0 " in caplog.text
+        assert "slow 0.001" not in caplog.text
+        assert logger.timings()[f"{__name__}.slow"]["calls"] == calls
+    finally:
+        logger.set_sample_rate(rate)
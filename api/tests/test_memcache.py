@@ -1 +1,92 @@
+import json
+import pytest
 import util.memcache as memcache
+from util.serde import (
+    CacheSerde,
+    JsonSerde,
+    available_formats,
+    available_compressions,
+    STR,
+    JSON,
+    BYTES,
+    ZLIB,
+    FORMAT_MASK,
+    COMPRESSION_MASK,
+)
+
+VALUE = {"KMD_LTC": {"price": 0.1, "volume": [1, 2, 3]}, "ok": True, "none": None}
+
+
+def test_serde_roundtrip():
+    for fmt in available_formats():
+        for compression in available_compressions():
+            serde = CacheSerde(fmt=fmt, compression=compression, compress_min=0)
+            data, flags = serde.serialize("foo", VALUE)
+            assert serde.deserialize("foo", data, flags) == VALUE
+            # Readable no matter how the reading serde is configured
+            assert JsonSerde().deserialize("foo", data, flags) == VALUE
+
+
+def test_serde_compress_min():
+    serde = CacheSerde(fmt="json", compression="zlib", compress_min=1000)
+    data, flags = serde.serialize("foo", VALUE)
+    assert flags == JSON
+    big = {"data": ["x" * 100] * 100}
+    data, flags = serde.serialize("foo", big)
+    assert flags == JSON | ZLIB
+    assert len(data) < len(json.dumps(big))
+    assert serde.deserialize("foo", data, flags) == big
+
+
+def test_serde_legacy_flags():
+    serde = CacheSerde()
+    # Flags used by the original JsonSerde
+    assert serde.deserialize("foo", b"bar", 1) == "bar"
+    assert serde.deserialize("foo", json.dumps(VALUE).encode(), 2) == VALUE
+    assert serde.serialize("foo", "bar") == (b"bar", STR)
+    assert serde.serialize("foo", b"bar") == (b"bar", BYTES)
+    with pytest.raises(Exception):
+        serde.deserialize("foo", b"bar", 0x0F)
+
+
+def test_serde_fallback():
+    serde = CacheSerde(fmt="not_a_format", compression="not_a_compression")
+    data, flags = serde.serialize("foo", {"big": 2**70})
+    assert flags & FORMAT_MASK == JSON
+    assert flags & COMPRESSION_MASK == 0
+    assert serde.deserialize("foo", data, flags) == {"big": 2**70}
+
+
+def test_memcache_roundtrip():
+    memcache.update("serde_test", VALUE, 60)
+    assert memcache.get("serde_test") == VALUE
+
+
+def test_l1_cache():
+    l1 = memcache.L1Cache(max_items=2, ttl=1)
+    assert l1.lookup("foo", now=0) == (None, False)
+    l1.set("foo", "v1", {"a": 1}, now=0)
+    assert l1.lookup("foo", now=0.5) == (["v1", 0, {"a": 1}], True)
+    assert l1.lookup("foo", now=1.5) == (["v1", 0, {"a": 1}], False)
+
+    # Least recently used item is evicted
+    l1.set("bar", "v1", 2, now=0)
+    l1.lookup("foo", now=0)
+    l1.set("baz", "v1", 3, now=0)
+    assert list(l1.items.keys()) == ["foo", "baz"]
+    assert l1.stats()["evictions"] == 1
+
+
+def test_l1_get():
+    memcache.L1.clear()
+    memcache.update("tickers", {"version": 1}, 60)
+    assert memcache.get("tickers") == {"version": 1}
+    assert memcache.get("tickers") == {"version": 1}
+    stats = memcache.l1_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+    # Writers bump the version, so the new value is read
+    memcache.update("tickers", {"version": 2}, 60)
+    assert memcache.get("tickers") == {"version": 2}
+    assert memcache.l1_stats()["misses"] == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+from util.metrics import Registry
+
+
+def test_counter_and_gauge():
+    registry = Registry(prefix="test_")
+    counter = registry.counter("errors_total", "Errors")
+    counter.inc(method="orderbook")
+    counter.inc(2, method="orderbook")
+    counter.inc(method="version")
+    gauge = registry.gauge("age_seconds", "Age")
+    gauge.set(5, item="tickers")
+    gauge.set(3.5, item="tickers")
+    lines = registry.render().splitlines()
+    assert "# TYPE test_errors_total counter" in lines
+    assert 'test_errors_total{method="orderbook"} 3' in lines
+    assert 'test_errors_total{method="version"} 1' in lines
+    assert "# TYPE test_age_seconds gauge" in lines
+    assert 'test_age_seconds{item="tickers"} 3.5' in lines
+    gauge.set_max(2, item="tickers")
+    gauge.set_max(8, item="orderbook")
+    gauge.set_max(4, item="orderbook")
+    lines = registry.render().splitlines()
+    assert 'test_age_seconds{item="tickers"} 3.5' in lines
+    assert 'test_age_seconds{item="orderbook"} 8' in lines
+    # Registering the same name twice returns the existing metric
+    assert registry.counter("errors_total", "Errors") is counter
+
+
+def test_histogram():
+    registry = Registry(prefix="test_")
+    hist = registry.histogram("seconds", "Duration", buckets=[0.1, 1])
+    for i in [0.05, 0.5, 0.5, 2]:
+        hist.observe(i, function="foo")
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{function="foo",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{function="foo",le="1"} 3' in lines
+    assert 'test_seconds_bucket{function="foo",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{function="foo"} 3.05' in lines
+    assert 'test_seconds_count{function="foo"} 4' in lines
+    totals = hist.totals()[(("function", "foo"),)]
+    assert totals["count"] == 4
+
+
+def test_collector():
+    registry = Registry(prefix="test_")
+    gauge = registry.gauge("items", "Items")
+    registry.collector(lambda: gauge.set(7, cache="l1"))
+    assert 'test_items{cache="l1"} 7' in registry.render()
+    # Label values are escaped
+    gauge.set(1, cache='a"b')
+    assert 'test_items{cache="a\\"b"} 1' in registry.render()
@@ -0,0 +1,84 @@
+import gzip
+import json
+from starlette.requests import Request
+from lib.prerendered import Prerendered, accepted_encodings, encodings, prerendered
+
+
+def make_request(headers: dict):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    return Request(scope)
+
+
+def load_fixture(name):
+    with open(f"tests/fixtures/{name}", "r") as f:
+        return json.load(f)["data"]
+
+
+def test_prerendered_markets_summary():
+    data = load_fixture("markets/summary.json")
+    assert prerendered.refresh("markets_summary", data) == ["markets_summary"]
+
+    r = prerendered.response("markets_summary", make_request({}))
+    assert r.status_code == 200
+    assert "content-encoding" not in r.headers
+    body = json.loads(r.body)
+    assert len(body) == len(data)
+    assert body[0]["trading_pair"] == data[0]["pair"]
+    # Cached item is not modified by the aliases
+    assert "trading_pair" not in data[0]
+
+    r = prerendered.response(
+        "markets_summary", make_request({"Accept-Encoding": "gzip, deflate"})
+    )
+    assert r.headers["content-encoding"] in encodings()
+    if r.headers["content-encoding"] == "gzip":
+        assert json.loads(gzip.decompress(r.body)) == body
+
+    etag = r.headers["etag"]
+    r = prerendered.response(
+        "markets_summary",
+        make_request({"Accept-Encoding": "gzip", "If-None-Match": etag}),
+    )
+    assert r.status_code == 304
+    assert r.body == b""
+
+
+def test_prerendered_missing_encoding(monkeypatch):
+    data = load_fixture("markets/summary.json")
+    prerendered.refresh("markets_summary", data)
+    get = Prerendered.get
+
+    def missing_first(self, endpoint, encoding):
+        if encoding == encodings()[0]:
+            return None
+        return get(self, endpoint, encoding)
+
+    monkeypatch.setattr(Prerendered, "get", missing_first)
+    r = prerendered.response(
+        "markets_summary", make_request({"Accept-Encoding": "br, gzip"})
+    )
+    # Falls back to the next encoding the client accepts
+    assert r.status_code == 200
+    expected = "gzip" if encodings()[0] == "br" else None
+    assert r.headers.get("content-encoding") == expected
+
+
+def test_accepted_encodings():
+    served = encodings()
+    assert accepted_encodings("") == ["identity"]
+    assert accepted_encodings("gzip;q=0, deflate") == ["identity"]
+    assert accepted_encodings("gzip;q=0.5, br;q=1") == served
+    assert accepted_encodings("gzip, identity;q=0") == ["gzip"]
+    assert accepted_encodings("GZIP;q=1, *;q=0") == ["gzip"]
+    assert accepted_encodings("*") == served
+    assert accepted_encodings("br;q=0.5, gzip")[0] == "gzip"
+
+
+def test_prerendered_unknown_source():
+    assert prerendered.refresh("coins", {}) == []
+    assert prerendered.response("not_an_endpoint", make_request({})) is None
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+from decimal import Decimal
+from lib.prices import PriceStats
+from lib.swap_store import SwapStore
+from tests.fixtures_swap import swap
+from util.cron import cron
+from util.transform import sortdata
+import util.memcache as memcache
+
+gecko_source = memcache.get_gecko_source()
+
+
+def test_pair_prices_info():
+    now = int(cron.now_utc())
+    store = SwapStore()
+    store.ingest(
+        [
+            swap("a", now - 3000, price=4),
+            swap("b", now - 2000, price=1),
+            # Finished at the same time, both are counted
+            swap("c", now - 1000, price=8),
+            swap("d", now - 1000, price="0.5"),
+            swap("e", now - 100, price=1, is_success=0),
+            swap("f", now - 90000, price=100),
+            swap("g", now - 500, price=3, maker_coin="DOGE", pair="DOGE_LTC"),
+        ],
+        now=now,
+    )
+    price_stats = PriceStats(store)
+    resp = price_stats.pair_prices_info(
+        ["KMD_LTC", "DOGE_KMD"], 1, gecko_source=gecko_source
+    )
+    # No swaps in range, so no variants
+    assert resp["DOGE_KMD"] == {}
+
+    info = resp["KMD_LTC"]["KMD_LTC"]
+    assert info == resp["KMD_LTC"]["ALL"]
+    # Not reversed, so prices are from the `price` column
+    assert not sortdata.is_reversed("KMD_LTC", gecko_source=gecko_source)
+    assert info["oldest_price_time"] == now - 3000
+    assert info["newest_price_time"] == now - 1000
+    assert info["oldest_price_24hr"] == 4
+    # The last swap added is the newest of those with the same time
+    assert info["newest_price_24hr"] == 0.5
+    assert info["highest_price_24hr"] == 8
+    assert info["lowest_price_24hr"] == 0.5
+    assert isinstance(info["price_change_pct_24hr"], float)
+
+    info = resp["KMD_LTC"]["ALL"]
+    change = Decimal(info["newest_price_24hr"]) - Decimal(info["oldest_price_24hr"])
+    assert round(info["price_change_24hr"], 8) == round(float(change), 8)
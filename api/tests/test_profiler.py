@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import time
+import threading
+import pytest
+from fastapi.security import HTTPBasicCredentials
+import routes.protected as protected
+from util.profiler import SamplingProfiler, ProfilerBusy
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler():
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        result = profiler.run(seconds=0.3, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+    stacks = result["stacks"]
+    assert result["samples"] > 0
+    assert "spinner" in profiler.threads(stacks)
+    # The calling thread is not sampled
+    assert "MainThread" not in profiler.threads(stacks)
+
+    collapsed = profiler.collapsed(stacks).splitlines()
+    spinner = [i for i in collapsed if i.startswith("spinner;")]
+    assert len(spinner) > 0
+    assert "test_profiler.py:spin" in spinner[0]
+    assert spinner[0].rsplit(" ", 1)[1].isdigit()
+
+    top = profiler.top(stacks, limit=5)
+    assert len(top["self"]) <= 5
+    totals = {i["function"]: i for i in top["total"]}
+    assert "test_profiler.py:spin" in totals
+    assert totals["test_profiler.py:spin"]["pct"] <= 100
+
+
+def test_profiler_busy():
+    profiler = SamplingProfiler()
+    worker = threading.Thread(target=profiler.run, kwargs={"seconds": 0.3})
+    worker.start()
+    time.sleep(0.05)
+    with pytest.raises(ProfilerBusy):
+        profiler.run(seconds=0.1)
+    worker.join()
+
+
+def test_is_authorized(monkeypatch):
+    creds = HTTPBasicCredentials(username="user", password="pass")
+    monkeypatch.setattr(protected, "API_USER", None)
+    monkeypatch.setattr(protected, "API_PASS", None)
+    assert not protected.is_authorized(creds)
+    monkeypatch.setattr(protected, "API_USER", "user")
+    monkeypatch.setattr(protected, "API_PASS", "pass")
+    assert protected.is_authorized(creds)
+    creds = HTTPBasicCredentials(username="user", password="wrong")
+    assert not protected.is_authorized(creds)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+from contextlib import contextmanager
+from sqlalchemy import event, select
+from tests.fixtures_db import setup_swaps_db_data
+from util.cron import cron
+
+now = int(cron.now_utc())
+day_ago = now - 86400
+week_ago = now - 604800
+
+
+@contextmanager
+def captured(engine):
+    """Collects the statements and parameters executed on `engine`"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def plan_nodes(plan):
+    yield plan
+    for i in plan.get("Plans", []):
+        yield from plan_nodes(i)
+
+
+def seq_scans(engine, statements, table):
+    """
+    Returns the statements which would sequentially scan `table`, if
+    the planner can avoid it at all.
+    """
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        # With seq scans disabled, the planner still uses one when no
+        # index can serve a query, regardless of how few rows there are.
+        cursor.execute("SET enable_seqscan = off")
+        scans = []
+        for statement, parameters in statements:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            for i in plan_nodes(plan):
+                if i["Node Type"] == "Seq Scan" and i["Relation Name"] == table:
+                    scans.append(statement)
+        return scans
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_query_plans(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    queries = {
+        "get_swaps": lambda: DB.get_swaps(start_time=week_ago),
+        "get_swaps_failed": lambda: DB.get_swaps(
+            start_time=week_ago, success_only=False
+        ),
+        "get_swaps_coin": lambda: DB.get_swaps(start_time=week_ago, coin="KMD"),
+        "get_swaps_pair": lambda: DB.get_swaps(
+            start_time=week_ago, pair_str="KMD_LTC"
+        ),
+        "get_swaps_gui": lambda: DB.get_swaps(start_time=week_ago, gui="pytomicDEX"),
+        "get_swaps_pubkey": lambda: DB.get_swaps(start_time=week_ago, pubkey="x"),
+        "get_swaps_version": lambda: DB.get_swaps(start_time=week_ago, version="1.2"),
+        "get_swaps_for_pair": lambda: DB.get_swaps_for_pair("KMD", "LTC"),
+        "get_swap": lambda: DB.get_swap("00000000-FAIL-FAIL-FAIL-00000000"),
+        "swaps_updated_since": lambda: DB.swaps_updated_since(now - 3600, day_ago),
+        "swap_uuids": lambda: DB.swap_uuids(start_time=week_ago, pair="KMD_LTC"),
+        "coin_trade_volumes": lambda: DB.coin_trade_volumes(start_time=week_ago),
+        "pair_trade_volumes": lambda: DB.pair_trade_volumes(
+            start_time=week_ago, coin="KMD"
+        ),
+        "pair_last_trade": lambda: DB.pair_last_trade(since=day_ago),
+        "get_pairs": lambda: DB.get_pairs(),
+        "get_distinct": lambda: DB.get_distinct(
+            start_time=week_ago, column="maker_gui"
+        ),
+        "get_count": lambda: DB.get_count(start_time=week_ago, coin="KMD"),
+    }
+    for name, query in queries.items():
+        with captured(DB.engine) as statements:
+            query()
+        assert len(statements) > 0, name
+        scans = seq_scans(DB.engine, statements, DB.table.__tablename__)
+        assert scans == [], f"{name} falls back to a seq scan"
+
+
+def test_seq_scans(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    # `duration` is not indexed, so can only be scanned for
+    with captured(DB.engine) as statements:
+        with DB.engine.connect() as conn:
+            conn.execute(select(DB.table).where(DB.table.duration > 0))
+    scans = seq_scans(DB.engine, statements, DB.table.__tablename__)
+    assert len(scans) == 1
@@ -0,0 +1,161 @@
+from graphlib import CycleError
+import pytest
+from lib.scheduler import CacheNode, CacheScheduler, cache_scheduler
+
+
+def saved(data):
+    return {"last_updated": 1700000000, "data": data}
+
+
+def test_run_cycle_order():
+    calls = []
+
+    def refresh(name, data):
+        def f():
+            calls.append(name)
+            return saved(data)
+        return f
+
+    scheduler = CacheScheduler(
+        [
+            CacheNode("summary", deps=["book", "prices"], refresh=refresh("summary", 4)),
+            CacheNode("book", deps=["prices"], refresh=refresh("book", 3)),
+            CacheNode("prices", deps=["source"], refresh=refresh("prices", 2)),
+            CacheNode("source", interval=60, refresh=refresh("source", 1)),
+        ]
+    )
+    status = scheduler.run_cycle(now=0)
+    assert calls == ["source", "prices", "book", "summary"]
+    assert set(status.values()) == {"changed"}
+
+
+def test_run_cycle_skips_unchanged():
+    calls = []
+    source_data = {"value": 1}
+
+    def source():
+        calls.append("source")
+        return saved(dict(source_data))
+
+    def derived():
+        calls.append("derived")
+        return saved({"derived": True})
+
+    scheduler = CacheScheduler(
+        [
+            CacheNode("source", interval=60, refresh=source),
+            CacheNode("derived", deps=["source"], refresh=derived),
+        ]
+    )
+    scheduler.run_cycle(now=0)
+    assert calls == ["source", "derived"]
+
+    # Not due yet
+    status = scheduler.run_cycle(now=30)
+    assert status == {"source": "skipped", "derived": "skipped"}
+
+    # Due, but source data unchanged
+    status = scheduler.run_cycle(now=60)
+    assert status == {"source": "unchanged", "derived": "skipped"}
+    assert calls == ["source", "derived", "source"]
+
+    # Source data changed, so derived is refreshed in the same cycle
+    source_data.update({"value": 2})
+    status = scheduler.run_cycle(now=120)
+    assert status == {"source": "changed", "derived": "unchanged"}
+    assert calls == ["source", "derived", "source", "source", "derived"]
+
+
+def test_run_cycle_failed():
+    def fail():
+        raise ValueError("no data")
+
+    scheduler = CacheScheduler(
+        [
+            CacheNode("source", interval=60, refresh=fail),
+            CacheNode("derived", deps=["source"], refresh=lambda: saved(1)),
+        ]
+    )
+    status = scheduler.run_cycle(now=0)
+    assert status["source"] == "failed"
+    # Never run before, so still refreshed from existing cache
+    assert status["derived"] == "changed"
+    assert scheduler.nodes["source"].last_run is None
+
+
+def test_run_cycle_failed_result():
+    results = {"source": None}
+    calls = []
+
+    def source():
+        return results["source"]
+
+    def derived():
+        calls.append("derived")
+        return saved(1)
+
+    scheduler = CacheScheduler(
+        [
+            CacheNode("source", interval=60, refresh=source),
+            CacheNode("derived", deps=["source"], refresh=derived),
+        ]
+    )
+    scheduler.run_cycle(now=0)
+    # `@timed` returns None for a refresh which raised
+    status = scheduler.run_cycle(now=60)
+    assert status == {"source": "failed", "derived": "skipped"}
+    # and the `default.result` for one which returned no data
+    results["source"] = {"result": "success", "data": None, "loglevel": "warning"}
+    status = scheduler.run_cycle(now=61)
+    assert status == {"source": "failed", "derived": "skipped"}
+    assert calls == ["derived"]
+    assert scheduler.nodes["source"].last_run is None
+
+    results["source"] = saved(1)
+    status = scheduler.run_cycle(now=62)
+    assert status == {"source": "changed", "derived": "unchanged"}
+
+
+def test_invalid_graph():
+    with pytest.raises(ValueError):
+        CacheScheduler([CacheNode("a", deps=["missing"])])
+    with pytest.raises(CycleError):
+        CacheScheduler([CacheNode("a", deps=["b"]), CacheNode("b", deps=["a"])])
+
+
+def test_cache_scheduler_graph():
+    order = cache_scheduler.order
+    assert order.index("gecko_source") < order.index("pair_prices_24hr")
+    assert order.index("swap_store") < order.index("pair_prices_24hr")
+    # Orderbooks are only refetched on their interval
+    assert cache_scheduler.nodes["orderbook_variants"].deps == []
+    assert order.index("pair_prices_24hr") < order.index("pairs_orderbook_extended")
+    for i in ["markets_summary", "tickers", "stats_api_summary", "adex_24hr"]:
+        assert order.index("pairs_orderbook_extended") < order.index(i)
+
+
+def test_restore():
+    calls = []
+
+    def source():
+        calls.append("source")
+        return saved({"value": 1})
+
+    def derived():
+        calls.append("derived")
+        return saved({"value": 2})
+
+    scheduler = CacheScheduler(
+        [
+            CacheNode("source", interval=60, refresh=source),
+            CacheNode("derived", deps=["source"], refresh=derived),
+        ]
+    )
+    # A fresh source skips its first refresh, and a stale item with
+    # unchanged data does not trigger a refresh of its dependents.
+    scheduler.restore("source", {"value": 1}, age=10, fresh=False)
+    scheduler.restore("derived", {"value": 2}, age=10, fresh=True)
+    scheduler.restore("unknown", {"value": 3}, age=10, fresh=True)
+    status = scheduler.run_cycle()
+    assert status == {"source": "unchanged", "derived": "skipped"}
+    assert calls == ["source"]
@@ -0,0 +1,96 @@
+from decimal import Decimal
+from lib.swap_store import SwapStore
+from tests.fixtures_swap import NOW, swap
+
+
+def test_ingest():
+    store = SwapStore(window=7200)
+    store.ingest(
+        [
+            swap("b", NOW - 100),
+            swap("a", NOW - 200),
+            swap("c", NOW - 9000),
+        ],
+        now=NOW,
+    )
+    # Outside of the window, so never added
+    assert "c" not in store.rows
+    assert list(store.uuids) == ["a", "b"]
+    assert store.covers(NOW - 3600, now=NOW)
+    assert not store.covers(NOW - 9000, now=NOW)
+    # Not used once it has missed a few refreshes
+    assert store.covers(NOW - 3600, now=NOW + store.max_age * 4)
+    assert not store.covers(NOW - 3600, now=NOW + store.max_age * 4 + 1)
+
+    # Updated swaps replace their row, and rows stay in time order
+    store.ingest(
+        [swap("a", NOW - 50, price="1.5", last_updated=NOW), swap("d", NOW - 150)],
+        now=NOW + 10,
+    )
+    assert list(store.uuids) == ["d", "b", "a"]
+    assert store.records([store.rows["a"]])[0]["price"] == Decimal("1.5")
+    assert store.last_updated == NOW
+
+    # Expired swaps are dropped
+    store.ingest([], now=NOW + 7200 - 60)
+    assert list(store.uuids) == ["a"]
+    assert store.rows == {"a": 0}
+
+
+def test_select():
+    store = SwapStore()
+    store.ingest(
+        [
+            swap("a", NOW - 300),
+            swap("b", NOW - 200, is_success=0),
+            swap("c", NOW - 100, maker_coin="DOGE", pair="DOGE_LTC"),
+            swap("d", NOW - 100, maker_coin="LTC", taker_coin="KMD", pair="LTC_KMD"),
+        ],
+        now=NOW,
+    )
+    assert list(store.uuids[store.select(NOW - 400, NOW)]) == ["a", "c", "d"]
+    rows = store.select(NOW - 400, NOW, success_only=False)
+    assert list(store.uuids[rows]) == ["a", "b", "c", "d"]
+    # Timestamps are exclusive, like SqlQuery
+    assert list(store.uuids[store.select(NOW - 300, NOW - 100)]) == []
+
+    mask = store.pair_mask("KMD", "LTC")
+    assert list(store.uuids[store.select(NOW - 400, NOW, mask)]) == ["a", "d"]
+    mask = store.coin_mask("DOGE")
+    assert list(store.uuids[store.select(NOW - 400, NOW, mask)]) == ["c"]
+    # Coins never seen match nothing
+    assert not store.coin_mask("BTC").any()
+
+    resp = store.get_swaps("KMD_LTC", NOW - 400, NOW)
+    assert [i["uuid"] for i in resp["KMD_LTC"]] == ["a", "d"]
+    # Newest first
+    assert [i["uuid"] for i in resp["ALL"]] == ["d", "a"]
+    assert resp["ALL"][0]["maker_coin"] == "LTC"
+    assert resp["ALL"][0]["trade_type"] == "buy"
+    assert resp["ALL"][0]["price"] == Decimal(1)
+
+
+def test_group_by():
+    store = SwapStore()
+    store.ingest(
+        [
+            swap("a", NOW - 300, price=3),
+            swap("b", NOW - 200, price=1),
+            swap("c", NOW - 200, price=2),
+            swap("d", NOW - 100, price=5, maker_coin="DOGE", pair="DOGE_LTC"),
+        ],
+        now=NOW,
+    )
+    rows = store.select(NOW - 400, NOW)
+    groups = store.group_by(rows, "pair", "price")
+    assert store.pairs.decode(groups["ids"]) == ["KMD_LTC", "DOGE_LTC"]
+    assert list(groups["count"]) == [3, 1]
+    assert list(groups["sum"]) == [6, 5]
+    # Swaps finishing at the same time are kept in the order added
+    assert list(store.uuids[groups["first"]]) == ["a", "d"]
+    assert list(store.uuids[groups["last"]]) == ["c", "d"]
+    assert list(store.uuids[groups["min"]]) == ["b", "d"]
+    assert list(store.uuids[groups["max"]]) == ["a", "d"]
+
+    groups = store.group_by(rows[:0], "pair", "price")
+    assert len(groups["ids"]) == 0
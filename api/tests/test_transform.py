@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 from decimal import Decimal
+import pytest
 from tests.fixtures_data import sampledata, swap_item, swap_item2
 from lib.pair import Pair
 from util.logger import logger
@@ -12,6 +13,9 @@ from util.transform import (
     invert,
     filterdata,
     derive,
+    VariantIndex,
+    PairOrder,
+    PairKey,
 )
 import util.memcache as memcache
 
@@ -187,6 +191,22 @@ def test_pair_by_market_cap():
     assert a == c
     assert e == "KMD-BEP20_BTC-segwit"
     assert sortdata.pair_by_market_cap("MARTY_DOC", gecko_source=gecko_source) == "DOC_MARTY"
+    assert sortdata.is_reversed("MARTY_DOC", gecko_source=gecko_source)
+    assert not sortdata.is_reversed("DOC_MARTY", gecko_source=gecko_source)
+
+
+def test_pair_order():
+    order = PairOrder()
+    source = {"KMD": {"usd_market_cap": 5}, "LTC": {"usd_market_cap": 50}}
+    assert order.canonical("LTC-segwit_KMD", source) == "KMD_LTC-segwit"
+    assert order.is_reversed("LTC_KMD", source)
+    assert order.canonical("DOC_MARTY", None) == "DOC_MARTY"
+    assert "LTC_KMD" in order.table["pairs"]
+
+    # A new gecko_source rebuilds the table
+    source = {"KMD": {"usd_market_cap": 500}, "LTC": {"usd_market_cap": 50}}
+    assert order.is_reversed("KMD_LTC", source)
+    assert order.table["pairs"] == {"KMD_LTC": "LTC_KMD"}
 
 
 def test_sort_top_items():
@@ -281,6 +301,27 @@ def test_base_quote_from_pair():
     assert quote == "YYY"
 
 
+def test_pair_key():
+    key = derive.pair_key("ATOM-IBC_IRIS_USDC-PLG20_OLD")
+    assert key.base == "ATOM-IBC_IRIS"
+    assert key.quote == "USDC-PLG20_OLD"
+    assert key.std == "ATOM_USDC"
+    assert key.reverse == "USDC-PLG20_OLD_ATOM-IBC_IRIS"
+    assert key.std_reverse == "USDC_ATOM"
+    assert derive.pair_key("ATOM-IBC_IRIS_USDC-PLG20_OLD") is key
+    assert derive.pair_key(key) is key
+    assert key == "ATOM-IBC_IRIS_USDC-PLG20_OLD"
+    assert invert.pair(key) == key.reverse
+    assert deplatform.pair(key) == key.std
+    with pytest.raises(AttributeError):
+        key.base = "KMD"
+
+    # Underscored tickers not in coins_config are not split
+    assert PairKey.parse("KMD_FOO_BAR", {"FOO_BAR"}).quote == "FOO_BAR"
+    with pytest.raises(ValueError):
+        PairKey.parse("KMD_FOO_BAR")
+
+
 def test_derive_coin_variants():
     r = derive.coin_variants("BTC")
     assert "BTC-BEP20" in r
@@ -411,6 +452,25 @@ def test_get_pair_variants():
     assert len(r) == 1
 
 
+def test_variant_index():
+    index = VariantIndex()
+    index.build({"BTC": {}, "BTC-segwit": {}, "KMD": {}, "KMD-BEP20": {}})
+    assert index.coin_variants("BTC") == ["BTC", "BTC-segwit"]
+    assert index.coin_variants("KMD-BEP20", True) == ["KMD-BEP20"]
+    assert index.coin_variants("DOC") == ["DOC"]
+    r = index.pair_variants("KMD_BTC-segwit", segwit_only=True)
+    assert r == ["KMD_BTC", "KMD_BTC-segwit"]
+    r.append("mutated")
+    assert ("KMD_BTC-segwit", True) in index.index["pairs"]
+    assert "mutated" not in index.pair_variants("KMD_BTC-segwit", segwit_only=True)
+    assert len(index.pair_variants("KMD_BTC")) == 4
+
+    # Rebuilding for a new coins_config drops memoized pairs
+    index.build({"BTC": {}, "KMD": {}})
+    assert index.index["pairs"] == {}
+    assert index.pair_variants("KMD_BTC") == ["KMD_BTC"]
+
+
 def test_derive_price_at_finish():
     r = derive.price_at_finish(swap_item)
     assert "1700000777" in r
@@ -0,0 +1,66 @@
+from decimal import Decimal
+from lib.volume_aggregator import VolumeAggregator
+from tests.fixtures_swap import NOW, swap
+
+
+def pair_volume(agg, window):
+    rows = agg.totals_for(window).pair_rows()
+    if len(rows) == 0:
+        return None
+    return rows[0]
+
+
+def test_ingest_windows():
+    agg = VolumeAggregator(windows=[3600, 7200], bucket_size=300)
+    agg.ingest(
+        [
+            swap("a", NOW - 100),
+            swap("b", NOW - 5000, maker_amount=3),
+            swap("c", NOW - 9000),
+        ],
+        now=NOW,
+    )
+    assert pair_volume(agg, 3600)["num_swaps"] == 1
+    assert pair_volume(agg, 3600)["maker_volume"] == Decimal(2)
+    assert pair_volume(agg, 7200)["num_swaps"] == 2
+    assert pair_volume(agg, 7200)["maker_volume"] == Decimal(5)
+    # Outside of all windows, so never added
+    assert "c" not in agg.swaps
+
+    makers = agg.totals_for(7200).coin_rows("maker")
+    assert makers == [
+        {"coin": "KMD", "ticker": "KMD", "maker_volume": Decimal(5), "num_swaps": 2}
+    ]
+
+
+def test_expire():
+    agg = VolumeAggregator(windows=[3600, 7200], bucket_size=300)
+    agg.ingest([swap("a", NOW - 100), swap("b", NOW - 3000)], now=NOW)
+    assert pair_volume(agg, 3600)["num_swaps"] == 2
+
+    agg.ingest([], now=NOW + 1200)
+    assert pair_volume(agg, 3600)["num_swaps"] == 1
+    assert pair_volume(agg, 7200)["num_swaps"] == 2
+
+    agg.ingest([], now=NOW + 8000)
+    assert pair_volume(agg, 3600) is None
+    assert pair_volume(agg, 7200) is None
+    assert agg.swaps == {}
+    assert agg.buckets == {}
+
+
+def test_updated_swaps():
+    agg = VolumeAggregator(windows=[3600], bucket_size=300)
+    agg.ingest([swap("a", NOW - 100), swap("b", NOW - 200)], now=NOW)
+    assert pair_volume(agg, 3600)["taker_volume"] == Decimal(4)
+
+    # Amount corrected on a later import
+    agg.ingest([swap("a", NOW - 100, taker_amount=5, last_updated=NOW)], now=NOW)
+    assert pair_volume(agg, 3600)["taker_volume"] == Decimal(7)
+    assert pair_volume(agg, 3600)["num_swaps"] == 2
+
+    # No longer successful, so retracted
+    agg.ingest([swap("b", NOW - 200, is_success=0, last_updated=NOW)], now=NOW)
+    assert pair_volume(agg, 3600)["taker_volume"] == Decimal(5)
+    assert pair_volume(agg, 3600)["num_swaps"] == 1
+    assert agg.last_updated == NOW
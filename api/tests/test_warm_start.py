@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+from lib.scheduler import CacheNode, CacheScheduler
+from lib.warm_start import WarmStart
+import util.memcache as memcache
+
+
+def test_warm_start():
+    names = ["coins_config", "markets_summary", "foo"]
+    scheduler = CacheScheduler(
+        [CacheNode(i, interval=60, refresh=lambda: None) for i in names[:2]]
+    )
+    warm_start = WarmStart(scheduler, names=names)
+    assert warm_start.status()["ready_secs"] is None
+    items = warm_start.run()
+    assert set(items.keys()) == set(names)
+    assert items["foo"] == "missing"
+    for name in names[:2]:
+        assert items[name] in ["fresh", "stale"]
+        assert scheduler.nodes[name].fingerprint is not None
+        if items[name] == "stale":
+            assert scheduler.nodes[name].last_run is None
+    assert len(memcache.get_markets_summary()) > 0
+
+    status = warm_start.status()
+    assert status["ready_secs"] >= 0
+    assert status["time_to_first_request"] is None
+    warm_start.record_request()
+    first = warm_start.time_to_first_request
+    warm_start.record_request()
+    assert warm_start.time_to_first_request == first >= status["ready_secs"]
@@ -64,3 +64,19 @@ class BadPairFormatError(Exception):
         self.status_code = 400
         self.msg = msg
         self.name = "BadPairFormatError"
+
+
+class QueryTimeoutError(Exception):
+    "Raised when a database query exceeds its statement timeout"
+    def __init__(self, msg: str, status_code: int = 504):
+        self.status_code = status_code
+        self.msg = msg
+        self.name = "QueryTimeoutError"
+
+
+class QueryLimitError(Exception):
+    "Raised when too many database queries are already running"
+    def __init__(self, msg: str, status_code: int = 503):
+        self.status_code = status_code
+        self.msg = msg
+        self.name = "QueryLimitError"
@@ -1,12 +1,17 @@
 import os
+import gzip
 import time
 import json
+import hashlib
+import tempfile
 import requests
-from const import API_ROOT_PATH
+from const import API_ROOT_PATH, CACHE_FILES_COMPRESS
 from util.logger import timed, logger
 import util.defaults as default
 import util.validate as validate
 
+GZIP_MAGIC = b"\x1f\x8b"
+
 
 class Files:
     def __init__(self, **kwargs):
@@ -56,18 +61,38 @@ class Files:
     def get_cache_fn(self, name):
         return getattr(self, name, None)
 
-    def save_json(self, fn, data):
+    def save_json(self, fn, data, compress: bool = CACHE_FILES_COMPRESS):
+        """
+        Saves data as compact (optionally gzipped) json. The file is
+        replaced atomically, so readers never see a partial file, and a
+        manifest with its metadata is saved alongside it.
+        """
         try:
             if len(data) > 0:
                 if validate.json_obj(data):
-                    with open(fn, "w+") as f:
-                        json.dump(data, f, indent=4)
-                        return {
-                            "result": "success",
-                            "msg": f"Saved {fn}",
-                            "loglevel": "saved",
-                            "ignore_until": 0,
-                        }
+                    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+                    encoding = "json"
+                    if compress:
+                        body = gzip.compress(body, compresslevel=6, mtime=0)
+                        encoding = "json+gzip"
+                    self.write_atomic(fn, body)
+                    last_updated = None
+                    if isinstance(data, dict):
+                        last_updated = data.get("last_updated")
+                    meta = {
+                        "last_updated": last_updated,
+                        "saved_at": int(time.time()),
+                        "size": len(body),
+                        "checksum": hashlib.sha256(body).hexdigest(),
+                        "encoding": encoding,
+                    }
+                    self.write_atomic(self.meta_fn(fn), json.dumps(meta).encode())
+                    return {
+                        "result": "success",
+                        "msg": f"Saved {fn}",
+                        "loglevel": "saved",
+                        "ignore_until": 0,
+                    }
                 else:
                     return {
                         "result": "error",
@@ -93,23 +118,67 @@ class Files:
                 "ignore_until": 0,
             }
 
+    def write_atomic(self, fn, body: bytes):
+        """Writes to a temp file, then renames it over `fn`"""
+        folder, name = os.path.split(fn)
+        fd, tmp_fn = tempfile.mkstemp(dir=folder or ".", prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp files are only readable by the owner
+            os.chmod(tmp_fn, 0o644)
+            os.replace(tmp_fn, fn)
+        except Exception:
+            if os.path.exists(tmp_fn):
+                os.remove(tmp_fn)
+            raise
+
+    def meta_fn(self, fn):
+        return f"{fn}.meta.json"
+
+    def load_meta(self, path):
+        """Returns the manifest saved with a file, or None"""
+        try:
+            with open(self.meta_fn(path), "r") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def read_verified(self, path, retries: int = 1):
+        """
+        Returns the file's contents, or None if they do not match the
+        checksum in its manifest. The file and its manifest are replaced
+        one after the other, so a mismatch is read again before that.
+        """
+        with open(path, "rb") as f:
+            body = f.read()
+        meta = self.load_meta(path) or {}
+        if meta.get("checksum") in [None, hashlib.sha256(body).hexdigest()]:
+            return body
+        if retries > 0:
+            time.sleep(0.1)
+            return self.read_verified(path, retries=retries - 1)
+        logger.warning(f"Checksum of {path} does not match its manifest")
+        return None
+
     @timed
     def load_jsonfile(self, path):
-        i = 0
-        while i < 5:
-            try:
-                with open(path, "r") as f:
-                    return default.result(
-                        data=json.load(f),
-                        msg=f"Loaded {path}",
-                        loglevel="saved",
-                        ignore_until=3,
-                    )
-            except Exception as e:  # pragma: no cover
-                error = f"Error loading {path}: {e}"
-            i += 1
-            time.sleep(0.2)
-        logger.warning(error)
+        try:
+            body = self.read_verified(path)
+            if body is None:
+                return None
+            if body[:2] == GZIP_MAGIC:
+                body = gzip.decompress(body)
+            return default.result(
+                data=json.loads(body),
+                msg=f"Loaded {path}",
+                loglevel="saved",
+                ignore_until=3,
+            )
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"Error loading {path}: {e}")
         return None
 
     def download_json(self, url):
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
-from datetime import datetime
+import os
+import random
 from os.path import basename, dirname, abspath
+from time import perf_counter
 import logging
 import functools
+import util.metrics as metrics
 
 
 PROJECT_ROOT_PATH = dirname(dirname(abspath(__file__)))
@@ -289,15 +292,14 @@ def send_log(loglevel, msg):
 
 
 class StopWatch:
-    def __init__(self, start_time, trace, loglevel="debug", msg="") -> None:
-        self.start_time = start_time
+    def __init__(self, duration, trace, loglevel="debug", msg="") -> None:
+        self.duration = duration
         self.msg = msg
         self.trace = trace
         self.loglevel = loglevel
         self.get_stopwatch()
 
     def get_stopwatch(self):
-        duration = int(datetime.utcnow().timestamp()) - int(self.start_time)
         if not isinstance(self.msg, str):
             self.msg = str(self.msg)
         lineno = self.trace["lineno"]
@@ -305,7 +307,7 @@ class StopWatch:
         func = self.trace["function"]
         if PROJECT_ROOT_PATH in self.msg:
             self.msg = self.msg.replace(f"{PROJECT_ROOT_PATH}/", "")
-        self.msg = f"{duration:>2} sec | {func:<20} | {str(self.msg):<80} "
+        self.msg = f"{self.duration:>6.3f} sec | {func:<20} | {str(self.msg):<80} "
         self.msg += f"| {basename(filename)}:{lineno}"
         send_log(loglevel=self.loglevel, msg=self.msg)
 
@@ -341,49 +343,69 @@ def show_pallete():
     logger.cached("cached")
 
 
-# A decorator for returning runtime of functions:def timed(func):
-def timed(func):
+# Fraction of `@timed` calls which are timed, from 0 to 1. Calls which
+# are not sampled skip the timers, and only log messages which are not
+# conditional on their duration (`ignore_until=0`).
+TIMED_SAMPLE_RATE = float(os.getenv("TIMED_SAMPLE_RATE") or 1)
+
+
+def set_sample_rate(rate: float):
+    global TIMED_SAMPLE_RATE
+    TIMED_SAMPLE_RATE = rate
+
+
+def timings():
+    """Returns call counts and durations of sampled `@timed` calls"""
+    with metrics.function_max_seconds.lock:
+        max_secs = dict(metrics.function_max_seconds.values)
+    return {
+        dict(k)["function"]: {
+            "calls": v["count"],
+            "total_secs": v["sum"],
+            "max_secs": max_secs.get(k, 0),
+        }
+        for k, v in metrics.function_seconds.totals().items()
+    }
+
+
+# A decorator for returning runtime of functions. Use `@timed`, or
+# `@timed(sample_rate=0)` to override the sample rate for a function.
+def timed(func=None, *, sample_rate=None):
+    if func is None:
+        return functools.partial(timed, sample_rate=sample_rate)
+    # Computed once, rather than on every call
+    trace = get_trace(func)
+    key = metrics.label_key({"function": f"{func.__module__}.{func.__qualname__}"})
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = int(datetime.utcnow().timestamp())
-        duration = int(datetime.utcnow().timestamp()) - start_time
-        trace = get_trace(func)
-        msg = "<<< no msg provided >>>"
+        rate = TIMED_SAMPLE_RATE if sample_rate is None else sample_rate
+        sampled = rate >= 1 or (rate > 0 and random.random() < rate)
+        if sampled:
+            start_time = perf_counter()
         try:
             result = func(*args, **kwargs)
         except Exception as e:
-            ignore_until = 0
-            loglevel = "error"
-            if isinstance(e, ValueError):
-                # Custom logic here
-                pass
+            duration = perf_counter() - start_time if sampled else 0
             msg = f"{type(e)}: {e}"
-            StopWatch(start_time, trace=trace, loglevel=loglevel, msg=msg)
-        else:
-            send = False
-            msg = ""
-            ignore_until = 0
-            loglevel = "info"
-            if isinstance(result, dict):
-                if "loglevel" in result:
-                    loglevel = result["loglevel"]
-                    send = True
-                else:
-                    # if not using `default.result`
-                    return result
-                if "message" in result:
-                    msg = result["message"]
-                    send = True
-                if "ignore_until" in result:
-                    ignore_until = result["ignore_until"]
-                    send = True
-                if duration >= ignore_until and send:
-                    StopWatch(start_time, trace=trace, loglevel=loglevel, msg=msg)
-                # Using `default.result`, with actual data to return
-                if "data" in result:
-                    if result["data"] is not None:
-                        result = result["data"]
+            StopWatch(duration, trace=trace, loglevel="error", msg=msg)
+            return None
+        duration = 0
+        if sampled:
+            duration = perf_counter() - start_time
+            metrics.function_seconds.observe_key(key, duration)
+            metrics.function_max_seconds.set_max_key(key, duration)
+        if not isinstance(result, dict) or "loglevel" not in result:
+            # if not using `default.result`
             return result
+        ignore_until = result.get("ignore_until", 0)
+        if ignore_until <= 0 or (sampled and duration >= ignore_until):
+            msg = result.get("message", "")
+            StopWatch(duration, trace=trace, loglevel=result["loglevel"], msg=msg)
+        # Using `default.result`, with actual data to return
+        if result.get("data") is not None:
+            result = result["data"]
+        return result
 
     return wrapper
 
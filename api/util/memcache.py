@@ -1,33 +1,36 @@
 #!/usr/bin/env python3
 import os
 import time
-import json
+from collections import OrderedDict
+from threading import Lock
 from pymemcache.client.base import PooledClient
 from util.logger import logger, timed
-from const import MEMCACHE_LIMIT
+from util.serde import CacheSerde
+from const import (
+    MEMCACHE_LIMIT,
+    MEMCACHE_SERDE_FORMAT,
+    MEMCACHE_SERDE_COMPRESSION,
+    MEMCACHE_COMPRESS_MIN,
+    MEMCACHE_L1_MAX_ITEMS,
+    MEMCACHE_L1_TTL,
+)
 import util.defaults as default
+import util.metrics as metrics
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-class JsonSerde(object):  # pragma: no cover
-    def serialize(self, key, value):
-        if isinstance(value, str):
-            return value.encode("utf-8"), 1
-        return json.dumps(value).encode("utf-8"), 2
-
-    def deserialize(self, key, value, flags):
-        if flags == 1:
-            return value.decode("utf-8")
-        if flags == 2:
-            return json.loads(value.decode("utf-8"))
-        raise Exception("Unknown serialization format")
+SERDE = CacheSerde(
+    fmt=MEMCACHE_SERDE_FORMAT,
+    compression=MEMCACHE_SERDE_COMPRESSION,
+    compress_min=MEMCACHE_COMPRESS_MIN,
+)
 
 try:  # pragma: no cover
     MEMCACHE = PooledClient(
         ("memcached", 11211),
-        serde=JsonSerde(),
+        serde=SERDE,
         timeout=10,
         max_pool_size=50,
         ignore_exc=True,
@@ -41,7 +44,7 @@ except Exception as e:  # pragma: no cover
     logger.muted(e)
     MEMCACHE = PooledClient(
         ("localhost", 11211),
-        serde=JsonSerde(),
+        serde=SERDE,
         timeout=10,
         max_pool_size=50,
         ignore_exc=True,
@@ -57,11 +60,170 @@ def stats():  # pragma: no cover
     return MEMCACHE.stats()
 
 
+class L1Cache:
+    """
+    In-process cache of decoded memcache values, so readers of large
+    cache items skip the memcache round trip and decode while the item
+    is unchanged.
+
+    Each entry is stored with the version stamp the writer set for it in
+    memcache. For `ttl` seconds after a check, entries are returned
+    without asking memcache. After that, only the small version key is
+    read, and the value is fetched again if the version has changed.
+    Least recently used entries are evicted beyond `max_items`.
+
+    Values are shared between readers, so they must not be modified.
+    """
+
+    def __init__(self, max_items: int = 32, ttl: float = 1.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        # key -> [version, last checked, value]
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, now: float):
+        """Returns a key's entry, and if it was checked within the ttl"""
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is None:
+                return None, False
+            self.items.move_to_end(key)
+            return entry, now - entry[1] < self.ttl
+
+    def set(self, key, version, value, now: float):
+        with self.lock:
+            self.items.update({key: [version, now, value]})
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self.items),
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total > 0 else 0,
+            }
+
+
+L1 = L1Cache(max_items=MEMCACHE_L1_MAX_ITEMS, ttl=MEMCACHE_L1_TTL)
+
+# Large, frequently read cache items which are kept in the L1 cache
+L1_KEYS = [
+    "coins",
+    "coins_config",
+    "fixer_rates",
+    "gecko_source",
+    "pairs_orderbook_extended",
+    "coin_volumes_24hr",
+    "pair_volumes_24hr",
+    "pair_volumes_14d",
+    "pairs_last_traded",
+    "pairs_last_traded_24hr",
+    "pair_prices_24hr",
+    "tickers",
+    "gecko_pairs",
+    "stats_api_summary",
+    "markets_summary",
+    "adex_24hr",
+    "adex_fortnite",
+]
+
+
+def is_l1(key):
+    return key in L1_KEYS or key.startswith("prerendered_")
+
+
+def l1_stats():  # pragma: no cover
+    return L1.stats()
+
+
+def l2_stats():  # pragma: no cover
+    """Returns memcached's hit counts, or an empty dict if unreachable"""
+    server = {
+        (k.decode() if isinstance(k, bytes) else k): v
+        for k, v in (stats() or {}).items()
+    }
+    if "get_hits" not in server:
+        return {}
+    hits, misses = int(server["get_hits"]), int(server["get_misses"])
+    total = hits + misses
+    return {
+        "items": int(server.get("curr_items", 0)),
+        "hits": hits,
+        "misses": misses,
+        "evictions": int(server.get("evictions", 0)),
+        "hit_rate": hits / total if total > 0 else 0,
+    }
+
+
+@metrics.registry.collector
+def collect_memcache_metrics():
+    for cache, values in [("l1", l1_stats()), ("l2", l2_stats())]:
+        for stat, value in values.items():
+            metrics.memcache_stats.set(value, cache=cache, stat=stat)
+
+
+def version_key(key):
+    return f"{key}_version"
+
+
+def cache_key(key):
+    if os.getenv("IS_TESTING") == "True" and key != "testing":
+        return f"{key}-testing"
+    return key
+
+
 def get(key):  # pragma: no cover
+    if is_l1(key):
+        return l1_get(cache_key(key))
+    return memcache_get(cache_key(key))
+
+
+def l1_get(key):
+    now = time.monotonic()
+    entry, fresh = L1.lookup(key, now)
+    if fresh:
+        L1.count(hit=True)
+        return entry[2]
+    version = memcache_get(version_key(key), retries=1)
+    if entry is not None and version is not None and entry[0] == version:
+        L1.set(key, version, entry[2], now)
+        L1.count(hit=True)
+        return entry[2]
+    L1.count(hit=False)
+    value = memcache_get(key)
+    if value is not None and version is not None:
+        L1.set(key, version, value, now)
+    return value
+
+
+def memcache_get(key, retries: int = 7):  # pragma: no cover
     i = 0
-    if os.getenv("IS_TESTING") == "True" and key != "testing":
-        key = f"{key}-testing"
-    while i < 7:
+    while i < retries:
         cached = None
         try:
             cached = MEMCACHE.get(key)
@@ -74,6 +236,8 @@ def get(key):  # pragma: no cover
         "orderbook" not in key
         and "ticker_info" not in key
         and "prices" not in key
+        and "prerendered" not in key
+        and not key.endswith("_version")
         and key not in ["testing"]
     ):
         logger.warning(f"Failed to get '{key}' from memcache")
@@ -83,10 +247,19 @@ def get(key):  # pragma: no cover
 @timed
 def update(key, value, expiry):
     try:
-        if os.getenv("IS_TESTING") == "True" and key != "testing":
-            key = f"{key}-testing"
+        l1 = is_l1(key)
+        key = cache_key(key)
         if value is not None:
-            MEMCACHE.set(key, value, expiry)
+            # Waits for the reply, since the pool rotates connections
+            # and the next read may use a different one.
+            MEMCACHE.set(key, value, expiry, noreply=False)
+            if l1:
+                # Set after the value, so readers never pair a new
+                # version with an old value.
+                MEMCACHE.set(
+                    version_key(key), str(time.time_ns()), expiry, noreply=False
+                )
+                L1.discard(key)
             msg = f"{key} added to memcache"
             return default.result(data=key, msg=msg, loglevel="cached", ignore_until=5)
         msg = f"{key} memcache not updated, data is empty"
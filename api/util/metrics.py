@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import logging
+from threading import Lock
+from typing import Callable, Dict, List
+
+# Latency buckets, in seconds
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+def label_key(labels: Dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def escape(value) -> str:
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return value.replace("\n", "\\n")
+
+
+def label_str(key: tuple, extra: Dict | None = None) -> str:
+    labels = list(key)
+    if extra is not None:
+        labels += list(extra.items())
+    if len(labels) == 0:
+        return ""
+    labels = [f'{k}="{escape(v)}"' for k, v in labels]
+    return "{" + ",".join(labels) + "}"
+
+
+def number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.lock = Lock()
+        # label key -> value
+        self.values = {}
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [
+                f"{self.name}{label_str(k)} {number(v)}"
+                for k, v in sorted(self.values.items())
+            ]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[label_key(labels)] = value
+
+    def set_max(self, value: float, **labels):
+        self.set_max_key(label_key(labels), value)
+
+    def set_max_key(self, key: tuple, value: float):
+        """Sets the gauge to `value` if higher than its current value"""
+        with self.lock:
+            if key not in self.values or value > self.values[key]:
+                self.values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Counts of observed values per bucket. Only the count for the first
+    bucket a value fits in is incremented, and buckets are made
+    cumulative when rendered, so observations stay cheap.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: List[float] = BUCKETS):
+        Metric.__init__(self, name, help)
+        self.buckets = sorted(buckets) + [float("inf")]
+
+    def observe(self, value: float, **labels):
+        self.observe_key(label_key(labels), value)
+
+    def observe_key(self, key: tuple, value: float):
+        with self.lock:
+            if key not in self.values:
+                # [count per bucket, sum, count]
+                self.values[key] = [[0] * len(self.buckets), 0, 0]
+            counts = self.values[key]
+            for n, le in enumerate(self.buckets):
+                if value <= le:
+                    counts[0][n] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def totals(self) -> Dict[tuple, Dict]:
+        """Returns the count and sum of observations per label key"""
+        with self.lock:
+            return {k: {"count": v[2], "sum": v[1]} for k, v in self.values.items()}
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for le, n in zip(self.buckets, counts):
+                    cumulative += n
+                    labels = label_str(key, {"le": number(le)})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{label_str(key)} {number(total)}")
+                lines.append(f"{self.name}_count{label_str(key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics exposed on `/metrics`, in the Prometheus text format.
+
+    Collectors are called before rendering, to set gauges for values
+    which are cheaper to read when scraped than to track, e.g. cache
+    file ages or memcache stats.
+    """
+
+    def __init__(self, prefix: str = "defi_stats_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(f"{self.prefix}{name}", help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(Gauge(f"{self.prefix}{name}", help))
+
+    def histogram(self, name: str, help: str, buckets=BUCKETS) -> Histogram:
+        return self.register(Histogram(f"{self.prefix}{name}", help, buckets))
+
+    def collector(self, func: Callable):
+        if func not in self.collectors:
+            self.collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:  # pragma: no cover
+                # util.logger imports this module, so can not be used here
+                logging.getLogger(__name__).warning(
+                    f"Metrics collector {collect.__name__} failed: {e}"
+                )
+        lines = []
+        for name in sorted(self.metrics):
+            lines += self.metrics[name].render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+function_seconds = registry.histogram(
+    "function_seconds", "Duration of sampled @timed function calls"
+)
+function_max_seconds = registry.gauge(
+    "function_max_seconds", "Longest duration of sampled @timed function calls"
+)
+cache_refresh_seconds = registry.histogram(
+    "cache_refresh_seconds", "Duration of cache item refreshes"
+)
+cache_refresh_total = registry.counter(
+    "cache_refresh_total", "Cache item refreshes, by item and outcome"
+)
+cache_item_age_seconds = registry.gauge(
+    "cache_item_age_seconds", "Seconds since each cache file was updated"
+)
+cache_item_size_bytes = registry.gauge(
+    "cache_item_size_bytes", "Size of each cache file"
+)
+memcache_stats = registry.gauge(
+    "memcache", "Memcache L1 (in process) and L2 (memcached) stats"
+)
+db_pool = registry.gauge(
+    "db_pool", "Connections in each database engine's pool, by state"
+)
+mm2_rpc_seconds = registry.histogram(
+    "mm2_rpc_seconds", "Duration of mm2 RPC requests, by method"
+)
+mm2_rpc_errors_total = registry.counter(
+    "mm2_rpc_errors_total", "Failed mm2 RPC requests, by method and status"
+)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, List
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def stack_of(frame, max_depth: int = 128) -> List[str]:
+    """Returns a frame's stack as labels, outermost first"""
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process at a fixed
+    interval, so request threads and the `repeat_every` cache loop
+    threads are covered without a restart or any instrumentation.
+
+    Stacks are counted in the collapsed format used by flamegraph.pl
+    and speedscope (`thread;outer;...;inner count`). Only one profile
+    runs at a time, as overlapping samplers would skew each other.
+    """
+
+    def __init__(self, max_seconds: int = 120):
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+
+    def sample(self, stacks: Counter, ignore: set):
+        names = {i.ident: i.name for i in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in ignore:
+                continue
+            thread = names.get(ident, f"thread-{ident}")
+            stacks[(thread, *stack_of(frame))] += 1
+
+    def run(self, seconds: float = 10, interval: float = 0.01) -> Dict:
+        """
+        Samples all threads for `seconds`, returning the collapsed stacks
+        and sample counts. Raises ProfilerBusy if a profile is running.
+        """
+        seconds = min(max(seconds, 0.1), self.max_seconds)
+        interval = max(interval, 0.001)
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            stacks = Counter()
+            # The calling thread only waits for the profile to finish
+            ignore = {threading.get_ident()}
+            samples = 0
+            start = time.perf_counter()
+            end = start + seconds
+            while time.perf_counter() < end:
+                self.sample(stacks, ignore)
+                samples += 1
+                time.sleep(interval)
+            return {
+                "seconds": round(time.perf_counter() - start, 3),
+                "interval": interval,
+                "samples": samples,
+                "stacks": stacks,
+            }
+        finally:
+            self.lock.release()
+
+    def collapsed(self, stacks: Counter) -> str:
+        """Returns stacks in the collapsed format, one per line"""
+        lines = [f"{';'.join(k)} {v}" for k, v in stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def top(self, stacks: Counter, limit: int = 25) -> Dict[str, List]:
+        """
+        Returns the functions most often on top of a stack (`self`) and
+        anywhere in a stack (`total`), with their share of all samples.
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks.items():
+            # The first item is the thread name
+            frames = stack[1:]
+            if len(frames) == 0:
+                continue
+            own[frames[-1]] += count
+            for i in set(frames):
+                total[i] += count
+        samples = sum(stacks.values()) or 1
+        return {
+            k: [
+                {"function": i, "samples": n, "pct": round(n / samples * 100, 2)}
+                for i, n in v.most_common(limit)
+            ]
+            for k, v in [("self", own), ("total", total)]
+        }
+
+    def threads(self, stacks: Counter) -> Dict[str, int]:
+        """Returns the number of samples per thread"""
+        threads = Counter()
+        for stack, count in stacks.items():
+            threads[stack[0]] += count
+        return dict(threads.most_common())
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import json
+import zlib
+from util.logger import logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+
+# Memcache flags for each value. The low nibble is the format, and the
+# high nibble the compression. Flags 1 and 2 match the original
+# JsonSerde, so values cached before an upgrade can still be read.
+STR = 1
+JSON = 2
+ORJSON = 3
+MSGPACK = 4
+BYTES = 5
+FORMAT_MASK = 0x0F
+
+ZLIB = 0x10
+ZSTD = 0x20
+LZ4 = 0x40
+COMPRESSION_MASK = 0xF0
+
+FORMATS = {
+    "json": JSON,
+    "orjson": ORJSON,
+    "msgpack": MSGPACK,
+}
+COMPRESSIONS = {
+    None: 0,
+    "zlib": ZLIB,
+    "zstd": ZSTD,
+    "lz4": LZ4,
+}
+
+
+def available_formats():
+    formats = ["json"]
+    if orjson is not None:
+        formats.append("orjson")
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+def available_compressions():
+    compressions = [None, "zlib"]
+    if zstandard is not None:
+        compressions.append("zstd")
+    if lz4 is not None:
+        compressions.append("lz4")
+    return compressions
+
+
+def encode(value, fmt: int) -> bytes:
+    if fmt == ORJSON:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    if fmt == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    return json.dumps(value).encode("utf-8")
+
+
+def decode(value: bytes, fmt: int):
+    if fmt == STR:
+        return value.decode("utf-8")
+    if fmt == BYTES:
+        return value
+    if fmt == JSON:
+        return json.loads(value.decode("utf-8"))
+    if fmt == ORJSON:
+        if orjson is None:  # pragma: no cover
+            return json.loads(value.decode("utf-8"))
+        return orjson.loads(value)
+    if fmt == MSGPACK:
+        if msgpack is None:  # pragma: no cover
+            raise Exception("msgpack is not installed")
+        return msgpack.unpackb(value, raw=False, strict_map_key=False)
+    raise Exception("Unknown serialization format")
+
+
+def compress(value: bytes, compression: int) -> bytes:
+    if compression == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(value)
+    if compression == LZ4:
+        return lz4.compress(value)
+    return zlib.compress(value, 3)
+
+
+def decompress(value: bytes, compression: int) -> bytes:
+    if compression == ZLIB:
+        return zlib.decompress(value)
+    if compression == ZSTD:
+        if zstandard is None:  # pragma: no cover
+            raise Exception("zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(value)
+    if compression == LZ4:
+        if lz4 is None:  # pragma: no cover
+            raise Exception("lz4 is not installed")
+        return lz4.decompress(value)
+    raise Exception("Unknown compression format")
+
+
+class CacheSerde(object):
+    """
+    Serializer for pymemcache. Values are encoded with the configured
+    format, then compressed if larger than `compress_min` bytes. The
+    format and compression are stored in the memcache flags, so any
+    value can be read back regardless of the current configuration.
+
+    Formats or compressions which are not installed fall back to
+    orjson / json and zlib.
+    """
+
+    def __init__(
+        self,
+        fmt: str = "orjson",
+        compression: str | None = "zstd",
+        compress_min: int = 65536,
+    ):
+        if fmt not in available_formats():
+            fallback = "orjson" if orjson is not None else "json"
+            logger.warning(f"Serde format {fmt} not available, using {fallback}")
+            fmt = fallback
+        if compression not in available_compressions():
+            logger.warning(f"Serde compression {compression} not available, using zlib")
+            compression = "zlib"
+        self.fmt = FORMATS[fmt]
+        self.compression = COMPRESSIONS[compression]
+        self.compress_min = compress_min
+
+    def serialize(self, key, value):
+        if isinstance(value, str):
+            return value.encode("utf-8"), STR
+        if isinstance(value, bytes):
+            return value, BYTES
+        fmt = self.fmt
+        try:
+            data = encode(value, fmt)
+        except TypeError:
+            # e.g. integers too large for orjson / msgpack
+            fmt = JSON
+            data = encode(value, fmt)
+        if self.compression and len(data) > self.compress_min:
+            return compress(data, self.compression), fmt | self.compression
+        return data, fmt
+
+    def deserialize(self, key, value, flags):
+        compression = flags & COMPRESSION_MASK
+        if compression:
+            value = decompress(value, compression)
+        return decode(value, flags & FORMAT_MASK)
+
+
+class JsonSerde(CacheSerde):  # pragma: no cover
+    """Uncompressed stdlib json, as used before CacheSerde."""
+
+    def __init__(self):
+        CacheSerde.__init__(self, fmt="json", compression=None)
@@ -1,4 +1,6 @@
+import time
 from decimal import Decimal, InvalidOperation
+from threading import Lock
 from typing import Any, List, Dict
 
 from util.logger import logger, timed
@@ -32,7 +34,7 @@ class Clean:
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
-    @timed
+    @timed(sample_rate=0)
     def decimal_dicts(
         self, data, to_string=False, rounding=10, exclude_keys: List = list()
     ):
@@ -362,8 +364,7 @@ class Deplatform:
         pass
 
     def pair(self, pair):
-        base, quote = derive.base_quote(pair)
-        return f"{self.coin(base)}_{self.coin(quote)}"
+        return derive.pair_key(pair).std
 
     def coin(self, coin):
         if coin is None:
@@ -381,67 +382,32 @@ class Derive:
             self._coins_config = memcache.get_coins_config()
         return self._coins_config
 
-    @timed
+    def pair_key(self, pair) -> "PairKey":
+        """Returns the interned PairKey for a pair string or PairKey"""
+        if isinstance(pair, PairKey):
+            return pair
+        variant_index.refresh()
+        return variant_index.pair_key(pair)
+
     def base_quote(self, pair_str, reverse=False, deplatform=False):
-        # TODO: This workaround fixes the issue
-        # but need to find root cause to avoid
-        # unexpected related issues
         try:
+            key = self.pair_key(pair_str)
+            base, quote = key.base, key.quote
             if deplatform:
-                pair_str = deplatform.pair(pair_str)
-            if pair_str == "OLD_USDC-PLG20_USDC-PLG20":
-                pair_str = "USDC-PLG20_USDC-PLG20_OLD"
-            split_pair_str = pair_str.split("_")
-            if len(split_pair_str) == 2:
-                base = split_pair_str[0]
-                quote = split_pair_str[1]
-            elif pair_str.startswith("IRIS_ATOM-IBC"):
-                base = "IRIS_ATOM-IBC"
-                quote = pair_str.replace(f"{base}_", "")
-            elif pair_str.endswith("IRIS_ATOM-IBC"):
-                quote = "IRIS_ATOM-IBC"
-                base = pair_str.replace(f"_{quote}", "")
-
-            elif pair_str.startswith("IRIS_ATOM"):
-                base = "IRIS_ATOM"
-                quote = pair_str.replace(f"{base}_", "")
-            elif pair_str.endswith("IRIS_ATOM"):
-                quote = "IRIS_ATOM"
-                base = pair_str.replace(f"_{quote}", "")
-
-            elif pair_str.startswith("ATOM-IBC_IRIS"):
-                base = "ATOM-IBC_IRIS"
-                quote = pair_str.replace(f"{base}_", "")
-            elif pair_str.endswith("ATOM-IBC_IRIS"):
-                quote = "ATOM-IBC_IRIS"
-                base = pair_str.replace(f"_{quote}", "")
-
-            elif len(split_pair_str) == 4 and "OLD" in split_pair_str:
-                if split_pair_str[1] == "OLD":
-                    base = f"{split_pair_str[0]}_{split_pair_str[1]}"
-                if split_pair_str[3] == "OLD":
-                    quote = f"{split_pair_str[2]}_{split_pair_str[3]}"
-            elif len(split_pair_str) == 3 and "OLD" in split_pair_str:
-                if split_pair_str[2] == "OLD":
-                    base = split_pair_str[0]
-                    quote = f"{split_pair_str[1]}_{split_pair_str[2]}"
-                elif split_pair_str[1] == "OLD":
-                    base = f"{split_pair_str[0]}_{split_pair_str[1]}"
-                    quote = split_pair_str[2]
-            # failed to parse ATOM-IBC_IRIS_LTC into base/quote!
+                base, quote = deplatform.coin(base), deplatform.coin(quote)
             if reverse:
                 return quote, base
             return base, quote
         except Exception as e:  # pragma: no cover
             msg = f"failed to parse {pair_str} into base/quote! {e}"
-            data = {"error": msg}
-            return default.result(msg=msg, loglevel="warning", data=data)
+            logger.warning(msg)
+            return {"error": msg}
 
-    @timed
+    @timed(sample_rate=0)
     def pair_cachename(self, key: str, pair_str: str, suffix: str):
         return f"{key}_{pair_str}_{suffix}"
 
-    @timed
+    @timed(sample_rate=0)
     def coin_platform(self, coin):
         r = coin.split("-")
         if len(r) == 2:
@@ -460,7 +426,7 @@ class Derive:
                 existing[key] = Decimal(new[key])
         return existing
 
-    @timed
+    @timed(sample_rate=0)
     def suffix(self, days: int) -> str:
         if days == 1:
             return "24hr"
@@ -511,71 +477,16 @@ class Derive:
             returned on their own, otherwise the utxo legacy
             and segwit versions will be returned.
             """
-            coin_parts = coin.split("-")
-            if len(coin_parts) == 2 and not coin.endswith("segwit") and segwit_only:
-                return [coin]
-            else:
-                coin = coin_parts[0]
-            data = [
-                i
-                for i in self.coins_config
-                if (i.replace(coin, "") == "" or i.replace(coin, "").startswith("-"))
-            ]
-            if segwit_only:
-                decoin = deplatform.coin(coin)
-                return [
-                    i
-                    for i in data
-                    if i.endswith("segwit") or i.replace(decoin, "") == ""
-                ]
-            if len(data) == 0:
-                data = [coin]
-            return data
+            variant_index.refresh()
+            return variant_index.coin_variants(coin, segwit_only)
         except Exception as e:
             logger.warning(f"coin variants for {coin} failed: {e}")
 
     @timed
     def pair_variants(self, pair_str, segwit_only=False):
         try:
-            if pair_str == "ALL":
-                return ["ALL"]
-            variants = []
-            base, quote = derive.base_quote(pair_str)
-            base_variants = self.coin_variants(base)
-            quote_variants = self.coin_variants(quote)
-            for i in base_variants:
-                for j in quote_variants:
-                    if i != j:
-                        variants.append(f"{i}_{j}")
-            if segwit_only:
-                base_variants = []
-                quote_variants = []
-                segvars = []
-                debase = deplatform.coin(base)
-                dequote = deplatform.coin(quote)
-                if base.endswith("segwit") or base == debase:
-                    if debase in self.coins_config:
-                        base_variants.append(debase)
-                    if f"{debase}-segwit" in self.coins_config:
-                        base_variants.append(f"{debase}-segwit")
-                else:
-                    base_variants = [base]
-
-                if quote.endswith("segwit") or quote == dequote:
-                    if dequote in self.coins_config:
-                        quote_variants.append(dequote)
-                    if f"{dequote}-segwit" in self.coins_config:
-                        quote_variants.append(f"{dequote}-segwit")
-                else:
-                    quote_variants = [quote]
-                for b in base_variants:
-                    for q in quote_variants:
-                        variant = f"{b}_{q}"
-                        if b != q:
-                            segvars.append(variant)
-                variants = list(set(segvars))
-            variants.sort()
-            return variants
+            variant_index.refresh()
+            return variant_index.pair_variants(pair_str, segwit_only)
         except Exception as e:
             logger.warning(f"pair variants for {pair_str} failed: {e}")
             return [pair_str]
@@ -800,6 +711,260 @@ class Derive:
         }
 
 
+# Tickers with underscores seen in swaps, but not in coins_config
+LEGACY_UNDERSCORE_TICKERS = {"IRIS_ATOM", "IRIS_ATOM-IBC", "ATOM-IBC_IRIS"}
+
+
+class PairKey:
+    """
+    A parsed pair string, with its base, quote, deplatformed and
+    inverted forms. Instances are immutable and interned by
+    `derive.pair_key`, which should be used rather than the constructor.
+    """
+
+    __slots__ = ("pair_str", "base", "quote", "std", "reverse", "std_reverse")
+
+    def __init__(self, pair_str: str, base: str, quote: str):
+        std_base = deplatform.coin(base)
+        std_quote = deplatform.coin(quote)
+        for k, v in {
+            "pair_str": pair_str,
+            "base": base,
+            "quote": quote,
+            "std": f"{std_base}_{std_quote}",
+            "reverse": f"{quote}_{base}",
+            "std_reverse": f"{std_quote}_{std_base}",
+        }.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PairKey is immutable")
+
+    def __str__(self):
+        return self.pair_str
+
+    def __repr__(self):
+        return f"PairKey({self.pair_str!r})"
+
+    def __eq__(self, other):
+        if isinstance(other, PairKey):
+            return self.pair_str == other.pair_str
+        return self.pair_str == other
+
+    def __hash__(self):
+        return hash(self.pair_str)
+
+    @staticmethod
+    def is_ticker(ticker: str, underscored: set) -> bool:
+        if "_" not in ticker:
+            return True
+        if ticker in underscored:
+            return True
+        parts = ticker.split("_")
+        return len(parts) == 2 and parts[1] == "OLD"
+
+    @classmethod
+    def parse(cls, pair_str: str, underscored: set = LEGACY_UNDERSCORE_TICKERS):
+        """
+        Splits a pair string into base and quote. If tickers contain
+        underscores, the split is chosen where both sides are tickers,
+        preferring the longest base.
+        """
+        # TODO: This workaround fixes the issue
+        # but need to find root cause to avoid
+        # unexpected related issues
+        parsed = pair_str
+        if parsed == "OLD_USDC-PLG20_USDC-PLG20":
+            parsed = "USDC-PLG20_USDC-PLG20_OLD"
+        parts = parsed.split("_")
+        if len(parts) == 2:
+            return cls(pair_str, parts[0], parts[1])
+        splits = [
+            ("_".join(parts[:i]), "_".join(parts[i:])) for i in range(1, len(parts))
+        ]
+        splits = [
+            (base, quote)
+            for base, quote in splits
+            if cls.is_ticker(base, underscored) and cls.is_ticker(quote, underscored)
+        ]
+        if len(splits) == 0:
+            raise ValueError(f"Unknown tickers in {pair_str}")
+        base, quote = max(splits, key=lambda i: len(i[0]))
+        return cls(pair_str, base, quote)
+
+
+class VariantIndex:
+    """
+    Coin and pair variants for the current `coins_config`.
+
+    Tickers are grouped by their deplatformed coin once per version of
+    `coins_config`, and pair variants are memoized as they are looked
+    up. Memcache is checked for a new `coins_config` at most once every
+    `ttl` seconds, and the index is rebuilt only when it has changed.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_pairs: int = 50000):
+        self.ttl = ttl
+        self.max_pairs = max_pairs
+        self.lock = Lock()
+        self.checked_at = None
+        self.build({})
+
+    def build(self, coins_config: Dict):
+        coins = {}
+        for i in coins_config:
+            coins.setdefault(i.split("-")[0], []).append(i)
+        # Replaced as a whole, so readers never see a partial index
+        self.index = {
+            "source": coins_config,
+            "tickers": set(coins_config),
+            "coins": coins,
+            "segwit": {
+                k: [i for i in v if i.endswith("segwit") or i == k]
+                for k, v in coins.items()
+            },
+            "pairs": {},
+            "underscored": LEGACY_UNDERSCORE_TICKERS.union(
+                [i for i in coins_config if "_" in i]
+            ),
+            "pair_keys": {},
+        }
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.ttl:
+            return
+        with self.lock:
+            self.checked_at = now
+            coins_config = memcache.get_coins_config()
+            if coins_config is None or coins_config is self.index["source"]:
+                return
+            self.build(coins_config)
+
+    def pair_key(self, pair_str: str) -> PairKey:
+        """Returns the interned PairKey for a pair string"""
+        index = self.index
+        key = index["pair_keys"].get(pair_str)
+        if key is None:
+            if len(index["pair_keys"]) >= self.max_pairs:
+                index["pair_keys"].clear()
+            key = PairKey.parse(pair_str, index["underscored"])
+            index["pair_keys"][pair_str] = key
+        return key
+
+    def coin_variants(self, coin: str, segwit_only: bool = False) -> List:
+        coin_parts = coin.split("-")
+        if len(coin_parts) == 2 and not coin.endswith("segwit") and segwit_only:
+            return [coin]
+        coin = coin_parts[0]
+        if segwit_only:
+            return list(self.index["segwit"].get(coin, []))
+        return list(self.index["coins"].get(coin, [coin]))
+
+    def pair_variants(self, pair_str: str, segwit_only: bool = False) -> List:
+        if pair_str == "ALL":
+            return ["ALL"]
+        index = self.index
+        key = (pair_str, segwit_only)
+        if key not in index["pairs"]:
+            if len(index["pairs"]) >= self.max_pairs:
+                index["pairs"].clear()
+            index["pairs"][key] = self.derive_pair_variants(
+                pair_str, segwit_only, index
+            )
+        return list(index["pairs"][key])
+
+    def derive_pair_variants(self, pair_str, segwit_only, index) -> List:
+        base, quote = derive.base_quote(pair_str)
+        if segwit_only:
+            tickers = index["tickers"]
+            variants = []
+            for coin in [base, quote]:
+                decoin = deplatform.coin(coin)
+                if coin.endswith("segwit") or coin == decoin:
+                    variants.append(
+                        [
+                            i
+                            for i in [decoin, f"{decoin}-segwit"]
+                            if i in tickers
+                        ]
+                    )
+                else:
+                    variants.append([coin])
+            base_variants, quote_variants = variants
+        else:
+            base_variants = self.coin_variants(base)
+            quote_variants = self.coin_variants(quote)
+        return sorted(
+            set(
+                f"{i}_{j}"
+                for i in base_variants
+                for j in quote_variants
+                if i != j
+            )
+        )
+
+
+class PairOrder:
+    """
+    Canonical pair order by market cap, for the current `gecko_source`.
+
+    Market caps are converted once per `gecko_source`, and the order of
+    each pair is memoized as it is looked up. The table is rebuilt when
+    a different `gecko_source` is passed in, which only happens after
+    it is refreshed, since it is served from the L1 cache.
+    """
+
+    def __init__(self, max_pairs: int = 100000):
+        self.max_pairs = max_pairs
+        self.lock = Lock()
+        self.build(None)
+
+    def build(self, gecko_source: Dict | None):
+        mcaps = {}
+        for ticker, v in (gecko_source or {}).items():
+            try:
+                mcaps[ticker] = Decimal(v["usd_market_cap"])
+            except Exception as e:  # pragma: no cover
+                logger.warning(f"Invalid usd_market_cap for {ticker}: {e}")
+        # Replaced as a whole, so readers never see a partial table
+        self.table = {"source": gecko_source, "mcaps": mcaps, "pairs": {}}
+
+    def get_table(self, gecko_source: Dict) -> Dict:
+        table = self.table
+        if gecko_source is not table["source"]:
+            with self.lock:
+                if gecko_source is not self.table["source"]:
+                    self.build(gecko_source)
+                table = self.table
+        return table
+
+    def canonical(self, pair_str: str, gecko_source: Dict) -> str:
+        """Returns the pair with the higher market cap coin as quote"""
+        # TODO: If gecko source is none, compare with db pairs.
+        if gecko_source is None:
+            return pair_str
+        table = self.get_table(gecko_source)
+        if pair_str not in table["pairs"]:
+            if len(table["pairs"]) >= self.max_pairs:
+                table["pairs"].clear()
+            table["pairs"][pair_str] = self.rank(pair_str, table["mcaps"])
+        return table["pairs"][pair_str]
+
+    def is_reversed(self, pair_str: str, gecko_source: Dict) -> bool:
+        return pair_str != self.canonical(pair_str, gecko_source)
+
+    def rank(self, pair_str: str, mcaps: Dict) -> str:
+        base, quote = derive.base_quote(pair_str)
+        base_mc = mcaps.get(base.replace("-segwit", ""), 0)
+        quote_mc = mcaps.get(quote.replace("-segwit", ""), 0)
+        if quote_mc < base_mc:
+            return invert.pair(pair_str)
+        elif quote_mc == base_mc:
+            return "_".join(sorted([base, quote]))
+        return pair_str
+
+
 class Invert:
     def __init__(self):
         self._coins_config = None
@@ -811,8 +976,7 @@ class Invert:
         return self._coins_config
 
     def pair(self, pair_str):
-        base, quote = derive.base_quote(pair_str, True)
-        return f"{base}_{quote}"
+        return derive.pair_key(pair_str).reverse
 
     def trade_type(self, trade_type):
         if trade_type == "buy":
@@ -1185,31 +1349,18 @@ class SortData:
         data.sort(key=lambda x: x[sort_key], reverse=True)
         return data[:length]
 
-    @timed
     def pair_by_market_cap(self, pair_str: str, gecko_source) -> str:
         try:
-            # TODO: If gecko source is none, compare with db pairs.
-            if gecko_source is not None:
-                base, quote = derive.base_quote(pair_str)
-                base_mc = 0
-                quote_mc = 0
-                if base.replace("-segwit", "") in gecko_source:
-                    base_mc = Decimal(
-                        gecko_source[base.replace("-segwit", "")]["usd_market_cap"]
-                    )
-                if quote.replace("-segwit", "") in gecko_source:
-                    quote_mc = Decimal(
-                        gecko_source[quote.replace("-segwit", "")]["usd_market_cap"]
-                    )
-                if quote_mc < base_mc:
-                    pair_str = invert.pair(pair_str)
-                elif quote_mc == base_mc:
-                    pair_str = "_".join(sorted([base, quote]))
+            return pair_order.canonical(pair_str, gecko_source)
         except Exception as e:  # pragma: no cover
             msg = f"pair_by_market_cap failed: {e}"
             logger.warning(msg)
         return pair_str
 
+    def is_reversed(self, pair_str: str, gecko_source) -> bool:
+        """True if the pair is not in market cap order"""
+        return pair_str != self.pair_by_market_cap(pair_str, gecko_source)
+
 
 class SumData:
     def __init__(self):
@@ -1333,6 +1484,16 @@ class Templates:  # pragma: no cover
             "timestamp": 1694183345,
         }
 
+    def orderbook_fetch_metrics(self):
+        return {
+            "variants": 0,
+            "batches": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "duration": 0,
+        }
+
     def orderbook_extended(self, pair_str):
         base, quote = derive.base_quote(pair_str)
         data = {
@@ -1570,6 +1731,8 @@ clean = Clean()
 convert = Convert()
 deplatform = Deplatform()
 derive = Derive()
+variant_index = VariantIndex()
+pair_order = PairOrder()
 filterdata = FilterData()
 invert = Invert()
 merge = Merge()